@@ -5,3 +5,6 @@ class CounterConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.counter'
     verbose_name = 'Compteur'
+
+    def ready(self):
+        from . import signals  # noqa: F401
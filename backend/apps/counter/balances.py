@@ -0,0 +1,207 @@
+"""
+Per-client running balances.
+
+ClientBalance holds, for every client, the counts and totals of its
+billiard sessions (running ones included) and bar orders and what is still
+unpaid. As with the daily revenue rollup, a single row changing for the
+same client shifts the balance by that row (`apply_change`); other changes
+mark the client dirty and its balance is recomputed from its own rows (one
+grouped query per source, served by the client indexes), so bulk updates
+and deletes cannot make it drift. apps.counter.rollup collects the clients
+touched inside `batch()` and refreshes each of them once, in the same
+transaction.
+
+The rows of a client are the ones client_q() matches for its name: rows
+linked to it, and rows not linked but typed with its exact name. A balance
+therefore always equals the client's ledger row. Rows of walk-ins and
+anonymous rows have no balance.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .clients import is_anonymous
+from .models import BarOrder, BilliardSession, Client, ClientBalance
+
+
+BALANCE_FIELDS = (
+    'billiard_sessions', 'billiard_total', 'bar_orders', 'bar_total',
+    'unpaid_count', 'unpaid_total',
+)
+
+# (count field, total field) of each source
+SOURCE_FIELDS = {
+    'billiard': ('billiard_sessions', 'billiard_total'),
+    'bar': ('bar_orders', 'bar_total'),
+}
+
+
+def _empty_balance():
+    return dict.fromkeys(BALANCE_FIELDS, 0)
+
+
+def owners(rows):
+    """Ids of the clients owning rows given as (client_id, client_name) pairs.
+
+    Linked rows belong to their client; unlinked rows to the client
+    registered under their exact name, if any.
+    """
+    ids, names = set(), set()
+    for client_id, client_name in rows:
+        if client_id is not None:
+            ids.add(client_id)
+        elif not is_anonymous(client_name):
+            names.add(client_name)
+    if names:
+        ids.update(Client.objects.filter(name__in=names).values_list('pk', flat=True))
+    return ids
+
+
+def aggregate_balances(rows_q, owner_of_name):
+    """Aggregate the rows matching `rows_q` into balance values per client.
+
+    Args:
+        rows_q: Q object over client and client_name (see refresh_clients)
+        owner_of_name: dict mapping a client name to its id, to attribute
+            unlinked rows (anonymous names excluded, as in find_client())
+
+    Returns:
+        dict mapping client id to the BALANCE_FIELDS values
+    """
+    sources = (
+        (BilliardSession.objects, 'price', 'billiard_sessions', 'billiard_total'),
+        (BarOrder.objects, 'total_price', 'bar_orders', 'bar_total'),
+    )
+    balances = defaultdict(_empty_balance)
+    for manager, price, count_field, total_field in sources:
+        grouped = (
+            manager.filter(rows_q)
+            .values('client_id', 'client_name', 'is_paid')
+            .annotate(count=Count('id'), total=Sum(price))
+            .order_by()
+        )
+        for entry in grouped:
+            owner = entry['client_id'] or owner_of_name.get(entry['client_name'])
+            if owner is None:
+                continue
+            balance = balances[owner]
+            total = entry['total'] or 0
+            balance[count_field] += entry['count']
+            balance[total_field] += total
+            if not entry['is_paid']:
+                balance['unpaid_count'] += entry['count']
+                balance['unpaid_total'] += total
+    return balances
+
+
+def _all_clients():
+    """aggregate_balances() arguments covering every client."""
+    owner_of_name = {
+        name: pk for name, pk in Client.objects.values_list('name', 'pk') if not is_anonymous(name)
+    }
+    rows_q = Q(client__isnull=False) | Q(
+        client__isnull=True, client_name__in=Client.objects.values('name')
+    )
+    return rows_q, owner_of_name
+
+
+def refresh_clients(client_ids):
+    """Recompute the balances of the given clients."""
+    ids = sorted({pk for pk in client_ids if pk is not None})
+    if not ids:
+        return
+
+    with transaction.atomic():
+        # Lock the clients so concurrent refreshes of one balance serialize
+        names = dict(
+            Client.objects.select_for_update().filter(pk__in=ids)
+            .order_by('pk').values_list('pk', 'name')
+        )
+        ids = sorted(names)
+        owner_of_name = {name: pk for pk, name in names.items() if not is_anonymous(name)}
+        balances = aggregate_balances(
+            Q(client_id__in=ids) | Q(client__isnull=True, client_name__in=list(owner_of_name)),
+            owner_of_name,
+        )
+        ClientBalance.objects.bulk_create(
+            [ClientBalance(client_id=pk, **balances[pk]) for pk in ids],
+            update_conflicts=True,
+            unique_fields=['client'],
+            update_fields=[*BALANCE_FIELDS, 'updated_at'],
+        )
+
+
+def apply_change(client_id, source, before, after):
+    """Shift a client's balance by one row going from `before` to `after`.
+
+    Args:
+        client_id: Client owning the row, before and after the change
+        source: 'billiard' or 'bar'
+        before, after: apps.counter.rollup.Contribution, or None for a
+            new or deleted row
+
+    The client is locked as in refresh_clients(), then its balance moves
+    with one UPDATE; a client with no balance row yet is recomputed.
+    """
+    count_field, total_field = SOURCE_FIELDS[source]
+    delta = defaultdict(int)
+    for row, sign in ((before, -1), (after, 1)):
+        if row is None:
+            continue
+        delta[count_field] += sign
+        delta[total_field] += sign * row.amount
+        if not row.is_paid:
+            delta['unpaid_count'] += sign
+            delta['unpaid_total'] += sign * row.amount
+    delta = {field: value for field, value in delta.items() if value}
+    if not delta:
+        return
+
+    with transaction.atomic():
+        locked = Client.objects.select_for_update().filter(pk=client_id).values_list('pk', flat=True)
+        if not list(locked):
+            return
+        updated = ClientBalance.objects.filter(client_id=client_id).update(
+            updated_at=timezone.now(), **{field: F(field) + value for field, value in delta.items()}
+        )
+        if not updated:
+            refresh_clients([client_id])
+
+
+def rebuild():
+    """Rebuild every balance from the raw tables.
+
+    Returns:
+        int: number of balances written
+    """
+    balances = aggregate_balances(*_all_clients())
+    with transaction.atomic():
+        ClientBalance.objects.all().delete()
+        ClientBalance.objects.bulk_create(
+            [ClientBalance(client_id=pk, **values) for pk, values in balances.items()],
+            batch_size=1000,
+        )
+    return len(balances)
+
+
+def drift():
+    """Compare the stored balances with a full recomputation.
+
+    Returns:
+        list of (client_id, stored, expected) for every mismatch; missing
+        rows are reported as zero balances
+    """
+    expected = aggregate_balances(*_all_clients())
+    stored = {
+        row['client_id']: {field: row[field] for field in BALANCE_FIELDS}
+        for row in ClientBalance.objects.values('client_id', *BALANCE_FIELDS)
+    }
+    mismatches = []
+    for pk in sorted(set(expected) | set(stored)):
+        have = stored.get(pk, _empty_balance())
+        want = expected[pk] if pk in expected else _empty_balance()
+        if have != want:
+            mismatches.append((pk, have, want))
+    return mismatches
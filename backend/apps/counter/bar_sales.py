@@ -0,0 +1,185 @@
+"""
+Per-item bar sales analytics.
+
+Sales are read from the BarItemSales rollup (one row per day, hour and
+item) rather than from the order lines, so a year of orders is ranked and
+bucketed with two small GROUP BY queries. Items removed from the
+inventory are reported under the name they were sold with.
+
+The rollup follows the bar rows of DailyRevenue: whenever apps.counter.rollup
+refreshes bar days, the matching BarItemSales days are recomputed here,
+under a per-day lock (apps.counter.locks) like the DailyRevenue rows.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .dates import day_start
+from .locks import lock_days
+from .models import BarItemSales, BarOrderLine
+
+
+BUCKETS = {
+    'hour': ('date', 'hour'),
+    'day': ('date',),
+    'week': ('week',),
+}
+
+# Longest range accepted for hourly buckets
+MAX_HOURLY_RANGE_DAYS = 31
+
+TOP_DEFAULT = 10
+TOP_MAX = 100
+
+
+# ============================================
+# ROLLUP MAINTENANCE
+# ============================================
+def aggregate_lines(lines_qs):
+    """Aggregate order lines into BarItemSales values.
+
+    Lines are streamed; the local hour of each order is computed in Python
+    so the result does not depend on database timezone support.
+
+    Returns:
+        dict mapping (date, hour, item_id, name) to [quantity, revenue]
+    """
+    rows = defaultdict(lambda: [0, 0])
+    lines = lines_qs.order_by().values_list(
+        'order__date', 'order__timestamp', 'item_id', 'name', 'quantity', 'unit_price'
+    ).iterator(chunk_size=2000)
+    for day, ordered_at, item_id, name, quantity, unit_price in lines:
+        row = rows[(day, timezone.localtime(ordered_at).hour, item_id, name)]
+        row[0] += quantity
+        row[1] += quantity * unit_price
+    return rows
+
+
+def build_rows(model, rows):
+    """BarItemSales instances (of `model`) for aggregate_lines() output."""
+    return [
+        model(
+            date=day, hour=hour, week=day - timedelta(days=day.weekday()),
+            item_id=item_id, name=name, quantity=quantity, revenue=revenue,
+        )
+        for (day, hour, item_id, name), (quantity, revenue) in rows.items()
+    ]
+
+
+def refresh_days(days):
+    """Recompute the BarItemSales rows of the given order days.
+
+    The days are locked before the order lines are read, then the rows of
+    current items are upserted on the (date, hour, item, name) key. Rows
+    of deleted items have a NULL item, which never conflicts, so they are
+    replaced instead, along with the keys that no longer have any sales.
+    """
+    days = sorted(set(days))
+    if not days:
+        return
+    with transaction.atomic():
+        lock_days('bar-item-sales', days)
+        rows = aggregate_lines(BarOrderLine.objects.filter(order__date__in=days))
+        stale = [
+            pk
+            for pk, *key in BarItemSales.objects.filter(date__in=days).values_list(
+                'pk', 'date', 'hour', 'item_id', 'name'
+            )
+            if key[2] is None or tuple(key) not in rows
+        ]
+        BarItemSales.objects.filter(pk__in=stale).delete()
+        current = build_rows(BarItemSales, rows)
+        BarItemSales.objects.bulk_create(
+            [row for row in current if row.item_id is not None],
+            update_conflicts=True,
+            unique_fields=['date', 'hour', 'item', 'name'],
+            update_fields=['week', 'quantity', 'revenue'],
+            batch_size=1000,
+        )
+        BarItemSales.objects.bulk_create(
+            [row for row in current if row.item_id is None], batch_size=1000
+        )
+
+
+def rebuild():
+    """Rebuild the whole BarItemSales table from the order lines."""
+    rows = aggregate_lines(BarOrderLine.objects.all())
+    with transaction.atomic():
+        BarItemSales.objects.all().delete()
+        BarItemSales.objects.bulk_create(build_rows(BarItemSales, rows), batch_size=1000)
+    return len(rows)
+
+
+# ============================================
+# QUERIES
+# ============================================
+def _sales(start, end):
+    """Rollup rows between start and end (days, inclusive)."""
+    return BarItemSales.objects.filter(date__gte=start, date__lte=end).annotate(
+        # Current inventory name, or the snapshot for deleted items
+        label=Coalesce('item__name', 'name'),
+    )
+
+
+def _totals(queryset):
+    return queryset.annotate(quantity_sold=Sum('quantity'), sold=Sum('revenue'))
+
+
+def top_items(start, end, limit=TOP_DEFAULT):
+    """Best-selling items over the range, by revenue then quantity.
+
+    Returns:
+        list of dict: item_id, name, quantity, revenue
+    """
+    rows = _totals(
+        _sales(start, end).values('item_id', 'label')
+    ).order_by('-sold', '-quantity_sold', 'label')[:limit]
+    return [
+        {
+            'item_id': row['item_id'],
+            'name': row['label'],
+            'quantity': row['quantity_sold'],
+            'revenue': row['sold'],
+        }
+        for row in rows
+    ]
+
+
+def item_buckets(start, end, bucket, items):
+    """Quantity and revenue per period for the given items.
+
+    Args:
+        bucket: 'hour', 'day' or 'week'
+        items: Entries returned by top_items()
+
+    Returns:
+        list of dict: period (ISO datetime), item_id, name, quantity, revenue
+    """
+    if not items:
+        return []
+
+    ids = [item['item_id'] for item in items if item['item_id'] is not None]
+    deleted_names = [item['name'] for item in items if item['item_id'] is None]
+    sales = _sales(start, end)
+    selected = sales.filter(item_id__in=ids) | sales.filter(
+        item__isnull=True, name__in=deleted_names
+    )
+
+    columns = BUCKETS[bucket]
+    rows = _totals(selected.values(*columns, 'item_id', 'label')).order_by(*columns, 'label')
+    return [
+        {
+            'period': (
+                day_start(row[columns[0]]) + timedelta(hours=row.get('hour', 0))
+            ).isoformat(),
+            'item_id': row['item_id'],
+            'name': row['label'],
+            'quantity': row['quantity_sold'],
+            'revenue': row['sold'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,237 @@
+"""
+Client name search for autocomplete.
+
+Queries are matched against Client.normalized_name (see apps.counter.clients),
+so "eleve" finds "Élève" and "BEN" finds "Sami Ben Ali". Names starting with
+the query come first, then names with a word starting with it. No balance
+is computed.
+
+Registered clients are listed first, then the walk-in names typed on
+sessions and orders that are not linked to a client (regulars who never
+registered), matched the same way from an in-process trie.
+
+On PostgreSQL a pg_trgm GIN index on normalized_name answers the prefix and
+word-prefix LIKE patterns and adds close spellings (trigram similarity). On
+SQLite the names are held in an in-process trie of word starts. New clients
+and walk-in names are added to the tries in place; a client change (or
+SEARCH_INDEX_TTL, for changes made by other worker processes) triggers a
+rebuild.
+"""
+import bisect
+import threading
+import time
+
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .clients import ANONYMOUS_NAMES, is_anonymous, normalize_name
+from .models import BarOrder, BilliardSession, Client
+
+
+SEARCH_DEFAULT_LIMIT = 10
+SEARCH_MAX_LIMIT = 50
+
+# Seconds before a worker rebuilds its trie on its own
+SEARCH_INDEX_TTL = 300
+
+
+def search_clients(query, limit=SEARCH_DEFAULT_LIMIT):
+    """Active clients, then walk-in names, matching `query`, best matches first.
+
+    Returns:
+        list of dict: id (None for a walk-in name), name
+    """
+    key = normalize_name(query)
+    if not key:
+        return []
+    if connection.vendor == 'postgresql':
+        results = _search_trigram(key, limit)
+    else:
+        results = [{'id': pk, 'name': name} for pk, name in _clients.get().search(key, limit)]
+
+    listed = {normalize_name(result['name']) for result in results}
+    for walk_in_key, name in _walk_ins.get().search(key, limit):
+        if len(results) == limit:
+            break
+        if walk_in_key not in listed:
+            results.append({'id': None, 'name': name})
+    return results
+
+
+# ============================================
+# POSTGRESQL (pg_trgm)
+# ============================================
+def _search_trigram(key, limit):
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    prefix = Q(normalized_name__startswith=key)
+    word_prefix = Q(normalized_name__contains=f' {key}')
+    rows = (
+        Client.objects.filter(is_active=True)
+        .filter(prefix | word_prefix | Q(normalized_name__trigram_similar=key))
+        .annotate(
+            rank=Case(
+                When(prefix, then=Value(0)),
+                When(word_prefix, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            ),
+            similarity=TrigramSimilarity('normalized_name', key),
+        )
+        .order_by('rank', '-similarity', 'normalized_name', 'pk')
+        .values('id', 'name')[:limit]
+    )
+    return list(rows)
+
+
+# ============================================
+# SQLITE (in-process trie)
+# ============================================
+class _Node:
+    __slots__ = ('children', 'matches')
+
+    def __init__(self):
+        self.children = {}
+        self.matches = []
+
+
+class NameTrie:
+    """Trie of the word starts of names, each with an identity (client pk,
+    or the normalized name of a walk-in).
+
+    Every node keeps its best matches only (full-name prefix, then word
+    prefix, then alphabetically), so a lookup walks len(query) nodes and
+    reads one short list.
+    """
+
+    # Matches kept per node; leaves room for the same client reached
+    # through two of its words
+    CAPACITY = 2 * SEARCH_MAX_LIMIT
+
+    def __init__(self, clients=()):
+        self.root = _Node()
+        self.identities = set()
+        starts = []
+        for pk, name, key in clients:
+            self.identities.add(pk)
+            starts.extend(self._starts(pk, name, key))
+        starts.sort()
+        for *match, suffix in starts:
+            self._append(suffix, tuple(match))
+
+    @staticmethod
+    def _starts(pk, name, key):
+        """(rank, key, pk, name, suffix) for each word of the name."""
+        offset = 0
+        for position, word in enumerate(key.split(' ')):
+            yield min(position, 1), key, pk, name, key[offset:]
+            offset += len(word) + 1
+
+    def _append(self, suffix, match):
+        node = self.root
+        for char in suffix:
+            node = node.children.setdefault(char, _Node())
+            if len(node.matches) < self.CAPACITY:
+                node.matches.append(match)
+
+    def add(self, pk, name, key):
+        """Insert one name into an existing trie, keeping node order."""
+        if pk in self.identities:
+            return
+        self.identities.add(pk)
+        for *match, suffix in self._starts(pk, name, key):
+            node = self.root
+            for char in suffix:
+                node = node.children.setdefault(char, _Node())
+                bisect.insort(node.matches, tuple(match))
+                del node.matches[self.CAPACITY:]
+
+    def search(self, key, limit):
+        """(identity, name) of the best `limit` matches."""
+        node = self.root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        results = []
+        seen = set()
+        for _, _, pk, name in node.matches:
+            if pk not in seen:
+                seen.add(pk)
+                results.append((pk, name))
+                if len(results) == limit:
+                    break
+        return results
+
+
+class _TrieCache:
+    """This worker's trie, built by `load` and rebuilt after SEARCH_INDEX_TTL."""
+
+    def __init__(self, load):
+        self._load = load
+        self._lock = threading.Lock()
+        self._trie = None
+        self._built_at = 0.0
+
+    def get(self):
+        with self._lock:
+            if self._trie is None or time.monotonic() - self._built_at > SEARCH_INDEX_TTL:
+                self._trie = NameTrie(self._load())
+                self._built_at = time.monotonic()
+            return self._trie
+
+    def add(self, identity, name, key):
+        with self._lock:
+            if self._trie is not None:
+                self._trie.add(identity, name, key)
+
+    def invalidate(self):
+        with self._lock:
+            self._trie = None
+
+
+def _load_clients():
+    clients = Client.objects.filter(is_active=True).values_list('id', 'name', 'normalized_name')
+    return clients.iterator(chunk_size=2000)
+
+
+def _load_walk_ins():
+    """(key, name, key) of the names typed on unlinked sessions and orders.
+
+    One spelling is kept per normalized name.
+    """
+    spellings = {}
+    for model in (BilliardSession, BarOrder):
+        names = (
+            model.objects.filter(client__isnull=True)
+            .exclude(client_name__in=ANONYMOUS_NAMES)
+            .values_list('client_name', flat=True).distinct().order_by()
+        )
+        for name in names.iterator(chunk_size=2000):
+            if not is_anonymous(name):
+                spellings.setdefault(normalize_name(name), name)
+    return [(key, name, key) for key, name in spellings.items()]
+
+
+_clients = _TrieCache(_load_clients)
+_walk_ins = _TrieCache(_load_walk_ins)
+
+
+def add(client):
+    """Index a newly created client in this worker's trie."""
+    if client.is_active:
+        _clients.add(client.pk, client.name, client.normalized_name)
+
+
+def add_walk_in(name):
+    """Index a name typed on a row not linked to any client."""
+    if not is_anonymous(name):
+        key = normalize_name(name)
+        _walk_ins.add(key, name, key)
+
+
+def invalidate():
+    """Drop this worker's tries after a client is renamed, deleted or
+    registered (its walk-in rows are then linked to it)."""
+    _clients.invalidate()
+    _walk_ins.invalidate()
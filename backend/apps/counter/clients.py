@@ -0,0 +1,109 @@
+"""
+Canonical client identity.
+
+Sessions and orders keep the free-text client_name typed at the counter,
+but also point to a Client row through their `client` foreign key. Names
+are matched on a normalized form (accents and case folded, whitespace
+collapsed), so "Sami  Ben Ali" and "sami ben ali" resolve to the same
+client instead of splitting its balance in two.
+
+Only registered clients are linked: a walk-in name that matches no Client
+stays a plain client_name, and no Client is created for it. Registering
+(or renaming) a client links the walk-in rows already typed with its name.
+"""
+import unicodedata
+
+from django.db.models import Q
+
+from .models import BarOrder, BilliardSession, Client
+
+
+# Placeholder names used when a session/order has no real client
+ANONYMOUS_NAMES = ('Anonyme', 'Anonymous')
+
+
+def display_name(name):
+    """Name as stored on a new Client: trimmed, inner whitespace collapsed."""
+    return ' '.join((name or '').split())
+
+
+def normalize_name(name):
+    """Matching key of a client name (accents stripped, case folded)."""
+    decomposed = unicodedata.normalize('NFKD', display_name(name))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return stripped.casefold()
+
+
+_ANONYMOUS_KEYS = frozenset(normalize_name(name) for name in ANONYMOUS_NAMES)
+
+
+def is_anonymous(name):
+    """True for empty names and the anonymous placeholders."""
+    key = normalize_name(name)
+    return not key or key in _ANONYMOUS_KEYS
+
+
+def find_client(name):
+    """Return the Client matching `name`, or None.
+
+    Several clients may share a normalized name if they were created
+    before normalization existed; the oldest one is canonical.
+    """
+    if is_anonymous(name):
+        return None
+    return Client.objects.filter(normalized_name=normalize_name(name)).order_by('pk').first()
+
+
+def link_walk_ins(client):
+    """Link the unlinked rows whose name matches `client`, in any spelling.
+
+    Names are normalized in Python, so the distinct names of the unlinked
+    rows are read first; the matching rows are then linked with one UPDATE
+    per model (no signals: the caller refreshes the balance). Does nothing
+    if an older client already owns the name.
+
+    Returns:
+        int: number of rows linked
+    """
+    if find_client(client.name) != client:
+        return 0
+    linked = 0
+    for model in (BilliardSession, BarOrder):
+        unlinked = model.objects.filter(client__isnull=True)
+        names = [
+            name
+            for name in unlinked.values_list('client_name', flat=True).distinct().order_by()
+            if normalize_name(name) == client.normalized_name
+        ]
+        if names:
+            linked += unlinked.filter(client_name__in=names).update(client=client)
+    return linked
+
+
+def client_q(client, name):
+    """Q object matching the rows of one client.
+
+    Args:
+        client: Result of find_client(name), may be None
+        name: Client name as requested
+
+    Rows linked to the client match on the foreign key; rows not linked
+    (walk-ins, or rows typed before the client was registered) fall back
+    to the name.
+    """
+    unlinked = Q(client__isnull=True, client_name=name)
+    if client is None:
+        return unlinked
+    return Q(client=client) | unlinked
+
+
+def linked_q(client, name):
+    """Q object matching the rows of one client, for models without client_name.
+
+    PS4 sessions only belong to a client through their foreign key, so
+    they match nothing for a name that is not a registered client. Same
+    signature as client_q().
+    """
+    if client is None:
+        return Q(pk__in=[])
+    return Q(client=client)
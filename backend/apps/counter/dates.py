@@ -0,0 +1,60 @@
+"""
+Calendar-day windows in the local timezone (settings.TIME_ZONE).
+
+Filtering a DateTimeField with `__date` converts every row to local time
+before comparing, so no index can be used. These helpers turn local
+calendar days into half-open [start, end) datetime ranges instead, which
+the database answers with an index range scan.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def day_start(day):
+    """Aware datetime of the local midnight that starts `day`."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def day_window(day):
+    """Return the [start, end) datetimes of one local calendar day."""
+    return day_start(day), day_start(day + timedelta(days=1))
+
+
+def range_window(start, end):
+    """Return the [start, end) datetimes covering days start..end inclusive."""
+    return day_start(start), day_start(end + timedelta(days=1))
+
+
+def month_window(year, month):
+    """Return the [start, end) datetimes of one calendar month."""
+    first = datetime(year, month, 1).date()
+    next_first = datetime(year + month // 12, month % 12 + 1, 1).date()
+    return day_start(first), day_start(next_first)
+
+
+def window_q(field, start, end):
+    """Q object for `start <= field < end`."""
+    return Q(**{f'{field}__gte': start, f'{field}__lt': end})
+
+
+def days_q(field, days):
+    """Q object matching any of `days`, one range per run of consecutive days.
+
+    Args:
+        field: Name of a DateTimeField (e.g. 'start_time')
+        days: Iterable of datetime.date
+    """
+    query = Q(pk__in=[])
+    run_start = previous = None
+    for day in sorted(set(days)):
+        if previous is not None and day != previous + timedelta(days=1):
+            query |= window_q(field, *range_window(run_start, previous))
+            run_start = None
+        if run_start is None:
+            run_start = day
+        previous = day
+    if run_start is not None:
+        query |= window_q(field, *range_window(run_start, previous))
+    return query
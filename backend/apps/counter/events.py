@@ -0,0 +1,205 @@
+"""
+Change events for live screens (Server-Sent Events).
+
+Model changes are published to a broker once their transaction commits;
+the /api/events/ stream relays them to every connected tablet.
+
+Brokers (settings.EVENT_BROKER):
+- 'memory': in-process fan-out, for a single gunicorn process
+- 'redis': Redis pub/sub (requires the `redis` package and REDIS_URL)
+- 'postgres': PostgreSQL LISTEN/NOTIFY on the default database
+
+EventSource cannot send an Authorization header, so a stream is opened
+with a ticket: a signed, single-use token that only grants the stream and
+expires after TICKET_SECONDS. Access tokens never appear in stream URLs
+(and so in access logs).
+"""
+import json
+import queue
+import select
+import threading
+import uuid
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+CHANNEL = 'counter_events'
+
+# Events kept per subscriber before the oldest ones are dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Seconds a stream ticket can be redeemed after it was issued
+TICKET_SECONDS = 30
+TICKET_SALT = 'counter.events.ticket'
+
+
+class InMemoryBroker:
+    """Fan-out to subscriber queues living in this process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = set()
+
+    def publish(self, event):
+        with self._lock:
+            queues = list(self._queues)
+        for subscriber_queue in queues:
+            try:
+                subscriber_queue.put_nowait(event)
+            except queue.Full:
+                # Slow consumer: drop its oldest event rather than block
+                try:
+                    subscriber_queue.get_nowait()
+                    subscriber_queue.put_nowait(event)
+                except (queue.Empty, queue.Full):
+                    pass
+
+    def subscribe(self):
+        subscriber_queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._queues.add(subscriber_queue)
+        return InMemorySubscription(self, subscriber_queue)
+
+    def _unsubscribe(self, subscriber_queue):
+        with self._lock:
+            self._queues.discard(subscriber_queue)
+
+
+class InMemorySubscription:
+    def __init__(self, broker, subscriber_queue):
+        self._broker = broker
+        self._queue = subscriber_queue
+
+    def get(self, timeout):
+        """Return the next event, or None after `timeout` seconds."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self._broker._unsubscribe(self._queue)
+
+
+class RedisBroker:
+    """Redis pub/sub, shared by every worker connected to the same Redis."""
+
+    def __init__(self, url):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, event):
+        self._client.publish(CHANNEL, json.dumps(event))
+
+    def subscribe(self):
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(CHANNEL)
+        return RedisSubscription(pubsub)
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self._pubsub = pubsub
+
+    def get(self, timeout):
+        message = self._pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+    def close(self):
+        self._pubsub.close()
+
+
+class PostgresBroker:
+    """PostgreSQL LISTEN/NOTIFY on the default database."""
+
+    def publish(self, event):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, json.dumps(event)])
+
+    def subscribe(self):
+        import psycopg2
+
+        db = settings.DATABASES['default']
+        listener = psycopg2.connect(
+            dbname=db['NAME'], user=db['USER'], password=db['PASSWORD'],
+            host=db['HOST'], port=db['PORT'],
+        )
+        listener.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with listener.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+        return PostgresSubscription(listener)
+
+
+class PostgresSubscription:
+    def __init__(self, listener):
+        self._listener = listener
+
+    def get(self, timeout):
+        if not self._listener.notifies:
+            if select.select([self._listener], [], [], timeout) == ([], [], []):
+                return None
+            self._listener.poll()
+        if not self._listener.notifies:
+            return None
+        return json.loads(self._listener.notifies.pop(0).payload)
+
+    def close(self):
+        self._listener.close()
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Return the process-wide broker configured by settings.EVENT_BROKER."""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                name = getattr(settings, 'EVENT_BROKER', 'memory')
+                if name == 'redis':
+                    _broker = RedisBroker(settings.REDIS_URL)
+                elif name == 'postgres':
+                    _broker = PostgresBroker()
+                else:
+                    _broker = InMemoryBroker()
+    return _broker
+
+
+def publish(event_type, **data):
+    """Publish an event once the current transaction commits.
+
+    Args:
+        event_type: Dotted name such as 'billiard.stopped'
+        **data: JSON-serializable payload (ids, table, is_paid...)
+    """
+    event = {'type': event_type, 'at': timezone.now().isoformat(), **data}
+    transaction.on_commit(lambda: get_broker().publish(event))
+
+
+def issue_ticket(user):
+    """Return a ticket that opens one event stream as `user`."""
+    return signing.dumps({'user': user.pk, 'nonce': uuid.uuid4().hex}, salt=TICKET_SALT)
+
+
+def redeem_ticket(ticket):
+    """Return the user id of a ticket, or None if it is invalid, expired or used.
+
+    Used nonces are remembered in the cache until the ticket expires
+    anyway, so every ticket opens a single stream.
+    """
+    try:
+        payload = signing.loads(ticket, salt=TICKET_SALT, max_age=TICKET_SECONDS)
+    except signing.BadSignature:
+        return None
+    if not cache.add(f'counter:events-ticket:{payload["nonce"]}', True, TICKET_SECONDS):
+        return None
+    return payload['user']
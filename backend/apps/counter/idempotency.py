@@ -0,0 +1,64 @@
+"""
+Idempotency keys for retried write requests.
+
+A client that may retry a request (flaky Wi-Fi, double tap) sends a key
+with it. The first request reserves the key inside its transaction and
+stores its response there; a retry with the same key gets that response
+back without touching the data again. Reusing a key for a different
+payload is refused. Keys expire after IDEMPOTENCY_TTL; each scope prunes
+only its own keys, so a scope can keep its keys longer (see
+apps.counter.operations).
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_TTL = timedelta(hours=24)
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different payload."""
+
+
+def fingerprint(payload):
+    """Stable hash of a JSON-serializable request payload."""
+    raw = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def reserve(scope, key, payload):
+    """Reserve `key` for this request, or return the response it already got.
+
+    Must be called inside transaction.atomic(): a concurrent request with
+    the same key waits on the unique constraint until this one commits.
+
+    Returns:
+        tuple (record, previous response or None)
+
+    Raises:
+        IdempotencyConflict: if the key was used with another payload
+    """
+    IdempotencyKey.objects.filter(
+        scope=scope, created_at__lt=timezone.now() - IDEMPOTENCY_TTL
+    ).delete()
+
+    digest = fingerprint(payload)
+    record, created = IdempotencyKey.objects.get_or_create(
+        scope=scope, key=key, defaults={'fingerprint': digest}
+    )
+    if created:
+        return record, None
+    if record.fingerprint != digest:
+        raise IdempotencyConflict(key)
+    return record, record.response
+
+
+def store(record, response):
+    """Keep the response of a reserved key for replays."""
+    record.response = response
+    record.save(update_fields=['response'])
@@ -0,0 +1,188 @@
+"""
+Client ledger - per-client visits, spending and unpaid balances.
+
+Each revenue source is aggregated once with a GROUP BY on the client name
+(conditional aggregation for the unpaid figures). Rows linked to a Client
+are grouped under its canonical name, so spelling variants of one client
+share a single ledger row. The per-source rows are
+combined with UNION ALL and folded into one row per client by an outer
+GROUP BY, so the query count does not depend on the number of clients.
+"""
+from django.db import connection
+from django.db.models import CharField, Count, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .clients import ANONYMOUS_NAMES, client_q, find_client
+from .models import BilliardSession, BarOrder
+
+# Public ordering keys -> SQL expression over the folded ledger columns
+LEDGER_ORDERING = {
+    'name': 'name',
+    'total_visits': 'total_visits',
+    'total_spent': 'total_spent',
+    'total_unpaid': 'total_unpaid',
+    'unpaid_count': 'unpaid_count',
+    'billiard_sessions': 'billiard_sessions',
+    'bar_orders': 'bar_orders',
+}
+DEFAULT_LEDGER_ORDERING = '-total_visits'
+
+# Column order shared by every branch of the UNION
+_LEDGER_COLUMNS = (
+    'name', 'billiard_sessions', 'billiard_total',
+    'bar_orders', 'bar_total', 'unpaid_total', 'unpaid_count',
+)
+
+
+def _zero():
+    return Value(0, output_field=IntegerField())
+
+
+def _clients(queryset, client_filter=None):
+    """Restrict to one client (a client_q() filter), or to every non anonymous client."""
+    if client_filter is not None:
+        return queryset.filter(client_filter)
+    return queryset.exclude(client__isnull=True, client_name__in=ANONYMOUS_NAMES)
+
+
+def _client_name(name=None):
+    """Ledger name column.
+
+    The requested name for a single-client ledger; otherwise the canonical
+    client name, or the typed name for rows not linked yet.
+    """
+    if name is not None:
+        return Value(name, output_field=CharField())
+    return Coalesce('client__name', 'client_name')
+
+
+def _billiard_ledger(client_filter=None, name=None):
+    """One row per client with billiard aggregates and zeroed bar columns."""
+    unpaid = Q(is_paid=False)
+    return (
+        _clients(BilliardSession.objects, client_filter)
+        .values(name=_client_name(name))
+        .annotate(
+            billiard_sessions=Count('id'),
+            billiard_total=Coalesce(Sum('price'), 0),
+            bar_orders=_zero(),
+            bar_total=_zero(),
+            unpaid_total=Coalesce(Sum('price', filter=unpaid), 0),
+            unpaid_count=Count('id', filter=unpaid),
+        )
+        .values_list(*_LEDGER_COLUMNS)
+        .order_by()
+    )
+
+
+def _bar_ledger(client_filter=None, name=None):
+    """One row per client with bar aggregates and zeroed billiard columns."""
+    unpaid = Q(is_paid=False)
+    return (
+        _clients(BarOrder.objects, client_filter)
+        .values(name=_client_name(name))
+        .annotate(
+            billiard_sessions=_zero(),
+            billiard_total=_zero(),
+            bar_orders=Count('id'),
+            bar_total=Coalesce(Sum('total_price'), 0),
+            unpaid_total=Coalesce(Sum('total_price', filter=unpaid), 0),
+            unpaid_count=Count('id', filter=unpaid),
+        )
+        .values_list(*_LEDGER_COLUMNS)
+        .order_by()
+    )
+
+
+def parse_ordering(ordering):
+    """Translate an ordering key like '-total_spent' into an ORDER BY clause.
+
+    Unknown keys fall back to DEFAULT_LEDGER_ORDERING. Ties are always broken
+    by client name so pagination is stable.
+
+    Returns:
+        str: SQL ORDER BY clause (without the keywords)
+    """
+    ordering = ordering or DEFAULT_LEDGER_ORDERING
+    descending = ordering.startswith('-')
+    key = ordering.lstrip('-')
+    if key not in LEDGER_ORDERING:
+        return parse_ordering(DEFAULT_LEDGER_ORDERING)
+
+    clause = f"{LEDGER_ORDERING[key]} {'DESC' if descending else 'ASC'}"
+    if key != 'name':
+        clause += ', name ASC'
+    return clause
+
+
+class ClientLedger:
+    """Aggregated per-client statistics across billiard sessions and bar orders.
+
+    Pass `name` to compute the ledger row of a single client (anonymous
+    placeholder names included).
+    """
+
+    def __init__(self, ordering=None, name=None):
+        self.order_by = parse_ordering(ordering)
+        self.name = name
+        self.client_filter = None if name is None else client_q(find_client(name), name)
+
+    def _union_sql(self):
+        union = _billiard_ledger(self.client_filter, self.name).union(
+            _bar_ledger(self.client_filter, self.name), all=True
+        )
+        return union.query.sql_with_params()
+
+    def count(self):
+        """Return the number of distinct (non anonymous) clients."""
+        union_sql, params = self._union_sql()
+        sql = (
+            f"SELECT COUNT(*) FROM ("
+            f"SELECT name FROM ({union_sql}) ledger GROUP BY name"
+            f") clients"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()[0]
+
+    def rows(self, limit=None, offset=0):
+        """Return ledger rows as dicts, ordered and optionally sliced in SQL.
+
+        Args:
+            limit: Maximum number of rows (None for all)
+            offset: Number of rows to skip
+
+        Returns:
+            list of dicts in the shape served by the clients endpoint
+        """
+        union_sql, params = self._union_sql()
+        sql = f"""
+            SELECT
+                name,
+                SUM(billiard_sessions) AS billiard_sessions,
+                SUM(billiard_total) AS billiard_total,
+                SUM(bar_orders) AS bar_orders,
+                SUM(bar_total) AS bar_total,
+                SUM(billiard_sessions) + SUM(bar_orders) AS total_visits,
+                SUM(billiard_total) + SUM(bar_total) AS total_spent,
+                SUM(unpaid_total) AS total_unpaid,
+                SUM(unpaid_count) AS unpaid_count
+            FROM ({union_sql}) ledger
+            GROUP BY name
+            ORDER BY {self.order_by}
+        """
+        params = list(params)
+        if limit is not None:
+            sql += ' LIMIT %s OFFSET %s'
+            params += [int(limit), int(offset)]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            columns = [col[0] for col in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+        for row in rows:
+            for key in columns[1:]:
+                row[key] = int(row[key] or 0)
+            row['has_unpaid'] = row['unpaid_count'] > 0
+        return rows
@@ -0,0 +1,30 @@
+"""
+Transaction-scoped locks for the rollup refreshes.
+
+A refresh reads the raw rows of some days and rewrites their rollup rows.
+Two transactions refreshing the same day at once would each aggregate
+their own snapshot and then collide on (or duplicate) the rollup rows, so a
+refresh locks the days it rewrites first and aggregates afterwards.
+
+On PostgreSQL the lock is a transaction-level advisory lock per (rollup,
+day). SQLite serializes writers with its database-wide write lock, so
+nothing is taken there.
+"""
+import zlib
+
+from django.db import connection
+
+
+def lock_days(rollup, days):
+    """Lock `days` of the rollup named `rollup` until the transaction ends.
+
+    Must run inside transaction.atomic(). Days are locked in date order so
+    two refreshes of overlapping days cannot deadlock.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    # pg_advisory_xact_lock(int4, int4): rollup namespace, then the day
+    namespace = zlib.crc32(rollup.encode()) & 0x7fffffff
+    with connection.cursor() as cursor:
+        for day in sorted(set(days)):
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [namespace, day.toordinal()])
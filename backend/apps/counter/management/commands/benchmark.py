@@ -0,0 +1,311 @@
+"""
+Management command to benchmark the counter hot paths.
+
+Every scenario seeds its own synthetic data inside a transaction that is
+rolled back at the end, so it can be run safely against any database.
+
+The scenarios report timings; query counts, index use and concurrent
+writes are asserted by the test suite (apps/counter/tests.py).
+
+Usage:
+    python manage.py benchmark ledger --sizes 10 100 1000
+    python manage.py benchmark pricing --sizes 1000000
+    python manage.py benchmark date_window --sizes 1000000
+    python manage.py benchmark bar_sales --sizes 100000
+    python manage.py benchmark occupancy --sizes 20000
+    python manage.py benchmark client_search --sizes 1000 50000
+    python manage.py benchmark timeline --sizes 10 100 1000
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.counter.models import (
+    BilliardSession, BarOrder, BarOrderLine, Client, InventoryItem, PS4Session
+)
+
+
+class _Rollback(Exception):
+    """Raised to discard the data seeded by a scenario."""
+
+
+def seed_clients(count, visits_per_client=3):
+    """Create `count` clients, each with billiard sessions and bar orders."""
+    sessions = []
+    orders = []
+    for i in range(count):
+        name = f'Bench client {i:06d}'
+        for v in range(visits_per_client):
+            sessions.append(BilliardSession(
+                table_identifier='A' if v % 2 else 'B',
+                client_name=name,
+                duration_seconds=1800,
+                price=4000,
+                is_active=False,
+                is_paid=bool(v % 2),
+            ))
+            orders.append(BarOrder(
+                client_name=name,
+                items=[{'item_id': 1, 'name': 'Café', 'price': 500, 'quantity': 2}],
+                total_price=1000,
+                is_paid=bool(v % 3),
+            ))
+    BilliardSession.objects.bulk_create(sessions, batch_size=1000)
+    BarOrder.objects.bulk_create(orders, batch_size=1000)
+
+
+def bench_ledger(size):
+    """Clients ledger: full list and one page."""
+    from apps.counter.ledger import ClientLedger
+
+    seed_clients(size)
+    ledger = ClientLedger()
+    start = time.perf_counter()
+    rows = ledger.rows()
+    ledger.count()
+    ledger.rows(limit=50, offset=0)
+    return {'rows': len(rows), 'seconds': time.perf_counter() - start}
+
+
+def bench_pricing(size):
+    """Batch pricing of `size` historical durations (no database access)."""
+    import random
+    from apps.counter.pricing import PriceSchedule
+
+    durations = [random.randint(0, 4 * 3600) for _ in range(size)]
+    schedule = PriceSchedule()
+    start = time.perf_counter()
+    schedule.price_many(durations)
+    return {'durations': size, 'seconds': time.perf_counter() - start}
+
+
+def seed_sessions(count, days=365, batch_size=10000):
+    """Create `count` finished billiard sessions spread over the last `days`."""
+    now = timezone.now()
+    step = days * 86400 // max(count, 1)
+    for offset in range(0, count, batch_size):
+        BilliardSession.objects.bulk_create([
+            BilliardSession(
+                table_identifier='A' if i % 2 else 'B',
+                client_name='Anonyme',
+                start_time=now - timedelta(seconds=i * step),
+                duration_seconds=1800,
+                price=4000,
+                is_active=False,
+            )
+            for i in range(offset, min(offset + batch_size, count))
+        ], batch_size=batch_size)
+
+
+def bench_date_window(size):
+    """One day and one month of sessions: `__date` lookup vs [start, end) window."""
+    from apps.counter.dates import day_window, month_window, window_q
+
+    seed_sessions(size)
+    today = timezone.localdate()
+    day = today - timedelta(days=30)
+    day_range = day_window(day)
+    month_range = month_window(day.year, day.month)
+
+    def timed(queryset):
+        start = time.perf_counter()
+        count = queryset.count()
+        return count, time.perf_counter() - start
+
+    sessions = BilliardSession.objects.order_by()
+    day_count, lookup_day = timed(sessions.filter(start_time__date=day))
+    window_count, window_day = timed(sessions.filter(window_q('start_time', *day_range)))
+    if day_count != window_count:
+        raise CommandError(f'Day window mismatch: {day_count} != {window_count}')
+    _, lookup_month = timed(sessions.filter(
+        start_time__date__gte=month_range[0].date(),
+        start_time__date__lt=month_range[1].date(),
+    ))
+    _, window_month = timed(sessions.filter(window_q('start_time', *month_range)))
+    return {
+        'day_rows': day_count,
+        'date_lookup_day': lookup_day,
+        'window_day': window_day,
+        'date_lookup_month': lookup_month,
+        'window_month': window_month,
+    }
+
+
+def seed_bar_year(count, items=20):
+    """Create `count` two-line bar orders spread over the last 365 days."""
+    inventory = InventoryItem.objects.bulk_create([
+        InventoryItem(name=f'Bench item {i:02d}', price=500 + 100 * i) for i in range(items)
+    ])
+    per_day = max(1, count // 365)
+    now = timezone.now()
+    created = 0
+    for day in range(365):
+        if created >= count:
+            break
+        orders = BarOrder.objects.bulk_create([
+            BarOrder(client_name='Anonyme', total_price=0) for _ in range(min(per_day, count - created))
+        ])
+        # auto_now_add ignores explicit values; move the day's orders afterwards
+        when = now - timedelta(days=day)
+        BarOrder.objects.filter(pk__in=[o.pk for o in orders]).update(
+            timestamp=when, date=timezone.localdate(when)
+        )
+        BarOrderLine.objects.bulk_create([
+            BarOrderLine(
+                order=order, item=item, name=item.name, unit_price=item.price, quantity=1 + n % 3
+            )
+            for n, order in enumerate(orders)
+            for item in (inventory[n % items], inventory[(n * 7) % items])
+        ])
+        created += len(orders)
+
+    from apps.counter import bar_sales
+    bar_sales.rebuild()
+
+
+def bench_bar_sales(size):
+    """Per-item sales over a year of orders: top 10 plus weekly buckets."""
+    from apps.counter import bar_sales
+
+    seed_bar_year(size)
+    end = timezone.localdate()
+    start = end - timedelta(days=364)
+    begin = time.perf_counter()
+    items = bar_sales.top_items(start, end)
+    buckets = bar_sales.item_buckets(start, end, 'week', items)
+    return {'items': len(items), 'buckets': len(buckets), 'seconds': time.perf_counter() - begin}
+
+
+def bench_occupancy(size):
+    """Table occupancy over two years: cold run, then cached closed days."""
+    from apps.counter import occupancy
+
+    seed_sessions(size, days=730)
+    end = timezone.localdate()
+    start = end - timedelta(days=729)
+
+    begin = time.perf_counter()
+    occupancy.summarize(start, end)
+    cold = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    occupancy.summarize(start, end)
+    return {'cold_seconds': cold, 'seconds': time.perf_counter() - begin}
+
+
+def bench_client_search(size):
+    """Autocomplete lookups over `size` clients (first lookup builds the index)."""
+    import random
+
+    from apps.counter import client_search
+
+    first_names = ['Sami', 'Élodie', 'Hédi', 'Amira', 'Yassine', 'Chloé', 'Nour', 'Zied']
+    rng = random.Random(0)
+    names = [f'{rng.choice(first_names)} Bench {i:06d}' for i in range(size)]
+    Client.objects.bulk_create([
+        Client(name=name, normalized_name=client_search.normalize_name(name)) for name in names
+    ], batch_size=1000)
+    client_search.invalidate()
+
+    queries = ['elo', 'HEDI', 'bench 0001', 'chl', 'nour bench 00004', 'zz']
+    begin = time.perf_counter()
+    client_search.search_clients(queries[0])
+    cold = time.perf_counter() - begin
+
+    begin = time.perf_counter()
+    for _ in range(50):
+        for query in queries:
+            client_search.search_clients(query)
+    elapsed = time.perf_counter() - begin
+    client_search.invalidate()
+    return {'cold_seconds': cold, 'lookup_ms': elapsed / (50 * len(queries)) * 1000}
+
+
+def bench_timeline(size):
+    """Page through one client's timeline of `size` rows per source."""
+    from apps.counter.clients import normalize_name
+    from apps.counter.timeline import client_timeline
+
+    name = 'Bench timeline client'
+    client = Client.objects.create(name=name, normalized_name=normalize_name(name))
+    now = timezone.now()
+    BilliardSession.objects.bulk_create([
+        BilliardSession(
+            table_identifier='A', client=client, client_name=name,
+            start_time=now - timedelta(minutes=i), duration_seconds=1800,
+            price=4000, is_active=False,
+        )
+        for i in range(size)
+    ], batch_size=1000)
+    # PS4 sessions and bar orders all get the same auto_now_add timestamp,
+    # so pages break inside runs of equal timestamps
+    PS4Session.objects.bulk_create([
+        PS4Session(game_name='Bench game', duration_minutes=15, price=1500, client=client)
+        for _ in range(size)
+    ], batch_size=1000)
+    BarOrder.objects.bulk_create([
+        BarOrder(client=client, client_name=name, items=[], total_price=1000)
+        for _ in range(size)
+    ], batch_size=1000)
+
+    # The first call fills per-process caches (settings, tariff)
+    client_timeline(name)
+    begin = time.perf_counter()
+    entries, cursor = client_timeline(name)
+    elapsed = time.perf_counter() - begin
+
+    served = [(entry['type'], entry['id']) for entry in entries]
+    pages = 1
+    while cursor:
+        entries, cursor = client_timeline(name, cursor=cursor)
+        served += [(entry['type'], entry['id']) for entry in entries]
+        pages += 1
+    if len(served) != 3 * size or len(set(served)) != len(served):
+        raise CommandError(
+            f'timeline served {len(served)} entries ({len(set(served))} distinct) '
+            f'for {3 * size} rows'
+        )
+    return {'pages': pages, 'seconds': elapsed}
+
+
+SCENARIOS = {
+    'bar_sales': bench_bar_sales,
+    'client_search': bench_client_search,
+    'date_window': bench_date_window,
+    'occupancy': bench_occupancy,
+    'ledger': bench_ledger,
+    'pricing': bench_pricing,
+    'timeline': bench_timeline,
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark counter hot paths on synthetic data (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(SCENARIOS))
+        parser.add_argument(
+            '--sizes', nargs='+', type=int, default=[10, 100, 1000],
+            help='Data sizes to run the scenario with'
+        )
+
+    def handle(self, *args, **options):
+        scenario = SCENARIOS[options['scenario']]
+
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    result = scenario(size)
+                    raise _Rollback
+            except _Rollback:
+                pass
+            details = ', '.join(
+                f'{key}={value:.4f}' if isinstance(value, float) else f'{key}={value}'
+                for key, value in result.items()
+            )
+            self.stdout.write(f'{options["scenario"]} size={size}: {details}')
+
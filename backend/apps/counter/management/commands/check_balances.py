@@ -0,0 +1,43 @@
+"""
+Management command to verify the ClientBalance table.
+
+Every balance is recomputed in bulk from the raw sessions and orders
+(one grouped query per source) and compared with the stored row. Drift is
+reported per client; --fix rebuilds the table.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.counter import balances
+from apps.counter.models import Client
+
+
+class Command(BaseCommand):
+    help = 'Check stored client balances against sessions and orders and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix', action='store_true',
+            help='Rebuild the balances when drift is found',
+        )
+
+    def handle(self, *args, **options):
+        mismatches = balances.drift()
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('Client balances are consistent'))
+            return
+
+        names = dict(
+            Client.objects.filter(pk__in=[pk for pk, _, _ in mismatches]).values_list('pk', 'name')
+        )
+        for pk, stored, expected in mismatches:
+            fields = ', '.join(
+                f'{field} {stored[field]} != {expected[field]}'
+                for field in balances.BALANCE_FIELDS
+                if stored[field] != expected[field]
+            )
+            self.stdout.write(self.style.WARNING(f'{names.get(pk, pk)}: {fields}'))
+
+        if not options['fix']:
+            raise CommandError(f'{len(mismatches)} client balances drifted (run with --fix)')
+        count = balances.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Client balances rebuilt: {count} rows'))
@@ -0,0 +1,124 @@
+"""
+Management command to link existing sessions and orders to their Client.
+
+Rows without a client are read in primary-key chunks, their client_name
+is normalized and matched against the Client table, and the links are
+written with one bulk update per chunk, followed by a refresh of the
+balances of the clients in that chunk. Names without a registered client
+(walk-ins) and anonymous rows are left unlinked, unless --create-missing
+registers a client for every such name. Safe to re-run: linked rows are
+skipped.
+"""
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from apps.counter import balances
+from apps.counter.clients import display_name, is_anonymous, normalize_name
+from apps.counter.models import BarOrder, BilliardSession, Client
+
+
+class Command(BaseCommand):
+    help = 'Link billiard sessions and bar orders to their Client from client_name'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Rows read and updated per batch (default 2000)',
+        )
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Register a client for every unmatched name (they are listed as registered clients)',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Report what would be linked without writing anything',
+        )
+
+    def handle(self, *args, **options):
+        self.chunk_size = max(1, options['chunk_size'])
+        self.create_missing = options['create_missing']
+        self.dry_run = options['dry_run']
+        self.created = 0
+
+        # Normalized name -> client id; the oldest client wins on duplicates
+        self.client_ids = {}
+        for pk, key in Client.objects.order_by('-pk').values_list('id', 'normalized_name'):
+            self.client_ids[key] = pk
+
+        for model in (BilliardSession, BarOrder):
+            linked, skipped = self.link(model)
+            self.stdout.write(
+                f'{model.__name__}: {linked} rows linked, {skipped} left unlinked'
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Clients {'to create' if self.dry_run else 'created'}: {self.created}"
+                f"{' (dry run, nothing written)' if self.dry_run else ''}"
+            )
+        )
+        self.report_duplicates()
+
+    def link(self, model):
+        """Link every unlinked row of `model`; returns (linked, skipped)."""
+        linked = skipped = 0
+        last_pk = 0
+        while True:
+            chunk = list(
+                model.objects.filter(client__isnull=True, pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', 'client_name')[:self.chunk_size]
+            )
+            if not chunk:
+                return linked, skipped
+            last_pk = chunk[-1][0]
+
+            rows = []
+            for pk, name in chunk:
+                client_id = self.client_for(name)
+                if client_id is None:
+                    skipped += 1
+                else:
+                    rows.append(model(pk=pk, client_id=client_id))
+            linked += len(rows)
+            if rows and not self.dry_run:
+                model.objects.bulk_update(rows, ['client'], batch_size=self.chunk_size)
+                # bulk_update sends no signals
+                balances.refresh_clients({row.client_id for row in rows})
+
+    def client_for(self, name):
+        """Client id for `name`, creating the client if asked to."""
+        if is_anonymous(name):
+            return None
+        key = normalize_name(name)
+        if key in self.client_ids:
+            return self.client_ids[key]
+        if not self.create_missing:
+            return None
+
+        self.created += 1
+        if self.dry_run:
+            # Negative placeholder so the client is only counted once
+            self.client_ids[key] = -self.created
+        else:
+            client, _ = Client.objects.get_or_create(name=display_name(name))
+            self.client_ids[key] = client.pk
+        return self.client_ids[key]
+
+    def report_duplicates(self):
+        """Warn about clients that only differ by accents, case or spacing."""
+        duplicates = (
+            Client.objects.values('normalized_name')
+            .annotate(count=Count('id'))
+            .filter(count__gt=1)
+            .order_by('normalized_name')
+        )
+        for row in duplicates:
+            names = Client.objects.filter(
+                normalized_name=row['normalized_name']
+            ).order_by('pk').values_list('name', flat=True)
+            self.stdout.write(
+                self.style.WARNING(
+                    f"Duplicate clients: {', '.join(names)} (the first one is used)"
+                )
+            )
@@ -0,0 +1,18 @@
+"""
+Management command to rebuild the daily revenue rollup from scratch.
+
+Also rebuilds the per-item BarItemSales rollup and the client balances.
+"""
+from django.core.management.base import BaseCommand
+
+from apps.counter import rollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailyRevenue, BarItemSales and ClientBalance tables from sessions and orders'
+
+    def handle(self, *args, **options):
+        count = rollup.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f'Daily revenue rebuilt: {count} rows')
+        )
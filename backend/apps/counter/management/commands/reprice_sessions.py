@@ -0,0 +1,115 @@
+"""
+Management command to reprice historical billiard sessions.
+
+Streams finished sessions in chunks, prices them with the current tariff
+(or an overridden one) and writes the changed prices back with
+bulk_update. Memory use does not depend on the number of sessions.
+
+Usage:
+    python manage.py reprice_sessions --dry-run
+    python manage.py reprice_sessions --start-date 2025-01-01 --table A
+    python manage.py reprice_sessions --dry-run --rate-base 160 --floor-mid 1600
+"""
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.counter import rollup
+from apps.counter.dates import day_start
+from apps.counter.models import BilliardSession
+from apps.counter.pricing import current_schedule
+
+
+TARIFF_OPTIONS = ('rate_base', 'rate_reduced', 'threshold_mins', 'floor_min', 'floor_mid')
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f'Invalid date "{value}", use YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Reprice finished billiard sessions with the current (or a simulated) tariff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report the delta without writing')
+        parser.add_argument('--start-date', help='First session day (YYYY-MM-DD)')
+        parser.add_argument('--end-date', help='Last session day, inclusive (YYYY-MM-DD)')
+        parser.add_argument('--table', choices=['A', 'B'], help='Only this table')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows per batch')
+        for option in TARIFF_OPTIONS:
+            parser.add_argument(
+                f'--{option.replace("_", "-")}', type=int, dest=option,
+                help=f'Override {option} from AppSettings'
+            )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        overrides = {key: options[key] for key in TARIFF_OPTIONS if options[key] is not None}
+        schedule = replace(current_schedule(), **overrides)
+
+        queryset = BilliardSession.objects.filter(is_active=False)
+        if options['start_date']:
+            queryset = queryset.filter(start_time__gte=day_start(_parse_date(options['start_date'])))
+        if options['end_date']:
+            end_date = _parse_date(options['end_date'])
+            queryset = queryset.filter(start_time__lt=day_start(end_date + timedelta(days=1)))
+        if options['table']:
+            queryset = queryset.filter(table_identifier=options['table'])
+
+        rows = queryset.order_by().values_list('id', 'duration_seconds', 'price').iterator(
+            chunk_size=chunk_size
+        )
+
+        stats = {'scanned': 0, 'changed': 0, 'old_total': 0, 'new_total': 0}
+        with rollup.batch():
+            chunk = []
+            for row in rows:
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    self._process_chunk(chunk, schedule, stats, options['dry_run'])
+                    chunk = []
+            if chunk:
+                self._process_chunk(chunk, schedule, stats, options['dry_run'])
+
+            if stats['changed'] and not options['dry_run']:
+                rollup.mark_queryset_dirty('billiard', queryset)
+
+        delta = stats['new_total'] - stats['old_total']
+        self.stdout.write(f"Tariff: {schedule.as_dict()}")
+        self.stdout.write(
+            f"Sessions scanned: {stats['scanned']}, repriced: {stats['changed']}"
+        )
+        self.stdout.write(
+            f"Revenue: {stats['old_total'] / 1000:.3f} DT -> {stats['new_total'] / 1000:.3f} DT "
+            f"(delta {delta / 1000:+.3f} DT)"
+        )
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Dry run: nothing written'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Sessions repriced'))
+
+    def _process_chunk(self, chunk, schedule, stats, dry_run):
+        """Price one chunk of (id, duration_seconds, price) rows."""
+        prices = schedule.price_many(duration for _, duration, _ in chunk)
+
+        changed = []
+        for (pk, _, old_price), new_price in zip(chunk, prices):
+            stats['old_total'] += old_price
+            stats['new_total'] += new_price
+            if new_price != old_price:
+                changed.append(BilliardSession(pk=pk, price=new_price))
+
+        stats['scanned'] += len(chunk)
+        stats['changed'] += len(changed)
+
+        if changed and not dry_run:
+            with transaction.atomic():
+                BilliardSession.objects.bulk_update(changed, ['price'])
@@ -0,0 +1,86 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:34
+
+from django.db import migrations, models
+
+
+def backfill_daily_revenue(apps, schema_editor):
+    """Fill the rollup with one GROUP BY (day, is_paid) per source.
+
+    Self-contained (historical models only), so later changes to
+    apps.counter.rollup cannot break this migration.
+    """
+    from collections import defaultdict
+
+    from django.db.models import Count, F, Sum
+    from django.db.models.functions import TruncDate
+
+    DailyRevenue = apps.get_model('counter', 'DailyRevenue')
+    grouped = {
+        'billiard': (
+            apps.get_model('counter', 'BilliardSession').objects.filter(is_active=False)
+            .annotate(day=TruncDate('start_time'))
+            .values('day', 'is_paid')
+            .annotate(count=Count('id'), total=Sum('price'))
+        ),
+        'ps4': (
+            apps.get_model('counter', 'PS4Session').objects
+            .values('is_paid', day=F('date'))
+            .annotate(count=Count('id'), total=Sum('price'))
+        ),
+        'bar': (
+            apps.get_model('counter', 'BarOrder').objects
+            .values('is_paid', day=F('date'))
+            .annotate(count=Count('id'), total=Sum('total_price'))
+        ),
+    }
+
+    rows = defaultdict(lambda: {'paid_count': 0, 'paid_total': 0, 'unpaid_count': 0, 'unpaid_total': 0})
+    for source, queryset in grouped.items():
+        for entry in queryset.order_by():
+            row = rows[(entry['day'], source)]
+            prefix = 'paid' if entry['is_paid'] else 'unpaid'
+            row[f'{prefix}_count'] += entry['count']
+            row[f'{prefix}_total'] += entry['total'] or 0
+
+    DailyRevenue.objects.bulk_create(
+        [
+            DailyRevenue(date=day, source=source, **values)
+            for (day, source), values in rows.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0004_client_userprofile'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userprofile',
+            name='role',
+            field=models.CharField(choices=[('admin', 'Administrateur'), ('user', 'Utilisateur')], default='user', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('source', models.CharField(choices=[('billiard', 'Billard'), ('ps4', 'PS4'), ('bar', 'Bar')], max_length=10)),
+                ('paid_count', models.IntegerField(default=0)),
+                ('paid_total', models.IntegerField(default=0)),
+                ('unpaid_count', models.IntegerField(default=0)),
+                ('unpaid_total', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Revenu journalier',
+                'verbose_name_plural': 'Revenus journaliers',
+                'ordering': ['date', 'source'],
+                'unique_together': {('date', 'source')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_revenue, migrations.RunPython.noop),
+    ]
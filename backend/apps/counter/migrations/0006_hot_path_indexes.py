@@ -0,0 +1,101 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:41
+
+from django.db import migrations, models
+
+
+def close_duplicate_active_sessions(apps, schema_editor):
+    """Stop all but the newest active session of each table.
+
+    Older duplicates end when the next one started, so the unique
+    constraint below can be created on existing data.
+    """
+    BilliardSession = apps.get_model('counter', 'BilliardSession')
+    AppSettings = apps.get_model('counter', 'AppSettings')
+    settings = AppSettings.objects.filter(pk=1).first()
+
+    # Tariff rules as of this migration (see apps.counter.pricing), inlined
+    # so later changes to the pricing module cannot break it
+    rate_base = settings.rate_base if settings else 150
+    rate_reduced = settings.rate_reduced if settings else 135
+    threshold = settings.threshold_mins if settings else 15
+    floor_min = settings.floor_min if settings else 1000
+    floor_mid = settings.floor_mid if settings else 1500
+
+    def price(seconds):
+        minutes = seconds / 60
+        if minutes <= threshold:
+            amount = int(minutes * rate_base)
+        else:
+            amount = int(threshold * rate_base) + int((minutes - threshold) * rate_reduced)
+        if amount < floor_min:
+            return floor_min
+        if amount < floor_mid:
+            return floor_mid
+        return amount
+
+    tables = (
+        BilliardSession.objects.filter(is_active=True)
+        .order_by().values_list('table_identifier', flat=True).distinct()
+    )
+    for table_identifier in list(tables):
+        active = list(
+            BilliardSession.objects.filter(table_identifier=table_identifier, is_active=True)
+            .order_by('-start_time')
+        )
+        newer_start = None
+        for session in active:
+            if newer_start is not None:
+                duration = max(0, int((newer_start - session.start_time).total_seconds()))
+                session.end_time = newer_start
+                session.duration_seconds = duration
+                session.price = price(duration)
+                session.is_active = False
+                session.save(update_fields=['end_time', 'duration_seconds', 'price', 'is_active'])
+            newer_start = session.start_time
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0005_dailyrevenue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='barorder',
+            index=models.Index(fields=['client_name', 'is_paid'], name='bar_client_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='barorder',
+            index=models.Index(fields=['date'], name='bar_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='barorder',
+            index=models.Index(fields=['timestamp'], name='bar_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='billiardsession',
+            index=models.Index(fields=['client_name', 'is_paid'], name='billiard_client_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='billiardsession',
+            index=models.Index(fields=['start_time'], name='billiard_start_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='billiardsession',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['start_time'], name='billiard_active_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ps4session',
+            index=models.Index(fields=['date'], name='ps4_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ps4session',
+            index=models.Index(fields=['timestamp'], name='ps4_timestamp_idx'),
+        ),
+        migrations.RunPython(close_duplicate_active_sessions, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='billiardsession',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('table_identifier',), name='billiard_one_active_per_table'),
+        ),
+    ]
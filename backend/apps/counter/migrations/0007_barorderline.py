@@ -0,0 +1,110 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:45
+
+import logging
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_BATCH_SIZE = 2000
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_entry(entry):
+    """(item_id, name, unit_price, quantity) of one legacy JSON entry.
+
+    item_id is coerced to int, as older clients sent it as a string; an
+    id that is missing or not a number leaves the line unlinked.
+
+    Raises:
+        ValueError: the entry is not a dict or has no usable price or
+            positive quantity
+    """
+    if not isinstance(entry, dict):
+        raise ValueError(f'not an object: {entry!r}')
+    try:
+        unit_price = int(float(entry.get('price', 0)))
+        quantity = int(float(entry.get('quantity', 1)))
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f'bad price or quantity: {entry!r}')
+    if unit_price < 0 or quantity <= 0:
+        raise ValueError(f'bad price or quantity: {entry!r}')
+    try:
+        item_id = int(entry['item_id'])
+    except (KeyError, TypeError, ValueError, OverflowError):
+        item_id = None
+    return item_id, str(entry.get('name') or '')[:100], unit_price, quantity
+
+
+def backfill_order_lines(apps, schema_editor):
+    """Create BarOrderLine rows from the BarOrder.items JSON.
+
+    Orders are streamed so memory stays flat on large tables. Name and
+    price come from the JSON snapshot (what was actually charged); the
+    item link is kept only if that inventory item still exists. Entries
+    that cannot be parsed are skipped and logged; the order keeps its
+    stored total_price and items JSON.
+    """
+    BarOrder = apps.get_model('counter', 'BarOrder')
+    BarOrderLine = apps.get_model('counter', 'BarOrderLine')
+    InventoryItem = apps.get_model('counter', 'InventoryItem')
+
+    existing_items = set(InventoryItem.objects.values_list('id', flat=True))
+    lines = []
+    skipped = 0
+    orders = BarOrder.objects.order_by('pk').values_list('pk', 'items').iterator(
+        chunk_size=BACKFILL_BATCH_SIZE
+    )
+    for order_id, items in orders:
+        for entry in items if isinstance(items, list) else []:
+            try:
+                item_id, name, unit_price, quantity = _parse_entry(entry)
+            except ValueError as exc:
+                skipped += 1
+                logger.warning('BarOrder %s: skipped item entry, %s', order_id, exc)
+                continue
+            lines.append(BarOrderLine(
+                order_id=order_id,
+                item_id=item_id if item_id in existing_items else None,
+                name=name,
+                unit_price=unit_price,
+                quantity=quantity,
+            ))
+        if len(lines) >= BACKFILL_BATCH_SIZE:
+            BarOrderLine.objects.bulk_create(lines)
+            lines = []
+    BarOrderLine.objects.bulk_create(lines)
+    if skipped:
+        logger.warning('%s bar order item entries could not be converted', skipped)
+
+
+def remove_order_lines(apps, schema_editor):
+    apps.get_model('counter', 'BarOrderLine').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0006_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarOrderLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('unit_price', models.IntegerField()),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_lines', to='counter.inventoryitem')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='counter.barorder')),
+            ],
+            options={
+                'verbose_name': 'Ligne commande bar',
+                'verbose_name_plural': 'Lignes commande bar',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.RunPython(backfill_order_lines, remove_order_lines),
+    ]
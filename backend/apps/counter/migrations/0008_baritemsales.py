@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_bar_item_sales(apps, schema_editor):
+    """Aggregate the order lines per order day, local hour and item.
+
+    Self-contained (historical models only), so later changes to
+    apps.counter.bar_sales cannot break this migration.
+    """
+    from collections import defaultdict
+    from datetime import timedelta
+
+    from django.utils import timezone
+
+    BarItemSales = apps.get_model('counter', 'BarItemSales')
+    lines = apps.get_model('counter', 'BarOrderLine').objects.order_by().values_list(
+        'order__date', 'order__timestamp', 'item_id', 'name', 'quantity', 'unit_price'
+    )
+    rows = defaultdict(lambda: [0, 0])
+    for day, ordered_at, item_id, name, quantity, unit_price in lines.iterator(chunk_size=2000):
+        row = rows[(day, timezone.localtime(ordered_at).hour, item_id, name)]
+        row[0] += quantity
+        row[1] += quantity * unit_price
+
+    BarItemSales.objects.bulk_create(
+        [
+            BarItemSales(
+                date=day, hour=hour, week=day - timedelta(days=day.weekday()),
+                item_id=item_id, name=name, quantity=quantity, revenue=revenue,
+            )
+            for (day, hour, item_id, name), (quantity, revenue) in rows.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0007_barorderline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BarItemSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('hour', models.PositiveSmallIntegerField()),
+                ('week', models.DateField()),
+                ('name', models.CharField(max_length=100)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.IntegerField(default=0)),
+                ('item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='counter.inventoryitem')),
+            ],
+            options={
+                'verbose_name': 'Ventes bar par heure',
+                'verbose_name_plural': 'Ventes bar par heure',
+                'ordering': ['date', 'hour', 'name'],
+                'indexes': [models.Index(fields=['date'], name='bar_item_sales_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'hour', 'item', 'name'), name='bar_item_sales_key')],
+            },
+        ),
+        migrations.RunPython(backfill_bar_item_sales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0008_baritemsales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableOccupancyDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('stats', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Occupation tables (jour)',
+                'verbose_name_plural': 'Occupation tables (jours)',
+                'ordering': ['date'],
+            },
+        ),
+    ]
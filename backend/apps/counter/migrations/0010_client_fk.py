@@ -0,0 +1,89 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def _normalize_name(name):
+    """apps.counter.clients.normalize_name as of this migration."""
+    import unicodedata
+
+    decomposed = unicodedata.normalize('NFKD', ' '.join((name or '').split()))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return stripped.casefold()
+
+
+def fill_normalized_names(apps, schema_editor):
+    """Compute the matching key of existing clients."""
+    Client = apps.get_model('counter', 'Client')
+    clients = list(Client.objects.only('id', 'name'))
+    for client in clients:
+        client.normalized_name = _normalize_name(client.name)
+    Client.objects.bulk_update(clients, ['normalized_name'], batch_size=1000)
+
+
+def link_existing_rows(apps, schema_editor):
+    """Link sessions and orders to the existing client of their name.
+
+    Inline version of the link_clients command (no client is created), so
+    that the 0012 balance backfill counts every row of a registered client.
+    Names are matched on their normalized form; the oldest client wins.
+    """
+    from collections import defaultdict
+
+    anonymous = {'anonyme', 'anonymous'}
+    owner = {}
+    for pk, key in apps.get_model('counter', 'Client').objects.order_by('-pk').values_list(
+        'pk', 'normalized_name'
+    ):
+        owner[key] = pk
+
+    for model_name in ('BilliardSession', 'BarOrder'):
+        unlinked = apps.get_model('counter', model_name).objects.filter(client__isnull=True)
+        names_by_owner = defaultdict(list)
+        for name in unlinked.values_list('client_name', flat=True).distinct().order_by():
+            key = _normalize_name(name)
+            if key and key not in anonymous and key in owner:
+                names_by_owner[owner[key]].append(name)
+        for pk, names in names_by_owner.items():
+            unlinked.filter(client_name__in=names).update(client_id=pk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0009_tableoccupancyday'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='barorder',
+            name='client',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='bar_orders', to='counter.client'),
+        ),
+        migrations.AddField(
+            model_name='billiardsession',
+            name='client',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='billiard_sessions', to='counter.client'),
+        ),
+        migrations.AddField(
+            model_name='client',
+            name='normalized_name',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='ps4session',
+            name='client',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ps4_sessions', to='counter.client'),
+        ),
+        migrations.AddIndex(
+            model_name='barorder',
+            index=models.Index(fields=['client', 'is_paid'], name='bar_client_fk_paid_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='billiardsession',
+            index=models.Index(fields=['client', 'is_paid'], name='billiard_client_fk_paid_idx'),
+        ),
+        migrations.RunPython(fill_normalized_names, migrations.RunPython.noop),
+        migrations.RunPython(link_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    """Trigram index for the client search; PostgreSQL only.
+
+    Other databases search an in-process trie (apps.counter.client_search).
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS client_normalized_trgm_idx '
+        'ON counter_client USING gin (normalized_name gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS client_normalized_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0010_client_fk'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
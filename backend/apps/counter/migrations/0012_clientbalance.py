@@ -0,0 +1,87 @@
+# Generated by Django 4.2.30 on 2026-10-17 01:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_client_balances(apps, schema_editor):
+    """Aggregate the sessions and bar orders of every registered client.
+
+    A client's rows are the ones linked to it and the unlinked ones typed
+    with its exact name, running sessions included (as in the client
+    ledger). Self-contained (historical models only), so later changes to
+    apps.counter.balances cannot break this migration.
+    """
+    from collections import defaultdict
+
+    from django.db.models import Count, Q, Sum
+
+    Client = apps.get_model('counter', 'Client')
+    ClientBalance = apps.get_model('counter', 'ClientBalance')
+    owner_of_name = {
+        name: pk for name, pk, key in Client.objects.values_list('name', 'pk', 'normalized_name')
+        if key not in ('anonyme', 'anonymous')
+    }
+    rows_q = Q(client__isnull=False) | Q(
+        client__isnull=True, client_name__in=Client.objects.values('name')
+    )
+    sources = (
+        (apps.get_model('counter', 'BilliardSession'), 'price', 'billiard_sessions', 'billiard_total'),
+        (apps.get_model('counter', 'BarOrder'), 'total_price', 'bar_orders', 'bar_total'),
+    )
+    balances = defaultdict(lambda: dict.fromkeys((
+        'billiard_sessions', 'billiard_total', 'bar_orders', 'bar_total',
+        'unpaid_count', 'unpaid_total',
+    ), 0))
+    for model, price, count_field, total_field in sources:
+        grouped = (
+            model.objects.filter(rows_q)
+            .values('client_id', 'client_name', 'is_paid')
+            .annotate(count=Count('id'), total=Sum(price))
+            .order_by()
+        )
+        for entry in grouped:
+            owner = entry['client_id'] or owner_of_name.get(entry['client_name'])
+            if owner is None:
+                continue
+            balance = balances[owner]
+            total = entry['total'] or 0
+            balance[count_field] += entry['count']
+            balance[total_field] += total
+            if not entry['is_paid']:
+                balance['unpaid_count'] += entry['count']
+                balance['unpaid_total'] += total
+
+    ClientBalance.objects.bulk_create(
+        [ClientBalance(client_id=pk, **values) for pk, values in balances.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('counter', '0011_client_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientBalance',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to='counter.client')),
+                ('billiard_sessions', models.IntegerField(default=0)),
+                ('billiard_total', models.IntegerField(default=0)),
+                ('bar_orders', models.IntegerField(default=0)),
+                ('bar_total', models.IntegerField(default=0)),
+                ('unpaid_count', models.IntegerField(default=0)),
+                ('unpaid_total', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Solde client',
+                'verbose_name_plural': 'Soldes clients',
+                'indexes': [models.Index(condition=models.Q(('unpaid_total__gt', 0)), fields=['-unpaid_total', 'client'], name='client_balance_debtors_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_client_balances, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,33 @@
-from django.db import models
+import time
+from types import SimpleNamespace
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.signals import post_init
 from django.contrib.auth.models import User
 from django.utils import timezone
 
+from .pricing import current_schedule
+
+
+# Seconds a worker trusts its cached AppSettings before re-checking the
+# version stamp (updated_at) in the database
+SETTINGS_CACHE_TTL = 5
+
+_settings_cache = SimpleNamespace(settings=None, checked_at=0.0)
+
+
+class LoadedStateMixin:
+    """Re-run the post_init handlers after refresh_from_db().
+
+    The signal handlers shift the rollups by the difference between a
+    saved row and the state it was loaded with (apps.counter.signals);
+    after a refresh that state is the database's again.
+    """
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        post_init.send(sender=type(self), instance=self)
+
 
 class AppSettings(models.Model):
     """Model for application settings."""
@@ -30,6 +56,41 @@ class AppSettings(models.Model):
         settings, _ = cls.objects.get_or_create(pk=1)
         return settings
 
+    @classmethod
+    def get_cached(cls):
+        """Return the settings singleton from a process-local cache.
+
+        Saves in this process refresh the cache through a post_save signal.
+        Saves made by other workers are picked up by comparing `updated_at`
+        (the version stamp) at most once every SETTINGS_CACHE_TTL seconds.
+        """
+        cached = _settings_cache.settings
+        now = time.monotonic()
+
+        if cached is not None and now - _settings_cache.checked_at < SETTINGS_CACHE_TTL:
+            return cached
+
+        if cached is not None:
+            version = cls.objects.filter(pk=cached.pk).values_list('updated_at', flat=True).first()
+            if version == cached.updated_at:
+                _settings_cache.checked_at = now
+                return cached
+
+        cls.cache_settings(cls.get_settings())
+        return _settings_cache.settings
+
+    @classmethod
+    def cache_settings(cls, settings):
+        """Store a settings instance in the process-local cache."""
+        _settings_cache.settings = settings
+        _settings_cache.checked_at = time.monotonic()
+
+    @classmethod
+    def clear_cache(cls):
+        """Drop the process-local settings cache."""
+        _settings_cache.settings = None
+        _settings_cache.checked_at = 0.0
+
 
 class BilliardTable(models.Model):
     """Model for billiard tables."""
@@ -48,13 +109,18 @@ class BilliardTable(models.Model):
         return f"{self.name} ({self.table_id})"
 
 
-class BilliardSession(models.Model):
+class BilliardSession(LoadedStateMixin, models.Model):
     """Model for storing billiard game sessions."""
     TABLE_CHOICES = [('A', 'Table A'), ('B', 'Table B')]
     
     table = models.ForeignKey(BilliardTable, on_delete=models.SET_NULL, null=True, blank=True)
     table_identifier = models.CharField(max_length=1, choices=TABLE_CHOICES, default='A')
     client_name = models.CharField(max_length=100, default='Anonyme')
+    # Canonical client, set from client_name on save (None when anonymous)
+    client = models.ForeignKey(
+        'Client', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='billiard_sessions', db_index=False,
+    )
     start_time = models.DateTimeField(default=timezone.now)
     end_time = models.DateTimeField(null=True, blank=True)
     duration_seconds = models.IntegerField(default=0)
@@ -67,48 +133,48 @@ class BilliardSession(models.Model):
         ordering = ['-start_time']
         verbose_name = 'Session billard'
         verbose_name_plural = 'Sessions billard'
+        indexes = [
+            # Client ledger, history, pay-all and delete-paid
+            models.Index(fields=['client_name', 'is_paid'], name='billiard_client_paid_idx'),
+            models.Index(fields=['client', 'is_paid'], name='billiard_client_fk_paid_idx'),
+            # History, agenda and rollup date windows
+            models.Index(fields=['start_time'], name='billiard_start_time_idx'),
+            # Running sessions (dashboard, live ticker, stats)
+            models.Index(
+                fields=['start_time'],
+                condition=models.Q(is_active=True),
+                name='billiard_active_start_idx',
+            ),
+        ]
+        constraints = [
+            # At most one running session per table; also serves the
+            # (table_identifier, is_active=True) lookups of start/stop
+            models.UniqueConstraint(
+                fields=['table_identifier'],
+                condition=models.Q(is_active=True),
+                name='billiard_one_active_per_table',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.table_identifier} - {self.client_name} - {self.start_time}"
 
-    def _calculate_price_from_duration(self, duration_seconds):
+    def _calculate_price_from_duration(self, duration_seconds, schedule=None):
         """Helper method to calculate price from duration in seconds.
         
-        Pricing rules:
-        - 0 to 15 min: 150 mil/min
-        - After 15 min: 135 mil/min (for additional minutes)
-        
-        Floor conditions:
-        - If price < 1000 mil → price = 1000 mil
-        - If 1000 < price < 1500 mil → price = 1500 mil
-        - If price >= 1500 mil → calculated price
+        Delegates to PriceSchedule (apps.counter.pricing), which holds the
+        pricing rules and floor conditions.
         
         Args:
             duration_seconds: Duration in seconds (int)
+            schedule: PriceSchedule to price with (defaults to the cached settings)
             
         Returns:
             price: Price in millimes (int)
         """
-        settings = AppSettings.get_settings()
-        minutes = duration_seconds / 60
-        
-        # Calculate price based on duration
-        if minutes <= settings.threshold_mins:
-            # First period: rate_base per minute
-            price = int(minutes * settings.rate_base)
-        else:
-            # First period at rate_base + remaining at rate_reduced
-            price = int(settings.threshold_mins * settings.rate_base)
-            remaining_minutes = minutes - settings.threshold_mins
-            price += int(remaining_minutes * settings.rate_reduced)
-        
-        # Apply floor conditions
-        if price < settings.floor_min:
-            price = settings.floor_min
-        elif price < settings.floor_mid:
-            price = settings.floor_mid
-        
-        return price
+        if schedule is None:
+            schedule = current_schedule()
+        return schedule.price(duration_seconds)
 
     def calculate_price(self):
         """Calculate price based on session duration and update self.price.
@@ -124,28 +190,84 @@ class BilliardSession(models.Model):
         self.price = self._calculate_price_from_duration(int(duration))
         return self.price
 
-    def calculate_current_price(self):
+    def calculate_current_price(self, now=None, schedule=None):
         """Calculate current price for active session.
         
         Used for real-time price display without modifying model state.
         Returns price without saving.
+
+        Args:
+            now: Reference time for active sessions (defaults to timezone.now())
+            schedule: PriceSchedule to price with (defaults to the cached settings)
         """
-        end_time = self.end_time if self.end_time else timezone.now()
+        end_time = self.end_time if self.end_time else (now or timezone.now())
         duration = (end_time - self.start_time).total_seconds()
-        return self._calculate_price_from_duration(int(duration))
+        return self._calculate_price_from_duration(int(duration), schedule)
+
+    @classmethod
+    def start(cls, table_identifier, client_name='Anonyme', start_time=None):
+        """Start a session on a table, unless one is already running there.
+
+        No prior check: the insert itself is refused by the
+        billiard_one_active_per_table constraint, so of two concurrent
+        starts exactly one wins. The insert runs in a savepoint, so the
+        caller's transaction stays usable.
 
-    def stop_session(self):
-        """Stop the session and calculate price."""
-        self.end_time = timezone.now()
-        self.is_active = False
-        self.calculate_price()
-        self.save()
+        Returns:
+            the new session, or None if the table is busy
+        """
+        from .clients import find_client
+
+        # Looked up outside the transaction so that the insert is its first
+        # statement; on SQLite a read ahead of it makes concurrent starts
+        # fail with "database is locked" instead of waiting
+        session = cls(
+            table_identifier=table_identifier,
+            client_name=client_name,
+            client=find_client(client_name),
+            start_time=start_time or timezone.now(),
+            is_active=True,
+        )
+        # Keeps the link_client signal from looking a walk-in up again
+        session._client_looked_up = True
+        try:
+            with transaction.atomic():
+                session.save(force_insert=True)
+        except IntegrityError:
+            return None
+        return session
+
+    def stop_session(self, end_time=None):
+        """Stop the session (now, or at `end_time`) and calculate price.
+
+        The stop is claimed with a conditional UPDATE, so of two concurrent
+        stops only one prices and saves the session; only the stop columns
+        and the client name are written.
 
-    def get_formatted_duration(self):
+        Returns:
+            bool: False if the session was already stopped
+        """
+        end_time = end_time or timezone.now()
+        with transaction.atomic():
+            claimed = BilliardSession.objects.filter(pk=self.pk, is_active=True).update(
+                is_active=False, end_time=end_time
+            )
+            if not claimed:
+                self.refresh_from_db(fields=['is_active', 'end_time', 'duration_seconds', 'price'])
+                return False
+            self.end_time = end_time
+            self.is_active = False
+            self.calculate_price()
+            self.save(update_fields=[
+                'client_name', 'client', 'end_time', 'is_active', 'duration_seconds', 'price',
+            ])
+        return True
+
+    def get_formatted_duration(self, now=None):
         """Return formatted duration string."""
         if self.is_active:
             # Calculate current duration for active sessions
-            end = timezone.now()
+            end = now or timezone.now()
         elif self.end_time:
             end = self.end_time
         else:
@@ -221,7 +343,7 @@ class PS4TimeOption(models.Model):
         return f"{self.price / 1000:.3f} DT"
 
 
-class PS4Session(models.Model):
+class PS4Session(LoadedStateMixin, models.Model):
     """Model for PS4 sessions."""
     game = models.ForeignKey(PS4Game, on_delete=models.SET_NULL, null=True)
     game_name = models.CharField(max_length=100)
@@ -231,11 +353,18 @@ class PS4Session(models.Model):
     date = models.DateField(auto_now_add=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     is_paid = models.BooleanField(default=False)
+    client = models.ForeignKey(
+        'Client', on_delete=models.SET_NULL, null=True, blank=True, related_name='ps4_sessions',
+    )
 
     class Meta:
         ordering = ['-timestamp']
         verbose_name = 'Session PS4'
         verbose_name_plural = 'Sessions PS4'
+        indexes = [
+            models.Index(fields=['date'], name='ps4_date_idx'),
+            models.Index(fields=['timestamp'], name='ps4_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"{self.game_name} - {self.players}j - {self.date}"
@@ -264,9 +393,14 @@ class InventoryItem(models.Model):
         return f"{self.price / 1000:.3f} DT"
 
 
-class BarOrder(models.Model):
+class BarOrder(LoadedStateMixin, models.Model):
     """Model for bar orders."""
     client_name = models.CharField(max_length=100, default='Anonyme')
+    # Canonical client, set from client_name on save (None when anonymous)
+    client = models.ForeignKey(
+        'Client', on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='bar_orders', db_index=False,
+    )
     items = models.JSONField(default=list)  # List of {item_id, name, price, quantity}
     total_price = models.IntegerField(default=0)
     date = models.DateField(auto_now_add=True)
@@ -277,13 +411,53 @@ class BarOrder(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Commande bar'
         verbose_name_plural = 'Commandes bar'
+        indexes = [
+            models.Index(fields=['client_name', 'is_paid'], name='bar_client_paid_idx'),
+            models.Index(fields=['client', 'is_paid'], name='bar_client_fk_paid_idx'),
+            models.Index(fields=['date'], name='bar_date_idx'),
+            models.Index(fields=['timestamp'], name='bar_timestamp_idx'),
+        ]
 
     def __str__(self):
         return f"{self.client_name} - {self.total_price} mil - {self.date}"
 
+    @classmethod
+    def create_with_lines(cls, client_name, quantities, inventory):
+        """Create an order priced from the inventory, not from the client.
+
+        Args:
+            client_name: Name of the client
+            quantities: List of (item_id, quantity)
+            inventory: {item_id: InventoryItem}, e.g. from in_bulk()
+
+        The `items` JSON keeps the display snapshot used by the API; the
+        BarOrderLine rows are what analytics aggregate on.
+        """
+        lines = [
+            BarOrderLine(
+                item=inventory[item_id],
+                name=inventory[item_id].name,
+                unit_price=inventory[item_id].price,
+                quantity=quantity,
+            )
+            for item_id, quantity in quantities
+        ]
+        order = cls.objects.create(
+            client_name=client_name,
+            items=[line.as_item() for line in lines],
+            total_price=sum(line.line_total for line in lines),
+        )
+        for line in lines:
+            line.order = order
+        BarOrderLine.objects.bulk_create(lines)
+
+        from . import rollup
+        rollup.mark_dirty('bar', [order.date])
+        return order
+
     def calculate_total(self):
-        """Calculate total price from items."""
-        total = sum(item.get('price', 0) * item.get('quantity', 1) for item in self.items)
+        """Calculate total price from the order lines."""
+        total = sum(line.line_total for line in self.lines.all())
         self.total_price = total
         return total
 
@@ -296,9 +470,136 @@ class BarOrder(models.Model):
         return self.get_formatted_price()
 
 
+class BarOrderLine(models.Model):
+    """One inventory item of a bar order, with name and price snapshots."""
+    order = models.ForeignKey(BarOrder, on_delete=models.CASCADE, related_name='lines')
+    item = models.ForeignKey(
+        InventoryItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='order_lines'
+    )
+    name = models.CharField(max_length=100)
+    unit_price = models.IntegerField()  # Price in millimes at order time
+    quantity = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        ordering = ['id']
+        verbose_name = 'Ligne commande bar'
+        verbose_name_plural = 'Lignes commande bar'
+
+    def __str__(self):
+        return f"{self.name} x{self.quantity}"
+
+    @property
+    def line_total(self):
+        return self.unit_price * self.quantity
+
+    def as_item(self):
+        """Entry of the legacy `BarOrder.items` JSON list."""
+        return {
+            'item_id': self.item_id,
+            'name': self.name,
+            'price': self.unit_price,
+            'quantity': self.quantity,
+        }
+
+
+class BarItemSales(models.Model):
+    """Materialized bar sales per day, hour and item.
+
+    `date` is the order day (BarOrder.date), `hour` the local hour of the
+    order and `week` the Monday of that day, so hourly, daily and weekly
+    buckets are plain GROUP BYs. Maintained by apps.counter.bar_sales.
+    """
+    date = models.DateField()
+    hour = models.PositiveSmallIntegerField()
+    week = models.DateField()
+    item = models.ForeignKey(
+        InventoryItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    name = models.CharField(max_length=100)
+    quantity = models.IntegerField(default=0)
+    revenue = models.IntegerField(default=0)  # Price in millimes
+
+    class Meta:
+        ordering = ['date', 'hour', 'name']
+        indexes = [
+            models.Index(fields=['date'], name='bar_item_sales_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['date', 'hour', 'item', 'name'], name='bar_item_sales_key'
+            ),
+        ]
+        verbose_name = 'Ventes bar par heure'
+        verbose_name_plural = 'Ventes bar par heure'
+
+    def __str__(self):
+        return f"{self.date} {self.hour:02d}h - {self.name} x{self.quantity}"
+
+
+class DailyRevenue(models.Model):
+    """Materialized revenue per day and source, split into paid and unpaid.
+
+    Maintained incrementally by apps.counter.rollup; rebuild from scratch
+    with `python manage.py rebuild_daily_revenue`.
+    """
+    SOURCE_CHOICES = [
+        ('billiard', 'Billard'),
+        ('ps4', 'PS4'),
+        ('bar', 'Bar'),
+    ]
+
+    date = models.DateField()
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    paid_count = models.IntegerField(default=0)
+    paid_total = models.IntegerField(default=0)  # Price in millimes
+    unpaid_count = models.IntegerField(default=0)
+    unpaid_total = models.IntegerField(default=0)  # Price in millimes
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date', 'source']
+        unique_together = ('date', 'source')
+        verbose_name = 'Revenu journalier'
+        verbose_name_plural = 'Revenus journaliers'
+
+    def __str__(self):
+        return f"{self.date} - {self.source} - {self.total} mil"
+
+    @property
+    def count(self):
+        return self.paid_count + self.unpaid_count
+
+    @property
+    def total(self):
+        return self.paid_total + self.unpaid_total
+
+
+class TableOccupancyDay(models.Model):
+    """Cached billiard table occupancy of one closed day.
+
+    `stats` holds the per-table busy seconds by hour, session and idle-gap
+    figures and the peak concurrency computed by apps.counter.occupancy.
+    Rows are only written for past days and dropped when a session of
+    that day (or of the day before) changes.
+    """
+    date = models.DateField(unique=True)
+    stats = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name = 'Occupation tables (jour)'
+        verbose_name_plural = 'Occupation tables (jours)'
+
+    def __str__(self):
+        return f"Occupation {self.date}"
+
+
 class Client(models.Model):
     """Model for registered clients."""
     name = models.CharField(max_length=100, unique=True)
+    # Accent/case-insensitive matching key, derived from name on save
+    normalized_name = models.CharField(max_length=100, blank=True, default='', db_index=True, editable=False)
     phone = models.CharField(max_length=20, blank=True, default='')
     email = models.EmailField(blank=True, default='')
     notes = models.TextField(blank=True, default='')
@@ -313,6 +614,74 @@ class Client(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        from .clients import normalize_name
+
+        self.normalized_name = normalize_name(self.name)
+        super().save(*args, **kwargs)
+
+
+class ClientBalance(models.Model):
+    """Running totals of one client's billiard sessions and bar orders.
+
+    Maintained by apps.counter.balances in the transaction that changes the
+    client's rows; check (and repair) with `python manage.py check_balances`.
+    Covers the same rows as the client ledger, running billiard sessions
+    included.
+    """
+    client = models.OneToOneField(
+        Client, on_delete=models.CASCADE, primary_key=True, related_name='balance'
+    )
+    billiard_sessions = models.IntegerField(default=0)
+    billiard_total = models.IntegerField(default=0)  # Price in millimes
+    bar_orders = models.IntegerField(default=0)
+    bar_total = models.IntegerField(default=0)  # Price in millimes
+    unpaid_count = models.IntegerField(default=0)
+    unpaid_total = models.IntegerField(default=0)  # Price in millimes
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Solde client'
+        verbose_name_plural = 'Soldes clients'
+        indexes = [
+            # Debtors list: only clients who owe something are indexed
+            models.Index(
+                fields=['-unpaid_total', 'client'],
+                condition=models.Q(unpaid_total__gt=0),
+                name='client_balance_debtors_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.client_id} - {self.unpaid_total} mil"
+
+    @property
+    def total_spent(self):
+        return self.billiard_total + self.bar_total
+
+
+class IdempotencyKey(models.Model):
+    """Response of a request sent with a client-supplied idempotency key.
+
+    A retried request with the same key replays the stored response instead
+    of being applied twice; see apps.counter.idempotency.
+    """
+    scope = models.CharField(max_length=30)
+    key = models.CharField(max_length=100)
+    fingerprint = models.CharField(max_length=64)
+    response = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Clé d'idempotence"
+        verbose_name_plural = "Clés d'idempotence"
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='idempotency_scope_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
+
 
 class UserProfile(models.Model):
     """Model for user roles and permissions."""
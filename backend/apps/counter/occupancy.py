@@ -0,0 +1,242 @@
+"""
+Billiard table occupancy and utilization.
+
+Sessions are streamed once, clipped to local calendar days and swept in
+time order per day: each table's busy intervals (merged if sessions
+overlap) are spread over the hours of the day, the idle gaps between them
+are measured, and the number of simultaneously occupied tables gives the
+peak concurrency. No per-slot queries are issued.
+
+The result of every closed day is cached in TableOccupancyDay, so a
+request over two years only computes today (and any invalidated day).
+Sessions longer than 24 hours are only counted on their first two days.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .dates import day_window, days_q
+from .models import BilliardSession, TableOccupancyDay
+
+
+# Longest range accepted by the occupancy endpoint (two years)
+MAX_OCCUPANCY_DAYS = 731
+
+DAY_SECONDS = 24 * 3600
+
+
+def _empty_table():
+    return {
+        'busy': [0] * 24,
+        'sessions': 0,
+        'session_seconds': 0,
+        'gaps': 0,
+        'gap_seconds': 0,
+        'longest_gap': 0,
+    }
+
+
+def _add_busy(busy, start, end, day_start):
+    """Spread the busy interval [start, end) over the hours of the day."""
+    offset = (start - day_start).total_seconds()
+    stop = (end - day_start).total_seconds()
+    while offset < stop:
+        hour = min(int(offset // 3600), 23)
+        boundary = min((hour + 1) * 3600, stop)
+        busy[hour] += int(boundary - offset)
+        offset = boundary
+
+
+def _intervals_by_day(days):
+    """Stream sessions and clip them to the requested days.
+
+    Returns:
+        dict mapping day to a list of (table, start, end, full_seconds)
+    """
+    wanted = set(days)
+    # A session can start the day before and run past midnight
+    candidate_days = wanted | {day - timedelta(days=1) for day in wanted}
+    now = timezone.now()
+
+    rows = (
+        BilliardSession.objects.filter(days_q('start_time', candidate_days))
+        .order_by()
+        .values_list('table_identifier', 'start_time', 'end_time', 'duration_seconds', 'is_active')
+        .iterator(chunk_size=2000)
+    )
+    by_day = defaultdict(list)
+    for table, start, end, duration, is_active in rows:
+        if is_active:
+            end = now
+        elif end is None:
+            end = start + timedelta(seconds=duration)
+        if end <= start:
+            continue
+        full_seconds = int((end - start).total_seconds())
+        first_day = timezone.localdate(start)
+        last_day = timezone.localdate(end)
+        for day in (first_day, first_day + timedelta(days=1)):
+            if day <= last_day and day in wanted:
+                by_day[day].append((table, start, end, full_seconds))
+    return by_day
+
+
+def compute_day(day, intervals, tables):
+    """Occupancy of one day from its (table, start, end, full_seconds) list."""
+    day_start, day_end = day_window(day)
+    stats = {table: _empty_table() for table in tables}
+
+    events = []
+    for table, start, end, full_seconds in intervals:
+        entry = stats.setdefault(table, _empty_table())
+        if day_start <= start < day_end:
+            # Session length is accounted on the day it started
+            entry['sessions'] += 1
+            entry['session_seconds'] += full_seconds
+        events.append((max(start, day_start), 1, table))
+        events.append((min(end, day_end), -1, table))
+    # At equal instants, ends (-1) are processed before starts (+1)
+    events.sort(key=lambda event: (event[0], event[1]))
+
+    open_sessions = defaultdict(int)
+    busy_since = {}
+    last_end = {}
+    occupied = peak = 0
+    peak_at = None
+    for at, delta, table in events:
+        entry = stats[table]
+        if delta > 0:
+            if open_sessions[table] == 0:
+                busy_since[table] = at
+                if table in last_end:
+                    gap = int((at - last_end[table]).total_seconds())
+                    if gap > 0:
+                        entry['gaps'] += 1
+                        entry['gap_seconds'] += gap
+                        entry['longest_gap'] = max(entry['longest_gap'], gap)
+                occupied += 1
+                if occupied > peak:
+                    peak, peak_at = occupied, at
+            open_sessions[table] += 1
+        else:
+            open_sessions[table] -= 1
+            if open_sessions[table] == 0:
+                _add_busy(entry['busy'], busy_since.pop(table), at, day_start)
+                last_end[table] = at
+                occupied -= 1
+
+    return {
+        'tables': stats,
+        'peak': peak,
+        'peak_at': timezone.localtime(peak_at).strftime('%H:%M') if peak_at else None,
+    }
+
+
+def daily_stats(start, end):
+    """Per-day occupancy between start and end (inclusive).
+
+    Closed days are read from (or stored into) TableOccupancyDay; today
+    and later days are always computed.
+
+    Returns:
+        dict mapping date to the compute_day() result
+    """
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    cached = {
+        row.date: row.stats
+        for row in TableOccupancyDay.objects.filter(date__gte=start, date__lte=end)
+    }
+    missing = [day for day in days if day not in cached]
+    if not missing:
+        return cached
+
+    tables = [table for table, _ in BilliardSession.TABLE_CHOICES]
+    intervals = _intervals_by_day(missing)
+    computed = {day: compute_day(day, intervals.get(day, []), tables) for day in missing}
+
+    today = timezone.localdate()
+    TableOccupancyDay.objects.bulk_create(
+        [TableOccupancyDay(date=day, stats=stats) for day, stats in computed.items() if day < today],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+    return {**cached, **computed}
+
+
+def invalidate(days):
+    """Drop cached days touched by a change to sessions started on `days`."""
+    affected = set(days) | {day + timedelta(days=1) for day in days}
+    TableOccupancyDay.objects.filter(date__in=affected).delete()
+
+
+def _percent(busy_seconds, available_seconds):
+    if not available_seconds:
+        return 0.0
+    return round(100 * busy_seconds / available_seconds, 1)
+
+
+def _minutes(seconds, count=1):
+    if not count:
+        return 0.0
+    return round(seconds / count / 60, 1)
+
+
+def summarize(start, end):
+    """Utilization per table over a range of days.
+
+    Utilization is busy time over wall-clock time (24h a day), per hour of
+    day and per day of week (0 = Monday).
+    """
+    per_day = daily_stats(start, end)
+
+    hour_slot_seconds = 0
+    weekdays_available = [0] * 7
+    totals = defaultdict(lambda: {**_empty_table(), 'by_weekday': [0] * 7})
+    peak = {'tables': 0, 'date': None, 'time': None}
+
+    for day, stats in sorted(per_day.items()):
+        hour_slot_seconds += 3600
+        weekdays_available[day.weekday()] += DAY_SECONDS
+        if stats['peak'] > peak['tables']:
+            peak = {'tables': stats['peak'], 'date': day.isoformat(), 'time': stats['peak_at']}
+        for table, entry in stats['tables'].items():
+            total = totals[table]
+            total['busy'] = [a + b for a, b in zip(total['busy'], entry['busy'])]
+            total['by_weekday'][day.weekday()] += sum(entry['busy'])
+            for key in ('sessions', 'session_seconds', 'gaps', 'gap_seconds'):
+                total[key] += entry[key]
+            total['longest_gap'] = max(total['longest_gap'], entry['longest_gap'])
+
+    tables = []
+    for table in sorted(totals):
+        total = totals[table]
+        busy = sum(total['busy'])
+        tables.append({
+            'table': table,
+            'utilization': _percent(busy, hour_slot_seconds * 24),
+            'busy_hours': round(busy / 3600, 1),
+            'by_hour': [
+                {'hour': hour, 'utilization': _percent(seconds, hour_slot_seconds)}
+                for hour, seconds in enumerate(total['busy'])
+            ],
+            'by_weekday': [
+                {'weekday': weekday, 'utilization': _percent(seconds, weekdays_available[weekday])}
+                for weekday, seconds in enumerate(total['by_weekday'])
+            ],
+            'sessions': total['sessions'],
+            'average_session_minutes': _minutes(total['session_seconds'], total['sessions']),
+            'idle_gaps': {
+                'count': total['gaps'],
+                'average_minutes': _minutes(total['gap_seconds'], total['gaps']),
+                'longest_minutes': _minutes(total['longest_gap']),
+            },
+        })
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': len(per_day),
+        'tables': tables,
+        'peak_concurrency': peak,
+    }
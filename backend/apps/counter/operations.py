@@ -0,0 +1,409 @@
+"""
+Offline-queued POS operations.
+
+When the venue Wi-Fi drops, tablets keep recording actions locally, each
+with a client-generated UUID and the time it happened, and flush them to
+/batch/ once back online. A batch is applied in order, in one transaction:
+
+- billiard starts and stops are saved one by one, each in a savepoint so
+  that a busy table only fails its own operation;
+- PS4 sessions and bar orders are buffered and written with bulk_create;
+- payment changes are folded in memory and written with one UPDATE per
+  model and target state.
+
+The result of every operation is stored under its UUID (IdempotencyKey,
+scope 'pos-op'), so a batch re-sent after a lost response is answered from
+the stored results and nothing is applied twice. Failures that may clear
+up (a busy table, a reference to an operation not applied yet) are
+reported with `retry: true` and not stored, so the next flush runs the
+operation again. An operation can point to
+an object created by an earlier one, in the same batch or a previous one,
+with `ref`: the UUID of the creating operation.
+
+A tablet may stay offline for days, so those results are kept for
+OPERATION_TTL rather than the 24 hours of the other idempotency keys, and
+operations recorded more than OPERATION_MAX_AGE ago are refused: their
+result may already have been pruned, and they would be applied again.
+Operations dated more than OPERATION_CLOCK_SKEW ahead of the server are
+refused as well (and retried), as a tablet clock that far off would record
+sessions that never happened yet.
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from . import events, rollup
+from .clients import find_client
+from .idempotency import fingerprint
+from .models import (
+    BarOrder, BarOrderLine, BilliardSession, IdempotencyKey, InventoryItem,
+    PS4Session, PS4TimeOption,
+)
+from .serializers import (
+    BatchPaymentSerializer, BatchStopSessionSerializer, CreateBarOrderSerializer,
+    CreatePS4SessionSerializer, StartSessionSerializer,
+)
+
+
+OPERATION_SCOPE = 'pos-op'
+
+# Oldest operation accepted in a batch, by the time it was recorded (`at`)
+OPERATION_MAX_AGE = timedelta(days=30)
+
+# Results outlive OPERATION_MAX_AGE so that every operation still accepted
+# finds its result if it was applied before (plus a day for tablet clocks
+# running ahead of the server)
+OPERATION_TTL = OPERATION_MAX_AGE + timedelta(days=1)
+
+# How far ahead of the server clock an operation may be dated
+OPERATION_CLOCK_SKEW = timedelta(minutes=5)
+
+PAYMENT_MODELS = {'billiard': BilliardSession, 'ps4': PS4Session, 'bar': BarOrder}
+
+
+class OperationError(Exception):
+    """An operation that cannot be applied; the message is shown to the cashier."""
+
+
+class RetryableOperationError(OperationError):
+    """An operation that may apply on a later flush; its result is not stored."""
+
+
+def _errors_message(errors):
+    """Flatten serializer errors into one line."""
+    if isinstance(errors, dict):
+        return '; '.join(f'{field}: {_errors_message(value)}' for field, value in errors.items())
+    if isinstance(errors, list):
+        return ' '.join(_errors_message(value) for value in errors)
+    return str(errors)
+
+
+class BatchApplier:
+    """Apply one batch of operations; see the module docstring."""
+
+    def __init__(self, operations):
+        self.operations = operations
+        self.records = {}        # operation UUID -> IdempotencyKey
+        self.created = {}        # operation UUID -> (source, object)
+        self.paid = {}           # (source, pk) -> target is_paid of stored rows
+        self.pending_ps4 = []    # (at, PS4Session, result)
+        self.pending_bar = []    # (at, BarOrder, lines, result)
+        self.pending_refs = []   # (unsaved object, result) toggled in this batch
+        self.clients = {}        # client_name -> Client or None
+
+    # ------------------------------------------------------------------
+    # Entry point
+    # ------------------------------------------------------------------
+    def apply(self):
+        """Apply the batch. Must run inside transaction.atomic().
+
+        Returns:
+            dict: results (one per operation, in order) and counters
+        """
+        IdempotencyKey.objects.filter(
+            scope=OPERATION_SCOPE, created_at__lt=timezone.now() - OPERATION_TTL
+        ).delete()
+        keys = {str(operation['id']) for operation in self.operations}
+        keys.update(
+            str(operation['data']['ref']) for operation in self.operations
+            if operation['data'].get('ref')
+        )
+        self.records = {
+            record.key: record
+            for record in IdempotencyKey.objects.filter(scope=OPERATION_SCOPE, key__in=keys)
+        }
+        self._preload()
+
+        results = []
+        new_records = []
+        with rollup.batch():
+            for operation in self.operations:
+                key = str(operation['id'])
+                digest = fingerprint(
+                    [operation['type'], operation.get('at'), operation['data']]
+                )
+                record = self.records.get(key)
+                if record is not None:
+                    if record.fingerprint != digest:
+                        results.append({
+                            'id': key, 'type': operation['type'], 'status': 'error',
+                            'error': 'UUID déjà utilisé pour une autre opération',
+                        })
+                    else:
+                        results.append(record)
+                    continue
+
+                result = {'id': key, 'type': operation['type'], 'status': 'applied'}
+                try:
+                    self._apply(key, operation, result)
+                except RetryableOperationError as exc:
+                    result.update(status='error', error=str(exc), retry=True)
+                    results.append(result)
+                    continue
+                except OperationError as exc:
+                    result.update(status='error', error=str(exc))
+                record = IdempotencyKey(
+                    scope=OPERATION_SCOPE, key=key, fingerprint=digest, response=result
+                )
+                self.records[key] = record
+                new_records.append(record)
+                results.append(result)
+
+            self._flush()
+
+        # Concurrent flushes of the same operations collide here
+        IdempotencyKey.objects.bulk_create(new_records)
+
+        results = [
+            {**result.response, 'duplicate': True} if isinstance(result, IdempotencyKey) else result
+            for result in results
+        ]
+        return {
+            'results': results,
+            'applied': sum(1 for r in results if r['status'] == 'applied' and not r.get('duplicate')),
+            'duplicates': sum(1 for r in results if r.get('duplicate')),
+            'errors': sum(1 for r in results if r['status'] == 'error' and not r.get('duplicate')),
+        }
+
+    def _preload(self):
+        """Fetch the time options, inventory and payment states the batch refers to."""
+        option_ids, item_ids = set(), set()
+        payment_ids = {source: set() for source in PAYMENT_MODELS}
+        for operation in self.operations:
+            data = operation['data']
+            if operation['type'] == 'ps4.create':
+                option_ids.add(data.get('time_option_id'))
+            elif operation['type'] == 'bar.create':
+                item_ids.update(item.get('item_id') for item in data.get('items') or [] if isinstance(item, dict))
+            elif operation['type'] == 'payment.toggle' and data.get('source') in PAYMENT_MODELS:
+                payment_ids[data['source']].add(data.get('id'))
+
+        self.time_options = PS4TimeOption.objects.select_related('game').in_bulk(
+            [pk for pk in option_ids if isinstance(pk, int)]
+        )
+        self.inventory = InventoryItem.objects.in_bulk(
+            [pk for pk in item_ids if isinstance(pk, int)]
+        )
+        self.states = {}         # (source, pk) -> current is_paid
+        self.running = set()     # ids of billiard sessions still active
+        for source, ids in payment_ids.items():
+            self._load_states(source, [pk for pk in ids if isinstance(pk, int)])
+
+    def _load_states(self, source, ids):
+        if not ids:
+            return
+        fields = ('pk', 'is_paid', 'is_active') if source == 'billiard' else ('pk', 'is_paid')
+        for pk, is_paid, *active in PAYMENT_MODELS[source].objects.filter(pk__in=ids).values_list(*fields):
+            self.states[(source, pk)] = is_paid
+            if active and active[0]:
+                self.running.add(pk)
+
+    # ------------------------------------------------------------------
+    # Operations
+    # ------------------------------------------------------------------
+    def _apply(self, key, operation, result):
+        handler, serializer_class = {
+            'billiard.start': (self._billiard_start, StartSessionSerializer),
+            'billiard.stop': (self._billiard_stop, BatchStopSessionSerializer),
+            'ps4.create': (self._ps4_create, CreatePS4SessionSerializer),
+            'bar.create': (self._bar_create, CreateBarOrderSerializer),
+            'payment.toggle': (self._payment_toggle, BatchPaymentSerializer),
+        }[operation['type']]
+        serializer = serializer_class(data=operation['data'])
+        if not serializer.is_valid():
+            raise OperationError(_errors_message(serializer.errors))
+        now = timezone.now()
+        at = operation.get('at') or now
+        if at < now - OPERATION_MAX_AGE:
+            raise OperationError(
+                f'Opération enregistrée il y a plus de {OPERATION_MAX_AGE.days} jours, non appliquée'
+            )
+        if at > now + OPERATION_CLOCK_SKEW:
+            raise RetryableOperationError(
+                "Opération datée dans le futur, vérifiez l'heure de la tablette"
+            )
+        handler(key, at, serializer.validated_data, result)
+
+    def _client(self, client_name):
+        if client_name not in self.clients:
+            self.clients[client_name] = find_client(client_name)
+        return self.clients[client_name]
+
+    def _billiard_start(self, key, at, data, result):
+        table = data['table_identifier']
+        if table not in dict(BilliardSession.TABLE_CHOICES):
+            raise OperationError(f'Table {table} inconnue')
+        session = BilliardSession.start(table, data.get('client_name', 'Anonyme'), at)
+        if session is None:
+            raise RetryableOperationError(f'La table {table} a déjà une session active')
+        self.created[key] = ('billiard', session)
+        self.states[('billiard', session.pk)] = session.is_paid
+        self.running.add(session.pk)
+        result['object_id'] = session.pk
+
+    def _billiard_stop(self, key, at, data, result):
+        if 'ref' in data:
+            session = self._target('billiard', data['ref'])
+            if not isinstance(session, BilliardSession):
+                session = BilliardSession.objects.filter(pk=session).first()
+        elif 'session_id' in data:
+            session = BilliardSession.objects.filter(pk=data['session_id']).first()
+        else:
+            session = BilliardSession.objects.filter(
+                table_identifier=data['table_identifier'], is_active=True
+            ).first()
+            if session is None:
+                # Started on a tablet that may not have flushed yet
+                raise RetryableOperationError('Aucune session active sur cette table')
+        if session is None:
+            raise OperationError('Session non trouvée')
+        if not session.is_active:
+            raise OperationError('Cette session est déjà terminée')
+        if at < session.start_time:
+            raise OperationError("L'arrêt précède le début de la session")
+
+        if 'client_name' in data:
+            session.client_name = data['client_name']
+        if not session.stop_session(end_time=at):
+            raise OperationError('Cette session est déjà terminée')
+        self.running.discard(session.pk)
+        result['object_id'] = session.pk
+
+    def _ps4_create(self, key, at, data, result):
+        option = self.time_options.get(data['time_option_id'])
+        if option is None or option.game_id != data['game_id']:
+            raise OperationError('Jeu ou option de temps non trouvé')
+        session = PS4Session(
+            game=option.game,
+            game_name=option.game.name,
+            players=data['players'],
+            duration_minutes=option.minutes,
+            price=option.price,
+            client=self._client(data.get('client_name', '')),
+        )
+        self.created[key] = ('ps4', session)
+        self.pending_ps4.append((at, session, result))
+
+    def _bar_create(self, key, at, data, result):
+        quantities = [(item['item_id'], item['quantity']) for item in data['items']]
+        unavailable = sorted(
+            item_id for item_id, _ in quantities
+            if item_id not in self.inventory or not self.inventory[item_id].is_active
+        )
+        if unavailable:
+            raise OperationError(f'Articles introuvables ou inactifs: {unavailable}')
+
+        lines = [
+            BarOrderLine(
+                item=self.inventory[item_id],
+                name=self.inventory[item_id].name,
+                unit_price=self.inventory[item_id].price,
+                quantity=quantity,
+            )
+            for item_id, quantity in quantities
+        ]
+        client_name = data.get('client_name', 'Anonyme')
+        order = BarOrder(
+            client_name=client_name,
+            client=self._client(client_name),
+            items=[line.as_item() for line in lines],
+            total_price=sum(line.line_total for line in lines),
+        )
+        self.created[key] = ('bar', order)
+        self.pending_bar.append((at, order, lines, result))
+
+    def _payment_toggle(self, key, at, data, result):
+        source = data['source']
+        target = self._target(source, data['ref']) if 'ref' in data else data['id']
+
+        if isinstance(target, (PS4Session, BarOrder)) and target.pk is None:
+            # Created earlier in this batch, not written yet
+            target.is_paid = data.get('is_paid', not target.is_paid)
+            result['is_paid'] = target.is_paid
+            self.pending_refs.append((target, result))
+            return
+
+        pk = target.pk if hasattr(target, 'pk') else target
+        state_key = (source, pk)
+        if state_key not in self.states:
+            self._load_states(source, [pk])
+            if state_key not in self.states:
+                raise OperationError('Élément non trouvé')
+        if source == 'billiard' and pk in self.running:
+            # A running session has no final price yet
+            raise RetryableOperationError('Session encore en cours')
+        self.states[state_key] = data.get('is_paid', not self.states[state_key])
+        self.paid[state_key] = self.states[state_key]
+        result.update(object_id=pk, is_paid=self.states[state_key])
+
+    def _target(self, source, ref):
+        """Object (this batch) or id (previous batch) created by operation `ref`."""
+        ref = str(ref)
+        if ref in self.created:
+            created_source, obj = self.created[ref]
+            if created_source != source:
+                raise OperationError('Référence vers un autre type d\'élément')
+            return obj
+        record = self.records.get(ref)
+        if record is None:
+            # Not applied yet: failed with a retry, or in a batch still to come
+            raise RetryableOperationError('Référence inconnue')
+        response = record.response
+        if response.get('status') != 'applied' or 'object_id' not in response:
+            raise OperationError('Référence vers une opération en échec')
+        if not response['type'].startswith(f'{source}.'):
+            raise OperationError('Référence vers un autre type d\'élément')
+        return response['object_id']
+
+    # ------------------------------------------------------------------
+    # Bulk writes
+    # ------------------------------------------------------------------
+    def _flush(self):
+        if self.pending_ps4:
+            sessions = [session for _, session, _ in self.pending_ps4]
+            PS4Session.objects.bulk_create(sessions)
+            # date/timestamp are auto_now_add: restore the offline times
+            for at, session, result in self.pending_ps4:
+                session.timestamp = at
+                session.date = timezone.localdate(at)
+                result['object_id'] = session.pk
+            PS4Session.objects.bulk_update(sessions, ['timestamp', 'date'])
+            rollup.mark_dirty('ps4', {session.date for session in sessions})
+
+        if self.pending_bar:
+            orders = [order for _, order, _, _ in self.pending_bar]
+            BarOrder.objects.bulk_create(orders)
+            lines = []
+            for at, order, order_lines, result in self.pending_bar:
+                order.timestamp = at
+                order.date = timezone.localdate(at)
+                result['object_id'] = order.pk
+                for line in order_lines:
+                    line.order = order
+                lines.extend(order_lines)
+            BarOrder.objects.bulk_update(orders, ['timestamp', 'date'])
+            BarOrderLine.objects.bulk_create(lines)
+            rollup.mark_dirty('bar', {order.date for order in orders})
+            rollup.mark_clients_dirty({order.client_id for order in orders})
+
+        for obj, result in self.pending_refs:
+            result['object_id'] = obj.pk
+
+        for source, model in PAYMENT_MODELS.items():
+            for is_paid in (True, False):
+                ids = [pk for (s, pk), paid in self.paid.items() if s == source and paid is is_paid]
+                if ids:
+                    changed = model.objects.filter(pk__in=ids).exclude(is_paid=is_paid)
+                    rollup.mark_queryset_dirty(source, changed)
+                    changed.update(is_paid=is_paid)
+
+        if self.pending_ps4 or self.pending_bar or self.paid:
+            events.publish(
+                'batch.applied',
+                ps4=len(self.pending_ps4), bar=len(self.pending_bar), payments=len(self.paid),
+            )
+
+
+def apply_batch(operations):
+    """Apply validated /batch/ operations; see BatchApplier.apply()."""
+    return BatchApplier(operations).apply()
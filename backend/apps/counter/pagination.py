@@ -0,0 +1,33 @@
+"""
+Pagination classes for the counter list endpoints.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class OptInCursorPagination(CursorPagination):
+    """Keyset pagination enabled only when the client asks for it.
+
+    Without `cursor` or `page_size` in the query string the full list is
+    returned as a plain array, so existing clients keep working. With them,
+    each page is fetched with an indexed `WHERE ordering_field < ...` seek
+    and the response becomes {next, previous, results}.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class StartTimeCursorPagination(OptInCursorPagination):
+    """Newest billiard sessions first."""
+    ordering = '-start_time'
+
+
+class TimestampCursorPagination(OptInCursorPagination):
+    """Newest PS4 sessions / bar orders first."""
+    ordering = '-timestamp'
@@ -0,0 +1,148 @@
+"""
+Payment changes.
+
+Toggling one item flips is_paid in the database with a single UPDATE, so
+concurrent toggles apply one after the other instead of overwriting each
+other's read; the rollup and the balance then move by that item alone.
+
+A cashier settling a table or a party marks a mixed set of billiard
+sessions, PS4 sessions and bar orders paid in one request: the rows are
+locked and read with one query per model, the unpaid ones are flipped with
+one UPDATE per model, and the revenue rollup and client balances are
+refreshed once at the end, all in the caller's transaction.
+"""
+from django.db import transaction
+from django.db.models import Case, Value, When
+
+from . import events, rollup
+from .balances import owners
+from .models import BarOrder, BilliardSession, ClientBalance, PS4Session
+
+
+# (source, model, price field)
+SETTLE_SOURCES = (
+    ('billiard', BilliardSession, 'price'),
+    ('ps4', PS4Session, 'price'),
+    ('bar', BarOrder, 'total_price'),
+)
+
+# Largest number of ids accepted per source in one settlement
+SETTLE_MAX_ITEMS = 500
+
+
+SOURCE_OF_MODEL = {model: source for source, model, _ in SETTLE_SOURCES}
+
+
+def toggle_paid(queryset):
+    """Flip is_paid of one item.
+
+    Args:
+        queryset: the item to toggle, filtered down to one row; extra
+            filters (e.g. the owning client) are applied to the UPDATE
+
+    Returns:
+        the item reloaded after the change, or None if nothing matched
+    """
+    model = queryset.model
+    source = SOURCE_OF_MODEL[model]
+    with transaction.atomic():
+        # Write first: the row stays locked until commit, and SQLite takes
+        # its write lock before any read of this transaction
+        flipped = queryset.update(
+            is_paid=Case(When(is_paid=True, then=Value(False)), default=Value(True))
+        )
+        if not flipped:
+            return None
+        item = queryset.get()
+        # Only the payment state moved: shift the rollups by this one row
+        after = rollup.contribution(source, item.__dict__)
+        client_id = None
+        if source != 'ps4':
+            if item.client_id is not None:
+                client_id = item.client_id
+            else:
+                rollup.mark_clients_dirty(owners([(None, item.client_name)]))
+        rollup.apply_change(source, after._replace(is_paid=not item.is_paid), after, client_id)
+    events.publish('payment.toggled', source=source, id=item.pk, is_paid=item.is_paid)
+    return item
+
+
+def _formatted(amount):
+    return f"{amount / 1000:.3f} DT"
+
+
+def settle(ids_by_source):
+    """Mark the given items paid. Must run inside transaction.atomic().
+
+    Args:
+        ids_by_source: dict mapping 'billiard', 'ps4' and 'bar' to lists of ids
+
+    Returns:
+        dict with, per source, the number of items settled now, the number
+        already paid, the ids ignored (unknown, or billiard sessions still
+        running) and the amount settled now; the overall settled count and
+        amount; and the remaining unpaid balance of every client involved
+    """
+    result = {}
+    settled = amount = 0
+    owned = []    # (client_id, client_name) of every row
+
+    with rollup.batch():
+        for source, model, price in SETTLE_SOURCES:
+            ids = set(ids_by_source.get(source) or [])
+            rows = []
+            if ids:
+                queryset = model.objects.filter(pk__in=ids)
+                if source == 'billiard':
+                    # A running session has no final price yet
+                    queryset = queryset.filter(is_active=False)
+                # PS4 sessions have no typed client name
+                owner = ('client_id',) if source == 'ps4' else ('client_id', 'client_name')
+                rows = list(
+                    queryset.select_for_update().order_by('pk')
+                    .values_list('pk', price, 'is_paid', *owner)
+                )
+
+            unpaid = [(pk, value) for pk, value, is_paid, *_ in rows if not is_paid]
+            if unpaid:
+                to_pay = model.objects.filter(pk__in=[pk for pk, _ in unpaid])
+                rollup.mark_queryset_dirty(source, to_pay)
+                to_pay.update(is_paid=True)
+            for _, _, _, client_id, *name in rows:
+                owned.append((client_id, name[0] if name else None))
+
+            source_amount = sum(value for _, value in unpaid)
+            result[source] = {
+                'settled': len(unpaid),
+                'already_paid': len(rows) - len(unpaid),
+                'ignored': sorted(ids - {pk for pk, *_ in rows}),
+                'amount': source_amount,
+            }
+            settled += len(unpaid)
+            amount += source_amount
+
+    balances = (
+        ClientBalance.objects.filter(client_id__in=owners(owned))
+        .order_by('client__name')
+        .values('client_id', 'client__name', 'unpaid_total', 'unpaid_count')
+    )
+    result.update({
+        'settled': settled,
+        'amount': amount,
+        'formatted_amount': _formatted(amount),
+        'clients': [
+            {
+                'client_id': row['client_id'],
+                'name': row['client__name'],
+                'unpaid_total': row['unpaid_total'],
+                'unpaid_count': row['unpaid_count'],
+            }
+            for row in balances
+        ],
+    })
+    if settled:
+        events.publish(
+            'payment.settled',
+            **{source: result[source]['settled'] for source, _, _ in SETTLE_SOURCES},
+        )
+    return result
@@ -0,0 +1,144 @@
+"""
+Revenue aggregation per calendar day.
+
+Per-day totals are read from the DailyRevenue rollup (at most one row per
+day and source) in a single query; days without any row are filled with
+zeros in Python. The number of queries is therefore constant whatever the
+length of the range (week, month, quarter, year).
+"""
+from datetime import timedelta
+
+from django.db.models import F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from .models import DailyRevenue
+
+
+# Longest range accepted by the agenda endpoints
+MAX_RANGE_DAYS = 366
+
+# Bucket sizes accepted by revenue_buckets()
+BUCKETS = ('day', 'week', 'month')
+
+
+def _rollup_by_day(start, end):
+    """Revenue keyed by (day, source), read from the DailyRevenue rollup."""
+    rows = DailyRevenue.objects.filter(date__gte=start, date__lte=end).values_list(
+        'date', 'source', 'paid_total', 'unpaid_total'
+    )
+    return {(day, source): paid + unpaid for day, source, paid, unpaid in rows}
+
+
+def daily_revenue_range(start, end):
+    """Return one revenue entry per day between start and end (inclusive).
+
+    Args:
+        start: First date of the range (datetime.date)
+        end: Last date of the range (datetime.date)
+
+    Returns:
+        list of dicts with date, day, per-source revenue and totals
+    """
+    revenue = _rollup_by_day(start, end)
+
+    days = []
+    current = start
+    while current <= end:
+        billiard_revenue = revenue.get((current, 'billiard'), 0)
+        ps4_revenue = revenue.get((current, 'ps4'), 0)
+        bar_revenue = revenue.get((current, 'bar'), 0)
+        total = billiard_revenue + ps4_revenue + bar_revenue
+
+        days.append({
+            'date': current.isoformat(),
+            'day': current.day,
+            'billiard_revenue': billiard_revenue,
+            'ps4_revenue': ps4_revenue,
+            'bar_revenue': bar_revenue,
+            'total_revenue': total,
+            'formatted_total': f"{total / 1000:.3f} DT",
+            'has_data': total > 0,
+        })
+        current += timedelta(days=1)
+
+    return days
+
+
+def summarize_days(days):
+    """Sum a list of daily entries into range totals."""
+    billiard = sum(d['billiard_revenue'] for d in days)
+    ps4 = sum(d['ps4_revenue'] for d in days)
+    bar = sum(d['bar_revenue'] for d in days)
+    total = billiard + ps4 + bar
+
+    return {
+        'billiard': billiard,
+        'ps4': ps4,
+        'bar': bar,
+        'total': total,
+        'formatted_total': f"{total / 1000:.3f} DT",
+    }
+
+
+def _period_start(day, bucket):
+    """First day of the bucket containing `day`."""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def _next_period(period, bucket):
+    if bucket == 'week':
+        return period + timedelta(days=7)
+    if bucket == 'month':
+        return (period + timedelta(days=32)).replace(day=1)
+    return period + timedelta(days=1)
+
+
+def revenue_buckets(start, end, bucket='day'):
+    """Count and revenue per source, grouped by day, week or month.
+
+    One GROUP BY over the DailyRevenue rollup; periods without activity
+    are filled with zeros. Periods are labelled by their first day.
+
+    Returns:
+        dict with `buckets` (one entry per period) and range `totals`
+    """
+    sources = [source for source, _ in DailyRevenue.SOURCE_CHOICES]
+    period_expression = {
+        'day': F('date'),
+        'week': TruncWeek('date'),
+        'month': TruncMonth('date'),
+    }[bucket]
+
+    rows = (
+        DailyRevenue.objects.filter(date__gte=start, date__lte=end)
+        .values('source', period=period_expression)
+        .annotate(
+            count=Sum(F('paid_count') + F('unpaid_count')),
+            revenue=Sum(F('paid_total') + F('unpaid_total')),
+        )
+        .order_by()
+    )
+    grouped = {(row['period'], row['source']): row for row in rows}
+
+    empty = {'count': 0, 'revenue': 0}
+    totals = {source: dict(empty) for source in sources}
+    buckets = []
+    period = _period_start(start, bucket)
+    while period <= end:
+        entry = {'period': period.isoformat()}
+        for source in sources:
+            row = grouped.get((period, source))
+            values = {'count': row['count'], 'revenue': row['revenue']} if row else dict(empty)
+            entry[source] = values
+            totals[source]['count'] += values['count']
+            totals[source]['revenue'] += values['revenue']
+        entry['total_revenue'] = sum(entry[source]['revenue'] for source in sources)
+        buckets.append(entry)
+        period = _next_period(period, bucket)
+
+    totals['total_revenue'] = sum(totals[source]['revenue'] for source in sources)
+    return {'buckets': buckets, 'totals': totals}
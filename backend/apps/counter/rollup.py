@@ -0,0 +1,329 @@
+"""
+Daily revenue rollup maintenance.
+
+DailyRevenue holds one row per (day, source) with paid/unpaid counts and
+totals. A single saved, deleted or toggled row shifts the rows of its day
+by its own contribution (`apply_change`), with one UPDATE per day. Bulk
+updates and deletes instead recompute the affected days from the raw
+table with one grouped query, so the rollup stays exact whatever they
+touch.
+
+Refreshing bar days also refreshes the per-item BarItemSales rollup;
+refreshing billiard days drops the cached table occupancy of those days.
+The balances of the clients owning the changed rows are refreshed the same
+way (see apps.counter.balances).
+
+Bulk operations should run inside `batch()` so each touched day and
+client is recomputed once instead of once per row; single-row changes made
+inside it are recomputed the same way.
+
+A refresh locks the days it rewrites (apps.counter.locks) before reading
+them and upserts the rows, so concurrent writes on the same day wait for
+each other instead of failing on the (date, source) unique key. A delta
+takes the same locks, so it never lands between the aggregation and the
+upsert of a concurrent refresh.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from typing import NamedTuple
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import balances, bar_sales, occupancy
+from .dates import days_q
+from .locks import lock_days
+from .models import BilliardSession, PS4Session, BarOrder, DailyRevenue, TableOccupancyDay
+
+
+_state = threading.local()
+
+
+def _empty_row():
+    return {'paid_count': 0, 'paid_total': 0, 'unpaid_count': 0, 'unpaid_total': 0}
+
+
+def billiard_day(session):
+    """Calendar day (local time) a billiard session is accounted on."""
+    return timezone.localdate(session.start_time)
+
+
+class Contribution(NamedTuple):
+    """What one row adds to the rollups.
+
+    `closed` is False for running billiard sessions, which count in the
+    client balance but not in DailyRevenue yet.
+    """
+    day: date
+    is_paid: bool
+    amount: int
+    closed: bool = True
+
+
+# Fields a row's contribution is read from, per source
+CONTRIBUTION_FIELDS = {
+    'billiard': ('start_time', 'is_paid', 'price', 'is_active'),
+    'ps4': ('date', 'is_paid', 'price'),
+    'bar': ('date', 'is_paid', 'total_price'),
+}
+
+
+def contribution(source, values):
+    """Contribution of a row given its field values (e.g. instance.__dict__).
+
+    Returns:
+        Contribution, or None if a field was not loaded
+    """
+    fields = CONTRIBUTION_FIELDS[source]
+    if any(values.get(field) is None for field in fields):
+        return None
+    if source == 'billiard':
+        return Contribution(
+            timezone.localdate(values['start_time']), values['is_paid'],
+            values['price'], not values['is_active'],
+        )
+    return Contribution(values['date'], values['is_paid'], values[fields[2]])
+
+
+def _revenue_deltas(before, after):
+    """Per-day DailyRevenue field deltas of a row going from `before` to `after`."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for row, sign in ((before, -1), (after, 1)):
+        if row is None or not row.closed:
+            continue
+        prefix = 'paid' if row.is_paid else 'unpaid'
+        deltas[row.day][f'{prefix}_count'] += sign
+        deltas[row.day][f'{prefix}_total'] += sign * row.amount
+    return {
+        day: {field: value for field, value in delta.items() if value}
+        for day, delta in deltas.items()
+    }
+
+
+def aggregate_sources(billiard_qs, ps4_qs, bar_qs):
+    """Aggregate raw querysets into rollup values keyed by (day, source).
+
+    Each queryset is scanned with a single GROUP BY (day, is_paid).
+
+    Returns:
+        dict mapping (date, source) to paid/unpaid counts and totals
+    """
+    grouped = {
+        'billiard': (
+            billiard_qs.filter(is_active=False)
+            .annotate(day=TruncDate('start_time'))
+            .values('day', 'is_paid')
+            .annotate(count=Count('id'), total=Sum('price'))
+            .order_by()
+        ),
+        'ps4': (
+            ps4_qs.values('is_paid', day=F('date'))
+            .annotate(count=Count('id'), total=Sum('price'))
+            .order_by()
+        ),
+        'bar': (
+            bar_qs.values('is_paid', day=F('date'))
+            .annotate(count=Count('id'), total=Sum('total_price'))
+            .order_by()
+        ),
+    }
+
+    rows = defaultdict(_empty_row)
+    for source, queryset in grouped.items():
+        for entry in queryset:
+            row = rows[(entry['day'], source)]
+            prefix = 'paid' if entry['is_paid'] else 'unpaid'
+            row[f'{prefix}_count'] += entry['count']
+            row[f'{prefix}_total'] += entry['total'] or 0
+    return rows
+
+
+def refresh_days(source, days):
+    """Recompute the rollup rows of one source for the given days."""
+    days = sorted(set(days))
+    if not days:
+        return
+
+    billiard_qs = BilliardSession.objects.none()
+    ps4_qs = PS4Session.objects.none()
+    bar_qs = BarOrder.objects.none()
+    if source == 'billiard':
+        billiard_qs = BilliardSession.objects.filter(days_q('start_time', days))
+    elif source == 'ps4':
+        ps4_qs = PS4Session.objects.filter(date__in=days)
+    else:
+        bar_qs = BarOrder.objects.filter(date__in=days)
+
+    with transaction.atomic():
+        # Aggregate only once the days are locked, so a concurrent refresh
+        # of the same days has committed and is included
+        lock_days(f'daily-revenue:{source}', days)
+        rows = aggregate_sources(billiard_qs, ps4_qs, bar_qs)
+        DailyRevenue.objects.bulk_create(
+            [DailyRevenue(date=day, source=source, **values) for (day, _), values in rows.items()],
+            update_conflicts=True,
+            unique_fields=['date', 'source'],
+            update_fields=[*_empty_row(), 'updated_at'],
+        )
+        DailyRevenue.objects.filter(
+            source=source, date__in=[day for day in days if (day, source) not in rows]
+        ).delete()
+        if source == 'bar':
+            bar_sales.refresh_days(days)
+        elif source == 'billiard':
+            occupancy.invalidate(days)
+
+
+def apply_change(source, before, after, client_id=None):
+    """Account for one row going from `before` to `after`.
+
+    Args:
+        source: 'billiard', 'ps4' or 'bar'
+        before: Contribution stored so far, None for a new row
+        after: Contribution now, None for a deleted row
+        client_id: Client whose balance holds the row both before and
+            after, if any (the caller marks the owners dirty otherwise)
+
+    Inside `batch()` the days and the client are only marked dirty.
+    Otherwise each DailyRevenue row moves by the row's own contribution
+    with one UPDATE; a day with no rollup row yet is recomputed, and a
+    row left empty is deleted. Bar item sales and table occupancy only depend on the
+    row's day and lines, so they are refreshed when the row appears,
+    disappears or changes day, not when it is paid.
+    """
+    days = {row.day for row in (before, after) if row is not None}
+    if getattr(_state, 'pending', None) is not None:
+        mark_dirty(source, days)
+        mark_clients_dirty([client_id])
+        return
+
+    deltas = _revenue_deltas(before, after)
+    moved = before is None or after is None or before.day != after.day
+    with transaction.atomic():
+        if deltas:
+            lock_days(f'daily-revenue:{source}', deltas)
+            now = timezone.now()
+            missing = [
+                day for day, delta in sorted(deltas.items())
+                if delta and not DailyRevenue.objects.filter(date=day, source=source).update(
+                    updated_at=now, **{field: F(field) + value for field, value in delta.items()}
+                )
+            ]
+            if missing:
+                refresh_days(source, missing)
+            # A day that lost a row may have none left
+            shrunk = [
+                day for day, delta in deltas.items()
+                if delta.get('paid_count', 0) + delta.get('unpaid_count', 0) < 0
+            ]
+            if shrunk:
+                DailyRevenue.objects.filter(
+                    source=source, date__in=shrunk, paid_count=0, unpaid_count=0
+                ).delete()
+        if source == 'bar' and moved:
+            bar_sales.refresh_days(days)
+        elif source == 'billiard' and (moved or before.closed != after.closed):
+            closed_days = [row.day for row in (before, after) if row is not None and row.closed]
+            if closed_days:
+                occupancy.invalidate(closed_days)
+        if client_id is not None and source != 'ps4':
+            balances.apply_change(client_id, source, before, after)
+
+
+def rebuild():
+    """Rebuild the whole rollup table from the raw tables.
+
+    Returns:
+        int: number of rollup rows written
+    """
+    rows = aggregate_sources(
+        BilliardSession.objects.all(), PS4Session.objects.all(), BarOrder.objects.all()
+    )
+    with transaction.atomic():
+        DailyRevenue.objects.all().delete()
+        DailyRevenue.objects.bulk_create(
+            [
+                DailyRevenue(date=day, source=source, **values)
+                for (day, source), values in rows.items()
+            ],
+            batch_size=1000,
+        )
+        bar_sales.rebuild()
+        TableOccupancyDay.objects.all().delete()
+        balances.rebuild()
+    return len(rows)
+
+
+def mark_dirty(source, days):
+    """Schedule a refresh of the given days.
+
+    Inside `batch()` the days are collected and refreshed on exit,
+    otherwise they are refreshed immediately.
+    """
+    pending = getattr(_state, 'pending', None)
+    if pending is None:
+        refresh_days(source, days)
+    else:
+        pending[source].update(days)
+
+
+def mark_clients_dirty(client_ids):
+    """Schedule a refresh of the given clients' balances (None ids are ignored).
+
+    Inside `batch()` the clients are collected and refreshed on exit,
+    otherwise they are refreshed immediately.
+    """
+    client_ids = {pk for pk in client_ids if pk is not None}
+    if not client_ids:
+        return
+    pending = getattr(_state, 'clients', None)
+    if pending is None:
+        balances.refresh_clients(client_ids)
+    else:
+        pending.update(client_ids)
+
+
+def mark_queryset_dirty(source, queryset):
+    """Mark every day (and client) touched by a queryset, before a bulk update/delete."""
+    if source == 'billiard':
+        days = (
+            queryset.annotate(day=TruncDate('start_time'))
+            .values_list('day', flat=True).distinct().order_by()
+        )
+    else:
+        days = queryset.values_list('date', flat=True).distinct().order_by()
+    mark_dirty(source, list(days))
+    if source != 'ps4':
+        mark_clients_dirty(balances.owners(
+            queryset.values_list('client_id', 'client_name').distinct().order_by()
+        ))
+
+
+@contextmanager
+def batch():
+    """Defer rollup refreshes until the end of the block.
+
+    Nested blocks are merged into the outermost one. Nothing is refreshed
+    if the block raises: the surrounding transaction is expected to roll
+    back the raw changes as well.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+
+    _state.pending = defaultdict(set)
+    _state.clients = set()
+    try:
+        yield
+        pending, clients = _state.pending, _state.clients
+    finally:
+        _state.pending = _state.clients = None
+
+    # Fixed source order: the per-day locks are always taken in one order
+    for source in sorted(pending):
+        refresh_days(source, pending[source])
+    balances.refresh_clients(clients)
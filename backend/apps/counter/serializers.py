@@ -5,6 +5,31 @@ from .models import (
     PS4Game, PS4TimeOption, PS4Session,
     InventoryItem, BarOrder, Client, UserProfile
 )
+from .payments import SETTLE_MAX_ITEMS
+from .pricing import PricingContext
+
+
+class FieldsProjectionMixin:
+    """Restrict the serialized fields with a `?fields=a,b,c` query parameter.
+
+    Fields that are not requested are dropped before serialization, so
+    computed values such as `current_price` are not evaluated at all.
+    Unknown names are ignored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+
+        requested = request.query_params.get('fields')
+        if not requested:
+            return
+
+        allowed = {name.strip() for name in requested.split(',') if name.strip()}
+        for name in set(self.fields) - allowed:
+            self.fields.pop(name)
 
 
 class AppSettingsSerializer(serializers.ModelSerializer):
@@ -23,10 +48,10 @@ class BilliardTableSerializer(serializers.ModelSerializer):
         fields = ['id', 'table_id', 'name', 'color', 'is_active']
 
 
-class BilliardSessionSerializer(serializers.ModelSerializer):
-    formatted_duration = serializers.ReadOnlyField(source='get_formatted_duration')
-    formatted_price = serializers.ReadOnlyField(source='get_formatted_price')
-    current_price = serializers.ReadOnlyField()
+class BilliardSessionSerializer(FieldsProjectionMixin, serializers.ModelSerializer):
+    formatted_duration = serializers.SerializerMethodField()
+    formatted_price = serializers.SerializerMethodField()
+    current_price = serializers.SerializerMethodField()
     
     class Meta:
         model = BilliardSession
@@ -37,6 +62,22 @@ class BilliardSessionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'start_time', 'end_time', 'duration_seconds', 'price']
 
+    def _pricing(self):
+        """Pricing context shared by every row of this render (many=True included)."""
+        pricing = self.context.get('pricing')
+        if pricing is None:
+            pricing = self.context['pricing'] = PricingContext()
+        return pricing
+
+    def get_formatted_duration(self, obj):
+        return self._pricing().formatted_duration(obj)
+
+    def get_formatted_price(self, obj):
+        return self._pricing().formatted_price(obj)
+
+    def get_current_price(self, obj):
+        return self._pricing().current_price(obj)
+
 
 class StartSessionSerializer(serializers.Serializer):
     table_identifier = serializers.CharField(max_length=1)
@@ -63,14 +104,14 @@ class PS4GameSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'icon', 'player_options', 'time_options', 'is_active']
 
 
-class PS4SessionSerializer(serializers.ModelSerializer):
+class PS4SessionSerializer(FieldsProjectionMixin, serializers.ModelSerializer):
     formatted_price = serializers.ReadOnlyField(source='get_formatted_price')
     
     class Meta:
         model = PS4Session
         fields = [
             'id', 'game', 'game_name', 'players', 'duration_minutes',
-            'price', 'date', 'timestamp', 'is_paid', 'formatted_price'
+            'price', 'date', 'timestamp', 'is_paid', 'formatted_price', 'client'
         ]
         read_only_fields = ['id', 'date', 'timestamp']
 
@@ -79,6 +120,7 @@ class CreatePS4SessionSerializer(serializers.Serializer):
     game_id = serializers.IntegerField()
     players = serializers.IntegerField(min_value=1, max_value=4)
     time_option_id = serializers.IntegerField()
+    client_name = serializers.CharField(max_length=100, required=False, allow_blank=True)
 
 
 class InventoryItemSerializer(serializers.ModelSerializer):
@@ -89,7 +131,7 @@ class InventoryItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'price', 'icon', 'is_active', 'formatted_price']
 
 
-class BarOrderSerializer(serializers.ModelSerializer):
+class BarOrderSerializer(FieldsProjectionMixin, serializers.ModelSerializer):
     formatted_price = serializers.ReadOnlyField(source='get_formatted_price')
     
     class Meta:
@@ -101,11 +143,88 @@ class BarOrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'date', 'timestamp', 'total_price']
 
 
+class BarOrderItemSerializer(serializers.Serializer):
+    """Requested item; name and price are resolved from the inventory."""
+    item_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
 class CreateBarOrderSerializer(serializers.Serializer):
     client_name = serializers.CharField(max_length=100, required=False, default='Anonyme')
-    items = serializers.ListField(
-        child=serializers.DictField()
+    items = BarOrderItemSerializer(many=True, allow_empty=False)
+
+
+class SettlePaymentsSerializer(serializers.Serializer):
+    billiard = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, default=list,
+        max_length=SETTLE_MAX_ITEMS,
+    )
+    ps4 = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, default=list,
+        max_length=SETTLE_MAX_ITEMS,
     )
+    bar = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), required=False, default=list,
+        max_length=SETTLE_MAX_ITEMS,
+    )
+    idempotency_key = serializers.CharField(max_length=100, required=False)
+
+    def validate(self, data):
+        if not (data['billiard'] or data['ps4'] or data['bar']):
+            raise serializers.ValidationError('Aucun élément à régler')
+        return data
+
+
+# Operations accepted by the /batch/ endpoint (see apps.counter.operations)
+BATCH_OPERATION_TYPES = (
+    'billiard.start', 'billiard.stop', 'ps4.create', 'bar.create', 'payment.toggle',
+)
+BATCH_MAX_OPERATIONS = 200
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    type = serializers.ChoiceField(choices=BATCH_OPERATION_TYPES)
+    at = serializers.DateTimeField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+
+class BatchSerializer(serializers.Serializer):
+    operations = BatchOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, operations):
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            raise serializers.ValidationError(
+                f'{BATCH_MAX_OPERATIONS} opérations maximum par lot'
+            )
+        return operations
+
+
+class BatchStopSessionSerializer(serializers.Serializer):
+    """Session to stop: by id, by `ref` to the operation that started it, or
+    the running session of a table."""
+    session_id = serializers.IntegerField(required=False)
+    ref = serializers.UUIDField(required=False)
+    table_identifier = serializers.CharField(max_length=1, required=False)
+    client_name = serializers.CharField(max_length=100, required=False)
+
+    def validate(self, data):
+        if not ({'session_id', 'ref', 'table_identifier'} & set(data)):
+            raise serializers.ValidationError('session_id, ref ou table_identifier requis')
+        return data
+
+
+class BatchPaymentSerializer(serializers.Serializer):
+    """Item to mark paid/unpaid (toggled when is_paid is omitted)."""
+    source = serializers.ChoiceField(choices=('billiard', 'ps4', 'bar'))
+    id = serializers.IntegerField(required=False)
+    ref = serializers.UUIDField(required=False)
+    is_paid = serializers.BooleanField(required=False)
+
+    def validate(self, data):
+        if 'id' not in data and 'ref' not in data:
+            raise serializers.ValidationError('id ou ref requis')
+        return data
 
 
 class ClientSerializer(serializers.ModelSerializer):
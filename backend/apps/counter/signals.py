@@ -0,0 +1,224 @@
+"""
+Model signal handlers for the counter app.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import balances, client_search, events, occupancy, rollup
+from .clients import find_client, link_walk_ins
+from .models import AppSettings, BilliardSession, Client, PS4Session, BarOrder
+
+
+SOURCES = {BilliardSession: 'billiard', PS4Session: 'ps4', BarOrder: 'bar'}
+
+
+@receiver(post_save, sender=AppSettings)
+def app_settings_saved(sender, instance, **kwargs):
+    """Refresh this worker's cached settings (other workers follow updated_at)."""
+    AppSettings.cache_settings(instance)
+
+
+@receiver(post_delete, sender=AppSettings)
+def app_settings_deleted(sender, instance, **kwargs):
+    AppSettings.clear_cache()
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def client_changed(sender, instance, created=False, **kwargs):
+    """Keep the client search index in step with the Client table.
+
+    Applied once the transaction commits, so a rolled back change never
+    reaches the index.
+    """
+    if created:
+        transaction.on_commit(lambda: client_search.add(instance))
+    else:
+        transaction.on_commit(client_search.invalidate)
+
+
+@receiver(post_save, sender=BilliardSession)
+@receiver(post_save, sender=BarOrder)
+def index_walk_in(sender, instance, **kwargs):
+    """Offer the name of a row linked to no client in the autocomplete."""
+    if instance.client_id is None:
+        name = instance.client_name
+        transaction.on_commit(lambda: client_search.add_walk_in(name))
+
+
+@receiver(post_init, sender=Client)
+def remember_registered_name(sender, instance, **kwargs):
+    instance._loaded_name = instance.__dict__.get('name')
+
+
+@receiver(post_save, sender=Client)
+def client_registered(sender, instance, created, **kwargs):
+    """Give a new or renamed client the walk-in rows typed with its name."""
+    if created or instance.name != instance._loaded_name:
+        link_walk_ins(instance)
+        rollup.mark_clients_dirty([instance.pk])
+    instance._loaded_name = instance.name
+
+
+@receiver(post_init, sender=BilliardSession)
+@receiver(post_init, sender=BarOrder)
+def remember_client_name(sender, instance, **kwargs):
+    """Keep the loaded client to relink only when the name changes, and to
+    refresh the balance of the previous client when it does."""
+    instance._loaded_client_name = instance.__dict__.get('client_name')
+    instance._loaded_client_id = instance.__dict__.get('client_id')
+    # Set once the name was looked up and matched no registered client
+    instance._client_looked_up = False
+
+
+@receiver(pre_save, sender=BilliardSession)
+@receiver(pre_save, sender=BarOrder)
+def link_client(sender, instance, update_fields=None, **kwargs):
+    """Point the row to the registered Client of its client_name, if any.
+
+    Saves restricted with update_fields only relink when they list 'client'.
+    """
+    if update_fields is not None and 'client' not in update_fields:
+        return
+    if instance.client_name == instance._loaded_client_name and (
+        instance.client_id is not None or instance._client_looked_up
+    ):
+        return
+    instance.client = find_client(instance.client_name)
+    instance._loaded_client_name = instance.client_name
+    instance._client_looked_up = True
+
+
+@receiver(post_init, sender=BilliardSession)
+@receiver(post_init, sender=PS4Session)
+@receiver(post_init, sender=BarOrder)
+def remember_contribution(sender, instance, **kwargs):
+    """Keep what the loaded row adds to the rollups, to shift them on save."""
+    instance._loaded_revenue = rollup.contribution(SOURCES[sender], instance.__dict__)
+
+
+@receiver(post_save, sender=BilliardSession)
+@receiver(post_delete, sender=BilliardSession)
+def billiard_session_changed(sender, instance, created=False, signal=None, **kwargs):
+    """Update the revenue rollup for the session's day and the client's balance."""
+    # A session started in the past (an offline start) runs through closed
+    # days whose occupancy is cached
+    if created and instance.is_active:
+        first_day = rollup.billiard_day(instance)
+        closed_days = (timezone.localdate() - first_day).days
+        if closed_days > 0:
+            occupancy.invalidate([first_day + timedelta(days=i) for i in range(closed_days)])
+    _row_changed('billiard', instance, created, signal is post_delete)
+
+
+@receiver(post_save, sender=PS4Session)
+@receiver(post_delete, sender=PS4Session)
+def ps4_session_changed(sender, instance, created=False, signal=None, **kwargs):
+    """Update the revenue rollup for the PS4 session's day."""
+    _row_changed('ps4', instance, created, signal is post_delete)
+
+
+@receiver(post_save, sender=BarOrder)
+@receiver(post_delete, sender=BarOrder)
+def bar_order_changed(sender, instance, created=False, signal=None, **kwargs):
+    """Update the revenue rollup for the order's day and the client's balance."""
+    _row_changed('bar', instance, created, signal is post_delete)
+
+
+def _row_changed(source, instance, created, deleted):
+    """Shift the rollups by one row's change.
+
+    The row's loaded contribution is replaced by its current one. When a
+    field was not loaded the day is recomputed instead, and when the row
+    changed client both owners' balances are.
+    """
+    before = None if created else instance._loaded_revenue
+    after = None if deleted else rollup.contribution(source, instance.__dict__)
+    instance._loaded_revenue = after
+    if (before is None and not created) or (after is None and not deleted):
+        day = rollup.billiard_day(instance) if source == 'billiard' else instance.date
+        rollup.mark_dirty(source, [day])
+        if source != 'ps4':
+            _client_changed(instance)
+        return
+
+    client_id = None
+    if source != 'ps4':
+        # Running sessions count in the balance, as in the client ledger
+        if instance.client_id is not None and (created or instance.client_id == instance._loaded_client_id):
+            client_id = instance._loaded_client_id = instance.client_id
+        else:
+            _client_changed(instance)
+    rollup.apply_change(source, before, after, client_id)
+
+
+def _client_changed(instance):
+    rollup.mark_clients_dirty(balances.owners([
+        (instance.client_id, instance.client_name), (instance._loaded_client_id, None),
+    ]))
+    instance._loaded_client_id = instance.client_id
+
+
+# ============================================
+# LIVE EVENTS
+# ============================================
+@receiver(post_init, sender=BilliardSession)
+@receiver(post_init, sender=PS4Session)
+@receiver(post_init, sender=BarOrder)
+def remember_loaded_state(sender, instance, **kwargs):
+    """Keep the loaded is_active/is_paid values to detect transitions on save."""
+    # Read __dict__ so deferred fields are not fetched
+    instance._loaded_is_active = instance.__dict__.get('is_active')
+    instance._loaded_is_paid = instance.__dict__.get('is_paid')
+
+
+def _payment_toggled(source, instance):
+    previous = getattr(instance, '_loaded_is_paid', None)
+    if previous is None:
+        return
+    if previous != instance.is_paid:
+        events.publish('payment.toggled', source=source, id=instance.pk, is_paid=instance.is_paid)
+    instance._loaded_is_paid = instance.is_paid
+
+
+@receiver(post_save, sender=BilliardSession)
+def publish_billiard_session(sender, instance, created, **kwargs):
+    """Publish billiard session start/stop and payment changes."""
+    if created:
+        event_type = 'billiard.started' if instance.is_active else 'billiard.added'
+        events.publish(event_type, id=instance.pk, table_identifier=instance.table_identifier)
+    elif instance._loaded_is_active and not instance.is_active:
+        events.publish(
+            'billiard.stopped', id=instance.pk,
+            table_identifier=instance.table_identifier, price=instance.price,
+        )
+    _payment_toggled('billiard', instance)
+    instance._loaded_is_active = instance.is_active
+
+
+@receiver(post_save, sender=PS4Session)
+def publish_ps4_session(sender, instance, created, **kwargs):
+    """Publish PS4 session creation and payment changes."""
+    if created:
+        events.publish('ps4.created', id=instance.pk)
+    _payment_toggled('ps4', instance)
+
+
+@receiver(post_save, sender=BarOrder)
+def publish_bar_order(sender, instance, created, **kwargs):
+    """Publish bar order creation and payment changes."""
+    if created:
+        events.publish('bar.created', id=instance.pk)
+    _payment_toggled('bar', instance)
+
+
+@receiver(post_delete, sender=BilliardSession)
+@receiver(post_delete, sender=PS4Session)
+@receiver(post_delete, sender=BarOrder)
+def publish_deleted(sender, instance, **kwargs):
+    """Publish deletions so screens drop the row."""
+    events.publish(f'{SOURCES[sender]}.deleted', id=instance.pk)
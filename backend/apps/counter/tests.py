@@ -0,0 +1,631 @@
+"""
+Tests for the counter app.
+
+Run with:
+    python manage.py test apps.counter
+"""
+import threading
+import uuid
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import balances, client_search, events, payments, rollup
+from .clients import client_q, normalize_name
+from .dates import day_window, window_q
+from .pricing import PriceSchedule
+from .models import (
+    BarOrder, BarOrderLine, BilliardSession, Client, ClientBalance, DailyRevenue, IdempotencyKey,
+    InventoryItem, PS4Game, PS4Session, PS4TimeOption, TableOccupancyDay, UserProfile,
+)
+
+
+def seed_rows(start, stop):
+    """Create rows numbered [start, stop) for every model the API lists.
+
+    Client i gets two billiard sessions, a PS4 session and a bar order
+    linked to it, and a walk-in with the same number gets the same
+    visits unlinked.
+    """
+    now = timezone.now()
+    clients = Client.objects.bulk_create([
+        Client(name=f'Client {i:06d}', normalized_name=normalize_name(f'Client {i:06d}'))
+        for i in range(start, stop)
+    ])
+    owners = [(client, client.name) for client in clients] + [
+        (None, f'Walk-in {i:06d}') for i in range(start, stop)
+    ]
+    BilliardSession.objects.bulk_create([
+        BilliardSession(
+            table_identifier='A' if visit else 'B', client=client, client_name=name,
+            start_time=now - timedelta(hours=visit + 1), duration_seconds=1800,
+            price=4000, is_active=False, is_paid=bool(visit),
+        )
+        for client, name in owners for visit in range(2)
+    ])
+    items = InventoryItem.objects.bulk_create([
+        InventoryItem(name=f'Item {i:06d}', price=500) for i in range(start, stop)
+    ])
+    orders = BarOrder.objects.bulk_create([
+        BarOrder(client=client, client_name=name, total_price=1000) for client, name in owners
+    ])
+    BarOrderLine.objects.bulk_create([
+        BarOrderLine(order=order, item=item, name=item.name, unit_price=500, quantity=2)
+        for order, item in zip(orders, items + items)
+    ])
+    games = PS4Game.objects.bulk_create([
+        PS4Game(name=f'Game {i:06d}', player_options=[1, 2]) for i in range(start, stop)
+    ])
+    PS4TimeOption.objects.bulk_create([
+        PS4TimeOption(game=game, label=f'{minutes} min', minutes=minutes, price=minutes * 100)
+        for game in games for minutes in (15, 30)
+    ])
+    PS4Session.objects.bulk_create([
+        PS4Session(game=game, game_name=game.name, duration_minutes=15, price=1500, client=client)
+        for game, client in zip(games, clients)
+    ])
+    users = User.objects.bulk_create([User(username=f'user-{i:06d}') for i in range(start, stop)])
+    UserProfile.objects.bulk_create([UserProfile(user=user) for user in users])
+
+    # bulk_create bypasses the signals that keep the rollups current
+    rollup.rebuild()
+
+
+def rollup_rows():
+    """DailyRevenue figures, comparable across rebuilds."""
+    return sorted(DailyRevenue.objects.values_list(
+        'date', 'source', 'paid_count', 'paid_total', 'unpaid_count', 'unpaid_total'
+    ))
+
+
+class ListEndpointQueryCountTests(TestCase):
+    """Read endpoints run a fixed number of queries, whatever the row count."""
+
+    # Row counts the endpoints are measured at
+    SIZES = (1, 10, 50)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', is_superuser=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def endpoints(self):
+        """(label, url) of every read endpoint under test."""
+        today = timezone.localdate().isoformat()
+        period = f'?start={today}&end={today}'
+        names = (
+            'billiard-table-list', 'billiard-session-list', 'billiard-session-active',
+            'billiard-session-live', 'billiard-session-history', 'ps4-game-list',
+            'ps4-time-option-list', 'ps4-session-list', 'inventory-item-list',
+            'bar-order-list', 'registered-client-list', 'user-list',
+            'clients-list', 'clients-debtors', 'stats-list',
+        )
+        urls = [(name, reverse(name)) for name in names]
+        urls += [
+            ('client-history', reverse('client-history', args=['Client 000000'])),
+            ('walk-in history', reverse('client-history', args=['Walk-in 000000'])),
+            ('bar-order-sales', reverse('bar-order-sales') + period),
+            ('stats-occupancy', reverse('stats-occupancy') + period),
+            ('stats-range', reverse('stats-range-totals') + period),
+        ]
+        return urls
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def test_query_count_does_not_grow_with_rows(self):
+        expected = {}
+        seeded = 0
+        for size in self.SIZES:
+            seed_rows(seeded, size)
+            seeded = size
+            for label, url in self.endpoints():
+                with self.subTest(endpoint=label, size=size):
+                    # The first call fills per-process caches (settings, tariff);
+                    # response caches are emptied so every call is computed
+                    self.get(url)
+                    cache.clear()
+                    if label not in expected:
+                        with CaptureQueriesContext(connection) as ctx:
+                            self.get(url)
+                        expected[label] = len(ctx.captured_queries)
+                        continue
+                    with self.assertNumQueries(expected[label]):
+                        self.get(url)
+
+
+class HotPathIndexTests(TestCase):
+    """The planner serves the hot queries from the indexes added for them.
+
+    Each query's EXPLAIN plan must name its index, so dropping or
+    renaming one of them fails here.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_rows(0, 20)
+        BilliardSession.objects.create(table_identifier='A', client_name='Client 000000')
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # Small tables are cheaper to seq-scan; ask whether an index *can* serve
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def hot_queries(self):
+        """(label, queryset, index names its plan must use)."""
+        client = Client.objects.get(name='Client 000000')
+        today = timezone.localdate()
+        return [
+            # Live sessions and the active count of /stats/
+            ('live sessions', BilliardSession.objects.filter(is_active=True).order_by('start_time'),
+             ['billiard_active_start_idx']),
+            ('active session of table', BilliardSession.objects.filter(
+                table_identifier='A', is_active=True
+            ), ['billiard_one_active_per_table']),
+            # Daily revenue and agenda windows
+            ('billiard day', BilliardSession.objects.filter(window_q('start_time', *day_window(today))),
+             ['billiard_start_time_idx']),
+            ('ps4 day', PS4Session.objects.filter(date=today), ['ps4_date_idx']),
+            ('bar day', BarOrder.objects.filter(date=today), ['bar_date_idx']),
+            # Ledger and history of one client, and its unpaid rows
+            ('billiard ledger', BilliardSession.objects.filter(client_q(client, client.name)),
+             ['billiard_client_fk_paid_idx', 'billiard_client_paid_idx']),
+            ('bar ledger', BarOrder.objects.filter(client_q(client, client.name)),
+             ['bar_client_fk_paid_idx', 'bar_client_paid_idx']),
+            ('billiard unpaid walk-in', BilliardSession.objects.filter(
+                client_name='Walk-in 000000', is_paid=False
+            ), ['billiard_client_paid_idx']),
+            ('bar unpaid walk-in', BarOrder.objects.filter(
+                client_name='Walk-in 000000', is_paid=False
+            ), ['bar_client_paid_idx']),
+            ('debtors', ClientBalance.objects.filter(unpaid_total__gt=0).order_by('-unpaid_total', 'client_id'),
+             ['client_balance_debtors_idx']),
+        ]
+
+    def test_hot_queries_use_their_indexes(self):
+        for label, queryset, indexes in self.hot_queries():
+            plan = queryset.explain()
+            for index in indexes:
+                with self.subTest(query=label, index=index):
+                    self.assertIn(index, plan)
+
+
+class ConcurrencyTestCase(TransactionTestCase):
+    """Runs worker threads, each on its own database connection.
+
+    Rows must be committed for the workers to see them, hence
+    TransactionTestCase. Published events are collected from a private
+    in-memory broker.
+    """
+
+    # Threads racing for the same rows
+    WORKERS = 8
+
+    def setUp(self):
+        broker = events.InMemoryBroker()
+        self.subscription = broker.subscribe()
+        patcher = mock.patch.object(events, '_broker', broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_workers(self, target):
+        """Run target(barrier) in WORKERS threads and wait for all of them."""
+        barrier = threading.Barrier(self.WORKERS)
+        errors = []
+
+        def run():
+            try:
+                target(barrier)
+            except Exception as exc:
+                errors.append(exc)
+                barrier.abort()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run) for _ in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def published(self, event_type):
+        """Events of `event_type` published so far."""
+        received = []
+        while (event := self.subscription.get(timeout=0)) is not None:
+            received.append(event)
+        return [event for event in received if event['type'] == event_type]
+
+    def assertRollupsExact(self):
+        """The revenue rollup and the client balances match the raw rows."""
+        current = rollup_rows()
+        rollup.rebuild()
+        self.assertEqual(current, rollup_rows())
+        self.assertEqual(list(balances.drift()), [])
+
+
+class ConcurrentStopAndToggleTests(ConcurrencyTestCase):
+    """Concurrent stops of one session and toggles of one payment."""
+
+    # Toggles per worker
+    TOGGLES = 5
+
+    def setUp(self):
+        super().setUp()
+        Client.objects.create(name='Sami')
+
+    def test_session_is_stopped_once(self):
+        session = BilliardSession.objects.create(
+            table_identifier='A', client_name='Sami',
+            start_time=timezone.now() - timedelta(minutes=30),
+        )
+        stops = []
+
+        def stop(barrier):
+            own = BilliardSession.objects.get(pk=session.pk)
+            barrier.wait()
+            stops.append(own.stop_session())
+
+        self.run_workers(stop)
+
+        self.assertEqual(stops.count(True), 1)
+        stopped = self.published('billiard.stopped')
+        self.assertEqual([event['id'] for event in stopped], [session.pk])
+        session.refresh_from_db()
+        self.assertFalse(session.is_active)
+        self.assertEqual(stopped[0]['price'], session.price)
+        self.assertRollupsExact()
+
+    def test_no_payment_toggle_is_lost(self):
+        order = BarOrder.objects.create(client_name='Sami', total_price=1000)
+        toggles = self.WORKERS * self.TOGGLES
+
+        def toggle(barrier):
+            barrier.wait()
+            for _ in range(self.TOGGLES):
+                payments.toggle_paid(BarOrder.objects.filter(pk=order.pk))
+
+        self.run_workers(toggle)
+
+        order.refresh_from_db()
+        self.assertEqual(order.is_paid, bool(toggles % 2))
+        self.assertEqual(len(self.published('payment.toggled')), toggles)
+        self.assertRollupsExact()
+
+
+class StartRaceTests(ConcurrencyTestCase):
+    """Concurrent starts on one table: one session wins, the others are refused."""
+
+    # Times the workers race for the table
+    ROUNDS = 10
+
+    def test_one_active_session_per_table(self):
+        winners = [[] for _ in range(self.ROUNDS)]
+
+        def start(barrier):
+            for round_winners in winners:
+                barrier.wait()
+                session = BilliardSession.start('A', 'Sami')
+                if session is not None:
+                    round_winners.append(session.pk)
+                    self.assertEqual(
+                        BilliardSession.objects.filter(table_identifier='A', is_active=True).count(), 1
+                    )
+                barrier.wait()
+                if session is not None:
+                    session.stop_session()
+                barrier.wait()
+
+        self.run_workers(start)
+
+        self.assertEqual([len(round_winners) for round_winners in winners], [1] * self.ROUNDS)
+        started = [event['id'] for event in self.published('billiard.started')]
+        self.assertEqual(sorted(started), sorted(pk for round_winners in winners for pk in round_winners))
+        self.assertFalse(BilliardSession.objects.filter(is_active=True).exists())
+        self.assertRollupsExact()
+
+    def test_constraint_refuses_second_active_session(self):
+        BilliardSession.objects.create(table_identifier='A', client_name='Sami')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BilliardSession.objects.create(table_identifier='A', client_name='Nour')
+        self.assertIsNone(BilliardSession.start('A', 'Nour'))
+        self.assertIsNotNone(BilliardSession.start('B', 'Nour'))
+
+
+class EventStreamTicketTests(TestCase):
+    """The event stream opens with a single-use ticket, never with an access token."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='tablet')
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(events, '_broker', events.InMemoryBroker())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ticket(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(reverse('events-ticket'))
+        self.assertEqual(response.status_code, 200)
+        return response.data['ticket']
+
+    def open_stream(self, query):
+        # The stream itself is never read: only its authentication matters
+        return APIClient().get(reverse('events-stream') + query).status_code
+
+    def test_ticket_opens_one_stream(self):
+        ticket = self.ticket()
+        self.assertEqual(self.open_stream(f'?ticket={ticket}'), 200)
+        self.assertIn(self.open_stream(f'?ticket={ticket}'), (401, 403))
+
+    def test_expired_ticket_is_refused(self):
+        ticket = self.ticket()
+        later = timezone.now().timestamp() + events.TICKET_SECONDS + 1
+        with mock.patch('django.core.signing.time.time', return_value=later):
+            self.assertIn(self.open_stream(f'?ticket={ticket}'), (401, 403))
+
+    def test_access_token_is_not_accepted_in_the_url(self):
+        token = RefreshToken.for_user(self.user).access_token
+        self.assertIn(self.open_stream(f'?token={token}'), (401, 403))
+
+    def test_ticket_requires_authentication(self):
+        self.assertIn(APIClient().post(reverse('events-ticket')).status_code, (401, 403))
+
+
+class ClientSearchTests(TestCase):
+    """Autocomplete over registered clients and walk-in names."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.sami = Client.objects.create(name='Sami Ben Ali')
+        BilliardSession.objects.create(
+            table_identifier='A', client_name='sami ben ali', is_active=False
+        )
+        BilliardSession.objects.create(table_identifier='B', client_name='Samir', is_active=False)
+        BarOrder.objects.create(client_name='Élodie Sami', total_price=1000)
+        BarOrder.objects.create(client_name='Anonyme', total_price=1000)
+
+    def setUp(self):
+        client_search.invalidate()
+        self.addCleanup(client_search.invalidate)
+
+    def test_registered_clients_then_walk_ins(self):
+        self.assertEqual(client_search.search_clients('SAM'), [
+            {'id': self.sami.pk, 'name': 'Sami Ben Ali'},
+            {'id': None, 'name': 'Samir'},
+            {'id': None, 'name': 'Élodie Sami'},
+        ])
+        self.assertEqual(client_search.search_clients('elo'), [{'id': None, 'name': 'Élodie Sami'}])
+        self.assertEqual(client_search.search_clients('anon'), [])
+
+    def test_new_walk_in_is_indexed_on_commit(self):
+        self.assertEqual(client_search.search_clients('nour'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            BarOrder.objects.create(client_name='Nour', total_price=500)
+            BarOrder.objects.create(client_name='NOUR', total_price=500)
+        self.assertEqual(client_search.search_clients('nour'), [{'id': None, 'name': 'Nour'}])
+
+
+class ManualSessionPricingTests(TestCase):
+    """Sessions added by hand keep their duration-based floors."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', is_superuser=True)
+
+    def test_manual_floors_follow_duration(self):
+        schedule = PriceSchedule()
+        cases = [
+            (0, 1000),            # floor_min up to 10 minutes
+            (5 * 60, 1000),
+            (8 * 60, 1200),       # above floor_min, no floor_mid before 10 minutes
+            (10 * 60, 1500),
+            (12 * 60, 1800),      # floor_mid up to 20 minutes, already exceeded
+            (20 * 60, 2925),
+            (90 * 60, 12375),     # 15 min at rate_base, the rest at rate_reduced
+        ]
+        for seconds, price in cases:
+            with self.subTest(minutes=seconds / 60):
+                self.assertEqual(schedule.manual_price(seconds), price)
+        # Live sessions use price floors: 8 minutes cost floor_mid there
+        self.assertEqual(schedule.price(8 * 60), 1500)
+
+    def test_add_manual_uses_manual_floors(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        start = timezone.now() - timedelta(hours=1)
+        response = client.post(reverse('billiard-session-add-manual'), {
+            'table_identifier': 'A',
+            'client_name': 'Sami',
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(minutes=8)).isoformat(),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['price'], 1200)
+
+
+class OperationBatchTests(TestCase):
+    """Offline operations: only definitive results are kept under their UUID."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='tablet')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def flush(self, *operations):
+        response = self.client.post(
+            reverse('batch-operations'), {'operations': list(operations)}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def start(self, table, at=None):
+        return {
+            'id': str(uuid.uuid4()), 'type': 'billiard.start',
+            'at': (at or timezone.now()).isoformat(), 'data': {'table_identifier': table},
+        }
+
+    def test_future_operation_is_refused_and_retried(self):
+        operation = self.start('A', timezone.now() + timedelta(hours=2))
+        [result] = self.flush(operation)
+        self.assertEqual((result['status'], result['retry']), ('error', True))
+        self.assertFalse(IdempotencyKey.objects.filter(key=operation['id']).exists())
+
+        operation['at'] = timezone.now().isoformat()
+        [result] = self.flush(operation)
+        self.assertEqual(result['status'], 'applied')
+        self.assertTrue(BilliardSession.objects.filter(table_identifier='A', is_active=True).exists())
+
+    def test_busy_table_start_applies_once_the_table_is_free(self):
+        running = BilliardSession.start('A')
+        operation = self.start('A')
+        [result] = self.flush(operation)
+        self.assertTrue(result['retry'])
+
+        running.stop_session()
+        [result] = self.flush(operation)
+        self.assertEqual(result['status'], 'applied')
+        self.assertNotIn('duplicate', result)
+
+    def test_definitive_error_is_stored(self):
+        operation = self.start('Z')
+        [result] = self.flush(operation)
+        self.assertEqual(result['status'], 'error')
+        self.assertNotIn('retry', result)
+        [result] = self.flush(operation)
+        self.assertTrue(result['duplicate'])
+
+    def test_past_start_invalidates_closed_days_occupancy(self):
+        today = timezone.localdate()
+        for days in (1, 2, 3):
+            TableOccupancyDay.objects.create(date=today - timedelta(days=days), stats={})
+        [result] = self.flush(self.start('B', timezone.now() - timedelta(days=2)))
+        self.assertEqual(result['status'], 'applied')
+        self.assertEqual(
+            list(TableOccupancyDay.objects.values_list('date', flat=True)),
+            [today - timedelta(days=3)],
+        )
+
+
+class ClientBulkPaymentTests(TestCase):
+    """Paying or clearing a client covers its billiard, PS4 and bar items."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', is_superuser=True)
+        seed_rows(0, 1)
+        cls.name = Client.objects.get().name
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_pay_all_then_delete_paid_includes_ps4(self):
+        response = self.client.post(reverse('pay-all-client', args=[self.name]))
+        self.assertEqual(
+            (response.data['billiard_updated'], response.data['ps4_updated'], response.data['bar_updated']),
+            (1, 1, 1),
+        )
+        self.assertFalse(PS4Session.objects.filter(is_paid=False).exists())
+        self.assertEqual(ClientBalance.objects.get().unpaid_total, 0)
+
+        response = self.client.delete(reverse('delete-paid-client', args=[self.name]))
+        self.assertEqual(
+            (response.data['billiard_deleted'], response.data['ps4_deleted'], response.data['bar_deleted']),
+            (2, 1, 1),
+        )
+        self.assertFalse(PS4Session.objects.exists())
+        current = rollup_rows()
+        rollup.rebuild()
+        self.assertEqual(current, rollup_rows())
+
+    def test_history_keeps_per_type_keys(self):
+        data = self.client.get(reverse('client-history', args=[self.name])).data
+        self.assertEqual(
+            data['billiard_sessions'], [e for e in data['all_history'] if e['type'] == 'billiard']
+        )
+        self.assertEqual(data['bar_orders'], [e for e in data['all_history'] if e['type'] == 'bar'])
+        self.assertEqual((len(data['billiard_sessions']), len(data['bar_orders'])), (2, 1))
+
+
+class RollupDeltaTests(TestCase):
+    """Single-row changes shift the rollups without recomputing the day."""
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_rows(0, 3)
+        cls.client_row = Client.objects.order_by('pk').first()
+
+    def assertExactWithoutRecompute(self, change):
+        with CaptureQueriesContext(connection) as queries:
+            change()
+        grouped = [query['sql'] for query in queries if 'GROUP BY' in query['sql']]
+        self.assertEqual(grouped, [])
+        current = rollup_rows()
+        rollup.rebuild()
+        self.assertEqual(current, rollup_rows())
+        self.assertEqual(balances.drift(), [])
+
+    def test_toggle_stop_edit_and_delete(self):
+        session = BilliardSession.objects.filter(client=self.client_row).first()
+        order = BarOrder.objects.filter(client=self.client_row).first()
+        ps4 = PS4Session.objects.first()
+        for model, row in ((BilliardSession, session), (BarOrder, order), (PS4Session, ps4)):
+            with self.subTest(model=model.__name__):
+                self.assertExactWithoutRecompute(
+                    lambda: payments.toggle_paid(model.objects.filter(pk=row.pk))
+                )
+
+        running = BilliardSession.start('A', self.client_row.name)
+        self.assertExactWithoutRecompute(running.stop_session)
+
+        def edit():
+            session.refresh_from_db()
+            session.is_paid = not session.is_paid
+            session.save()
+        self.assertExactWithoutRecompute(edit)
+        self.assertExactWithoutRecompute(session.delete)
+        self.assertExactWithoutRecompute(PS4Session.objects.get(pk=ps4.pk).delete)
+
+    def test_last_row_of_a_day_removes_its_rollup_row(self):
+        day = timezone.localdate() - timedelta(days=10)
+        order = BarOrder.objects.create(client_name='Nour', total_price=500)
+        BarOrder.objects.filter(pk=order.pk).update(date=day)
+        rollup.rebuild()
+        self.assertTrue(DailyRevenue.objects.filter(date=day, source='bar').exists())
+
+        BarOrder.objects.get(pk=order.pk).delete()
+        self.assertFalse(DailyRevenue.objects.filter(date=day, source='bar').exists())
+        current = rollup_rows()
+        rollup.rebuild()
+        self.assertEqual(current, rollup_rows())
+
+    def test_first_row_of_a_day_is_recomputed(self):
+        DailyRevenue.objects.filter(source='ps4').delete()
+        game = PS4Game.objects.first()
+        PS4Session.objects.create(game=game, game_name=game.name, duration_minutes=15, price=1500)
+        current = rollup_rows()
+        rollup.rebuild()
+        self.assertEqual(current, rollup_rows())
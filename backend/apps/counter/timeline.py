@@ -0,0 +1,144 @@
+"""
+Client timeline - billiard sessions, PS4 sessions and bar orders of one
+client, newest first.
+
+Each source is read in timestamp order and sliced in SQL to one page (plus
+one row to detect the next page); the streams are then combined with a
+heap merge. A page therefore costs one bounded query per source, however
+long the client's history is. Pages are chained with an opaque cursor
+holding the (timestamp, type, id) of the last entry served.
+"""
+import base64
+import heapq
+from datetime import datetime
+from itertools import islice
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .clients import client_q, find_client, linked_q
+from .models import BilliardSession, PS4Session, BarOrder
+from .pricing import PricingContext
+
+
+TIMELINE_PAGE_SIZE = 50
+TIMELINE_MAX_PAGE_SIZE = 200
+
+
+def _billiard_entry(session, pricing):
+    start = timezone.localtime(session.start_time)
+    return {
+        'id': session.id,
+        'type': 'billiard',
+        'timestamp': session.start_time.isoformat(),
+        'date': start.strftime('%Y-%m-%d'),
+        'time': start.strftime('%H:%M'),
+        'table': session.table_identifier,
+        'duration': pricing.formatted_duration(session),
+        'price': session.price,
+        'formatted_price': pricing.formatted_price(session),
+        'is_paid': session.is_paid,
+    }
+
+
+def _bar_entry(order, pricing):
+    return {
+        'id': order.id,
+        'type': 'bar',
+        'timestamp': order.timestamp.isoformat(),
+        'date': order.date.strftime('%Y-%m-%d'),
+        'time': timezone.localtime(order.timestamp).strftime('%H:%M'),
+        'items': order.items,
+        'price': order.total_price,
+        'formatted_price': order.formatted_price,
+        'is_paid': order.is_paid,
+    }
+
+
+def _ps4_entry(session, pricing):
+    return {
+        'id': session.id,
+        'type': 'ps4',
+        'timestamp': session.timestamp.isoformat(),
+        'date': session.date.strftime('%Y-%m-%d'),
+        'time': timezone.localtime(session.timestamp).strftime('%H:%M'),
+        'game': session.game_name,
+        'players': session.players,
+        'duration': f'{session.duration_minutes} min',
+        'price': session.price,
+        'formatted_price': session.get_formatted_price(),
+        'is_paid': session.is_paid,
+    }
+
+
+# (type, model, timestamp field, serializer, ownership filter)
+SOURCES = (
+    ('billiard', BilliardSession, 'start_time', _billiard_entry, client_q),
+    ('ps4', PS4Session, 'timestamp', _ps4_entry, linked_q),
+    ('bar', BarOrder, 'timestamp', _bar_entry, client_q),
+)
+
+
+def encode_cursor(key):
+    """Opaque cursor for a (timestamp, type, id) key."""
+    timestamp, kind, pk = key
+    raw = f'{timestamp.isoformat()}|{kind}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor(); raises ValueError on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, kind, pk = raw.split('|')
+        return datetime.fromisoformat(timestamp), kind, int(pk)
+    except (TypeError, UnicodeDecodeError, ValueError) as exc:
+        raise ValueError('Curseur invalide') from exc
+
+
+def _after(kind, field, cursor):
+    """Rows of source `kind` strictly after the cursor in newest-first order."""
+    timestamp, cursor_kind, pk = cursor
+    older = Q(**{f'{field}__lt': timestamp})
+    same_time = Q(**{field: timestamp})
+    if kind < cursor_kind:
+        return older | same_time
+    if kind == cursor_kind:
+        return older | (same_time & Q(pk__lt=pk))
+    return older
+
+
+def _stream(kind, model, field, owned, cursor, limit):
+    queryset = model.objects.filter(owned)
+    if cursor is not None:
+        queryset = queryset.filter(_after(kind, field, cursor))
+    for obj in queryset.order_by(f'-{field}', '-pk')[:limit]:
+        yield (getattr(obj, field), kind, obj.pk), obj
+
+
+def client_timeline(client_name, limit=TIMELINE_PAGE_SIZE, cursor=None):
+    """One page of a client's timeline.
+
+    Args:
+        client_name: Name of the client
+        limit: Page size
+        cursor: Value returned as `next_cursor` by the previous page
+
+    Returns:
+        tuple (entries, next_cursor); next_cursor is None on the last page
+    """
+    position = decode_cursor(cursor) if cursor else None
+    client = find_client(client_name)
+    streams = [
+        _stream(kind, model, field, owned(client, client_name), position, limit + 1)
+        for kind, model, field, _, owned in SOURCES
+    ]
+    merged = list(islice(heapq.merge(*streams, key=lambda item: item[0], reverse=True), limit + 1))
+
+    page = merged[:limit]
+    next_cursor = encode_cursor(page[-1][0]) if len(merged) > limit else None
+
+    serializers = {kind: serialize for kind, _, _, serialize, _ in SOURCES}
+    pricing = PricingContext()
+    entries = [serializers[key[1]](obj, pricing) for key, obj in page]
+    return entries, next_cursor
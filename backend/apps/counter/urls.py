@@ -6,9 +6,10 @@ from .views import (
     PS4GameViewSet, PS4TimeOptionViewSet, PS4SessionViewSet, InventoryItemViewSet,
     BarOrderViewSet, StatsViewSet, ClientViewSet, UserViewSet,
     login_view, create_admin_view, verify_admin_password_view,
-    clients_list, client_history,
-    toggle_client_payment, pay_all_client, delete_paid_client,
-    daily_revenue, monthly_revenue, get_current_user
+    clients_list, clients_search, clients_debtors, client_history,
+    toggle_client_payment, pay_all_client, delete_paid_client, settle_payments,
+    batch_operations, daily_revenue, monthly_revenue, range_revenue, get_current_user,
+    events_stream, events_ticket
 )
 
 router = DefaultRouter()
@@ -35,14 +36,27 @@ urlpatterns = [
     
     # Client management endpoints
     path('clients/', clients_list, name='clients-list'),
+    path('clients/search/', clients_search, name='clients-search'),
+    path('clients/debtors/', clients_debtors, name='clients-debtors'),
     path('clients/<str:client_name>/history/', client_history, name='client-history'),
     path('clients/<str:client_name>/toggle-payment/<str:item_type>/<int:item_id>/', toggle_client_payment, name='toggle-client-payment'),
     path('clients/<str:client_name>/pay-all/', pay_all_client, name='pay-all-client'),
     path('clients/<str:client_name>/delete-paid/', delete_paid_client, name='delete-paid-client'),
     
+    # Bulk payment settlement
+    path('payments/settle/', settle_payments, name='settle-payments'),
+    
+    # Offline POS queue
+    path('batch/', batch_operations, name='batch-operations'),
+    
     # Agenda/Calendar endpoints
     path('agenda/daily/<str:date_str>/', daily_revenue, name='daily-revenue'),
     path('agenda/monthly/<int:year>/<int:month>/', monthly_revenue, name='monthly-revenue'),
+    path('agenda/range/', range_revenue, name='range-revenue'),
+    
+    # Live events (Server-Sent Events)
+    path('events/', events_stream, name='events-stream'),
+    path('events/ticket/', events_ticket, name='events-ticket'),
     
     # API endpoints
     path('', include(router.urls)),
@@ -1,23 +1,56 @@
-from rest_framework import viewsets, permissions, status
-from rest_framework.decorators import action, api_view, permission_classes
+import hashlib
+import json
+import time
+
+from rest_framework import viewsets, permissions, renderers, status
+from rest_framework.authentication import BaseAuthentication, SessionAuthentication
+from rest_framework.decorators import (
+    action, api_view, authentication_classes, permission_classes, renderer_classes
+)
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils import timezone
-from django.db.models import Sum, Count, Q
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, Q, F
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from .models import (
     AppSettings, BilliardTable, BilliardSession,
     PS4Game, PS4TimeOption, PS4Session,
-    InventoryItem, BarOrder, Client, UserProfile
+    InventoryItem, BarOrder, Client, ClientBalance, UserProfile, DailyRevenue
 )
 from .serializers import (
     AppSettingsSerializer, BilliardTableSerializer, BilliardSessionSerializer,
     StartSessionSerializer, StopSessionSerializer,
     PS4GameSerializer, PS4TimeOptionSerializer, PS4SessionSerializer, CreatePS4SessionSerializer,
     InventoryItemSerializer, BarOrderSerializer, CreateBarOrderSerializer,
-    ClientSerializer, UserProfileSerializer, UserSerializer, CreateUserSerializer
+    SettlePaymentsSerializer, BatchSerializer, ClientSerializer, UserProfileSerializer,
+    UserSerializer, CreateUserSerializer
+)
+from . import bar_sales, events, idempotency, occupancy, operations, payments, rollup
+from .client_search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, search_clients
+from .clients import client_q, find_client, linked_q
+from .dates import day_start, day_window, window_q
+from .ledger import ClientLedger
+from .pagination import StartTimeCursorPagination, TimestampCursorPagination
+from .pricing import current_schedule
+from .revenue import (
+    BUCKETS as REVENUE_BUCKETS, MAX_RANGE_DAYS, daily_revenue_range, revenue_buckets, summarize_days
 )
+from .timeline import TIMELINE_MAX_PAGE_SIZE, TIMELINE_PAGE_SIZE, client_timeline
+
+
+# Pagination defaults for the clients ledger
+CLIENTS_PAGE_SIZE = 50
+CLIENTS_MAX_PAGE_SIZE = 500
+
+# Seconds the polled /stats/ response is served from cache
+STATS_CACHE_TTL = 5
 
 
 # ============================================
@@ -70,8 +103,9 @@ class TogglePaidMixin:
     def toggle_payment(self, request, pk=None):
         """Toggle payment status - unified implementation for all payment-tracked models."""
         obj = self.get_object()
-        obj.is_paid = not obj.is_paid
-        obj.save()
+        obj = payments.toggle_paid(type(obj).objects.filter(pk=obj.pk))
+        if obj is None:
+            return Response({'error': 'Élément non trouvé'}, status=status.HTTP_404_NOT_FOUND)
         return Response(self.get_serializer(obj).data)
 
 
@@ -80,128 +114,148 @@ class TogglePaidMixin:
 # ============================================
 @api_view(['GET'])
 def clients_list(request):
-    """Get all unique clients with their statistics."""
-    # Get unique client names from billiard sessions
-    billiard_clients = BilliardSession.objects.values_list('client_name', flat=True).distinct()
-    
-    # Get unique client names from bar orders
-    bar_clients = BarOrder.objects.values_list('client_name', flat=True).distinct()
-    
-    # Combine all unique client names
-    all_clients = set(list(billiard_clients) + list(bar_clients))
-    all_clients.discard('Anonyme')
-    all_clients.discard('Anonymous')
-    
-    clients_data = []
-    for client_name in sorted(all_clients):
-        # Billiard stats
-        billiard_sessions = BilliardSession.objects.filter(client_name=client_name)
-        billiard_count = billiard_sessions.count()
-        billiard_total = billiard_sessions.aggregate(total=Sum('price'))['total'] or 0
-        
-        # Unpaid billiard
-        unpaid_billiard = billiard_sessions.filter(is_paid=False).aggregate(total=Sum('price'))['total'] or 0
-        unpaid_billiard_count = billiard_sessions.filter(is_paid=False).count()
-        
-        # Bar stats
-        bar_orders = BarOrder.objects.filter(client_name=client_name)
-        bar_count = bar_orders.count()
-        bar_total = bar_orders.aggregate(total=Sum('total_price'))['total'] or 0
-        
-        # Unpaid bar
-        unpaid_bar = bar_orders.filter(is_paid=False).aggregate(total=Sum('total_price'))['total'] or 0
-        unpaid_bar_count = bar_orders.filter(is_paid=False).count()
-        
-        # Total visits
-        total_visits = billiard_count + bar_count
-        
-        # Skip clients with no visits (all data deleted)
-        if total_visits == 0:
-            continue
-        
-        # Total unpaid
-        total_unpaid = unpaid_billiard + unpaid_bar
-        unpaid_count = unpaid_billiard_count + unpaid_bar_count
-        
-        clients_data.append({
-            'name': client_name,
-            'billiard_sessions': billiard_count,
-            'billiard_total': billiard_total,
-            'bar_orders': bar_count,
-            'bar_total': bar_total,
-            'total_visits': total_visits,
-            'total_spent': billiard_total + bar_total,
-            'total_unpaid': total_unpaid,
-            'unpaid_count': unpaid_count,
-            'has_unpaid': unpaid_count > 0,
-        })
-    
-    # Sort by total visits
-    clients_data.sort(key=lambda x: x['total_visits'], reverse=True)
-    
-    return Response(clients_data)
+    """Get all unique clients with their statistics.
+
+    Query params:
+        ordering: name, total_visits, total_spent, total_unpaid, unpaid_count,
+            billiard_sessions or bar_orders, prefixed with '-' for descending
+            (default: -total_visits)
+        page, page_size: opt-in pagination. Without them the full list is
+            returned as before.
+    """
+    ledger = ClientLedger(ordering=request.query_params.get('ordering'))
+
+    if 'page' not in request.query_params and 'page_size' not in request.query_params:
+        return Response(ledger.rows())
+
+    try:
+        page = max(int(request.query_params.get('page', 1)), 1)
+        page_size = int(request.query_params.get('page_size', CLIENTS_PAGE_SIZE))
+        page_size = min(max(page_size, 1), CLIENTS_MAX_PAGE_SIZE)
+    except ValueError:
+        return Response(
+            {'error': 'page et page_size doivent être des entiers'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    count = ledger.count()
+    results = ledger.rows(limit=page_size, offset=(page - 1) * page_size)
+    url = request.build_absolute_uri()
+
+    return Response({
+        'count': count,
+        'next': replace_query_param(url, 'page', page + 1) if page * page_size < count else None,
+        'previous': replace_query_param(url, 'page', page - 1) if page > 1 else None,
+        'results': results,
+    })
+
+
+@api_view(['GET'])
+def clients_search(request):
+    """Autocomplete client names (accent and case insensitive).
+
+    Query params:
+        q: Start of the name or of any word in it
+        limit: Number of matches (default 10, max 50)
+    """
+    try:
+        limit = int(request.query_params.get('limit', SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        return Response({'error': 'limit doit être un entier'}, status=400)
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    return Response(search_clients(request.query_params.get('q', ''), limit))
+
+
+def _client_totals(client_name):
+    """Whole-history totals of a client, in the client ledger row shape."""
+    client = find_client(client_name)
+    if client is not None:
+        balance = ClientBalance.objects.filter(client=client).first() or ClientBalance()
+        return {
+            'billiard_sessions': balance.billiard_sessions,
+            'billiard_total': balance.billiard_total,
+            'bar_orders': balance.bar_orders,
+            'bar_total': balance.bar_total,
+            'total_spent': balance.total_spent,
+            'total_unpaid': balance.unpaid_total,
+            'unpaid_count': balance.unpaid_count,
+        }
+
+    ledger = ClientLedger(name=client_name).rows()
+    return ledger[0] if ledger else {
+        'billiard_sessions': 0, 'billiard_total': 0, 'bar_orders': 0, 'bar_total': 0,
+        'total_spent': 0, 'total_unpaid': 0, 'unpaid_count': 0,
+    }
+
+
+@api_view(['GET'])
+def clients_debtors(request):
+    """Clients with an unpaid balance, largest first.
+
+    Read from ClientBalance through its partial index on unpaid_total > 0.
+    """
+    debtors = (
+        ClientBalance.objects.filter(unpaid_total__gt=0)
+        .order_by('-unpaid_total', 'client_id')
+        .values('client_id', 'client__name', 'unpaid_total', 'unpaid_count')
+    )
+    return Response([
+        {
+            'client_id': row['client_id'],
+            'name': row['client__name'],
+            'unpaid_total': row['unpaid_total'],
+            'unpaid_count': row['unpaid_count'],
+        }
+        for row in debtors
+    ])
 
 
 @api_view(['GET'])
 def client_history(request, client_name):
-    """Get complete history for a specific client."""
-    # Billiard sessions
-    billiard_sessions = BilliardSession.objects.filter(client_name=client_name).order_by('-start_time')
-    billiard_data = []
-    for session in billiard_sessions:
-        billiard_data.append({
-            'id': session.id,
-            'type': 'billiard',
-            'date': session.start_time.strftime('%Y-%m-%d'),
-            'time': session.start_time.strftime('%H:%M'),
-            'table': session.table_identifier,
-            'duration': session.formatted_duration,
-            'price': session.price,
-            'formatted_price': session.formatted_price,
-            'is_paid': session.is_paid,
-        })
-    
-    # Bar orders
-    bar_orders = BarOrder.objects.filter(client_name=client_name).order_by('-timestamp')
-    bar_data = []
-    for order in bar_orders:
-        bar_data.append({
-            'id': order.id,
-            'type': 'bar',
-            'date': order.date.strftime('%Y-%m-%d'),
-            'time': order.timestamp.strftime('%H:%M'),
-            'items': order.items,
-            'price': order.total_price,
-            'formatted_price': order.formatted_price,
-            'is_paid': order.is_paid,
-        })
-    
-    # Combine and sort by date
-    all_history = billiard_data + bar_data
-    all_history.sort(key=lambda x: x['date'], reverse=True)
-    
-    # Calculate totals
-    total_billiard = sum(s['price'] for s in billiard_data)
-    total_bar = sum(o['price'] for o in bar_data)
-    
-    # Calculate unpaid totals
-    unpaid_billiard = sum(s['price'] for s in billiard_data if not s['is_paid'])
-    unpaid_bar = sum(o['price'] for o in bar_data if not o['is_paid'])
-    unpaid_count = len([s for s in billiard_data if not s['is_paid']]) + len([o for o in bar_data if not o['is_paid']])
-    
+    """Get the history of a specific client, newest first.
+
+    Query params:
+        page_size: Entries per page (default 50)
+        cursor: Value of `next_cursor` from the previous page
+
+    Totals cover the whole history: the running ClientBalance of registered
+    clients, or the client ledger query for names without a Client.
+    `billiard_sessions` and `bar_orders` hold the entries of the page of
+    `all_history` of each type.
+    """
+    try:
+        page_size = int(request.query_params.get('page_size', TIMELINE_PAGE_SIZE))
+    except ValueError:
+        return Response({'error': 'page_size doit être un entier'}, status=400)
+    page_size = max(1, min(page_size, TIMELINE_MAX_PAGE_SIZE))
+
+    cursor = request.query_params.get('cursor')
+    try:
+        entries, next_cursor = client_timeline(client_name, page_size, cursor)
+    except ValueError as exc:
+        return Response({'error': str(exc)}, status=400)
+
+    next_url = None
+    if next_cursor:
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', next_cursor)
+
+    totals = _client_totals(client_name)
+
     return Response({
         'client_name': client_name,
-        'billiard_sessions': billiard_data,
-        'bar_orders': bar_data,
-        'all_history': all_history,
+        'billiard_sessions': [entry for entry in entries if entry['type'] == 'billiard'],
+        'bar_orders': [entry for entry in entries if entry['type'] == 'bar'],
+        'all_history': entries,
+        'next_cursor': next_cursor,
+        'next': next_url,
         'stats': {
-            'total_billiard_sessions': len(billiard_data),
-            'total_bar_orders': len(bar_data),
-            'total_billiard_spent': total_billiard,
-            'total_bar_spent': total_bar,
-            'total_spent': total_billiard + total_bar,
-            'total_unpaid': unpaid_billiard + unpaid_bar,
-            'unpaid_count': unpaid_count,
+            'total_billiard_sessions': totals['billiard_sessions'],
+            'total_bar_orders': totals['bar_orders'],
+            'total_billiard_spent': totals['billiard_total'],
+            'total_bar_spent': totals['bar_total'],
+            'total_spent': totals['total_spent'],
+            'total_unpaid': totals['total_unpaid'],
+            'unpaid_count': totals['unpaid_count'],
         }
     })
 
@@ -209,31 +263,39 @@ def client_history(request, client_name):
 @api_view(['POST'])
 def toggle_client_payment(request, client_name, item_type, item_id):
     """Toggle payment status for a specific item."""
+    client = find_client(client_name)
+    owned = client_q(client, client_name)
     if item_type == 'billiard':
-        try:
-            session = BilliardSession.objects.get(id=item_id, client_name=client_name)
-            session.is_paid = not session.is_paid
-            session.save()
-            return Response({
-                'success': True,
-                'is_paid': session.is_paid,
-                'message': f'Session {"payée" if session.is_paid else "marquée comme non payée"}'
-            })
-        except BilliardSession.DoesNotExist:
+        session = payments.toggle_paid(BilliardSession.objects.filter(owned, id=item_id))
+        if session is None:
             return Response({'error': 'Session non trouvée'}, status=404)
+        return Response({
+            'success': True,
+            'is_paid': session.is_paid,
+            'message': f'Session {"payée" if session.is_paid else "marquée comme non payée"}'
+        })
     
+    elif item_type == 'ps4':
+        session = payments.toggle_paid(
+            PS4Session.objects.filter(linked_q(client, client_name), id=item_id)
+        )
+        if session is None:
+            return Response({'error': 'Session non trouvée'}, status=404)
+        return Response({
+            'success': True,
+            'is_paid': session.is_paid,
+            'message': f'Session {"payée" if session.is_paid else "marquée comme non payée"}'
+        })
+
     elif item_type == 'bar':
-        try:
-            order = BarOrder.objects.get(id=item_id, client_name=client_name)
-            order.is_paid = not order.is_paid
-            order.save()
-            return Response({
-                'success': True,
-                'is_paid': order.is_paid,
-                'message': f'Commande {"payée" if order.is_paid else "marquée comme non payée"}'
-            })
-        except BarOrder.DoesNotExist:
+        order = payments.toggle_paid(BarOrder.objects.filter(owned, id=item_id))
+        if order is None:
             return Response({'error': 'Commande non trouvée'}, status=404)
+        return Response({
+            'success': True,
+            'is_paid': order.is_paid,
+            'message': f'Commande {"payée" if order.is_paid else "marquée comme non payée"}'
+        })
     
     return Response({'error': 'Type invalide'}, status=400)
 
@@ -241,45 +303,131 @@ def toggle_client_payment(request, client_name, item_type, item_id):
 @api_view(['POST'])
 def pay_all_client(request, client_name):
     """Mark all unpaid items as paid for a client."""
-    # Update billiard sessions
-    billiard_updated = BilliardSession.objects.filter(
-        client_name=client_name, is_paid=False
-    ).update(is_paid=True)
-    
-    # Update bar orders
-    bar_updated = BarOrder.objects.filter(
-        client_name=client_name, is_paid=False
-    ).update(is_paid=True)
+    client = find_client(client_name)
+    owned = client_q(client, client_name)
+    with transaction.atomic(), rollup.batch():
+        # Update billiard sessions
+        billiard_unpaid = BilliardSession.objects.filter(owned, is_paid=False)
+        rollup.mark_queryset_dirty('billiard', billiard_unpaid)
+        billiard_updated = billiard_unpaid.update(is_paid=True)
+
+        # Update PS4 sessions (linked to a registered client only)
+        ps4_unpaid = PS4Session.objects.filter(linked_q(client, client_name), is_paid=False)
+        rollup.mark_queryset_dirty('ps4', ps4_unpaid)
+        ps4_updated = ps4_unpaid.update(is_paid=True)
+
+        # Update bar orders
+        bar_unpaid = BarOrder.objects.filter(owned, is_paid=False)
+        rollup.mark_queryset_dirty('bar', bar_unpaid)
+        bar_updated = bar_unpaid.update(is_paid=True)
+
+        if billiard_updated or ps4_updated or bar_updated:
+            events.publish('payment.bulk', client_name=client_name, is_paid=True)
     
     return Response({
         'success': True,
         'billiard_updated': billiard_updated,
+        'ps4_updated': ps4_updated,
         'bar_updated': bar_updated,
-        'message': f'{billiard_updated + bar_updated} éléments marqués comme payés'
+        'message': f'{billiard_updated + ps4_updated + bar_updated} éléments marqués comme payés'
     })
 
 
 @api_view(['DELETE'])
 def delete_paid_client(request, client_name):
     """Delete all paid items for a client."""
-    # Delete paid billiard sessions
-    billiard_deleted = BilliardSession.objects.filter(
-        client_name=client_name, is_paid=True
-    ).delete()[0]
-    
-    # Delete paid bar orders
-    bar_deleted = BarOrder.objects.filter(
-        client_name=client_name, is_paid=True
-    ).delete()[0]
+    client = find_client(client_name)
+    owned = client_q(client, client_name)
+    with transaction.atomic(), rollup.batch():
+        # Delete paid billiard sessions
+        billiard_deleted = BilliardSession.objects.filter(owned, is_paid=True).delete()[0]
+
+        # Delete paid PS4 sessions (linked to a registered client only)
+        ps4_deleted = PS4Session.objects.filter(
+            linked_q(client, client_name), is_paid=True
+        ).delete()[0]
+
+        # Delete paid bar orders (not counting their cascaded lines)
+        _, deleted = BarOrder.objects.filter(owned, is_paid=True).delete()
+        bar_deleted = deleted.get(BarOrder._meta.label, 0)
     
     return Response({
         'success': True,
         'billiard_deleted': billiard_deleted,
+        'ps4_deleted': ps4_deleted,
         'bar_deleted': bar_deleted,
-        'message': f'{billiard_deleted + bar_deleted} éléments payés supprimés'
+        'message': f'{billiard_deleted + ps4_deleted + bar_deleted} éléments payés supprimés'
     })
 
 
+@api_view(['POST'])
+def settle_payments(request):
+    """Mark billiard sessions, PS4 sessions and bar orders paid in one request.
+
+    Body:
+        billiard, ps4, bar: Lists of ids to settle (at least one item)
+        idempotency_key: Optional, also accepted as an Idempotency-Key header.
+            Retrying with the same key returns the first response unchanged.
+    """
+    serializer = SettlePaymentsSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    ids = {source: sorted(set(data[source])) for source, _, _ in payments.SETTLE_SOURCES}
+
+    with transaction.atomic():
+        if key:
+            try:
+                record, previous = idempotency.reserve('settle', key, ids)
+            except idempotency.IdempotencyConflict:
+                return Response(
+                    {'error': "Clé d'idempotence déjà utilisée pour une autre requête"},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if previous is not None:
+                return Response(previous)
+        result = payments.settle(ids)
+        if key:
+            idempotency.store(record, result)
+
+    return Response(result)
+
+
+# ============================================
+# OFFLINE BATCH
+# ============================================
+@api_view(['POST'])
+def batch_operations(request):
+    """Apply operations queued by a POS client while it was offline.
+
+    Body:
+        operations: List of {id, type, at, data}, in the order they happened.
+            id is a UUID generated by the client; an operation already
+            applied is not applied again and its first result is returned.
+            type is one of billiard.start, billiard.stop, ps4.create,
+            bar.create and payment.toggle; at is when it happened (defaults
+            to now); data holds the fields of the matching endpoint, plus
+            `ref` (UUID of the operation that created the target) for
+            billiard.stop and payment.toggle.
+
+    Returns one result per operation; a failed operation does not stop the
+    others.
+    """
+    serializer = BatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    try:
+        with transaction.atomic():
+            result = operations.apply_batch(serializer.validated_data['operations'])
+    except IntegrityError:
+        return Response(
+            {'error': 'Ce lot est déjà en cours de traitement, réessayez'},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    return Response(result)
+
+
 # ============================================
 # AUTHENTICATION VIEWS
 # ============================================
@@ -428,6 +576,7 @@ class BilliardSessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
     """ViewSet for billiard sessions."""
     serializer_class = BilliardSessionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = StartTimeCursorPagination
     queryset = BilliardSession.objects.all()
 
     def get_queryset(self):
@@ -451,24 +600,13 @@ class BilliardSessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
         table_identifier = serializer.validated_data['table_identifier']
         client_name = serializer.validated_data.get('client_name', 'Anonyme')
         
-        # Check if there's already an active session for this table
-        active_session = BilliardSession.objects.filter(
-            table_identifier=table_identifier, is_active=True
-        ).first()
-        
-        if active_session:
+        session = BilliardSession.start(table_identifier, client_name)
+        if session is None:
             return Response(
                 {'error': f'La table {table_identifier} a déjà une session active'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create new session
-        session = BilliardSession.objects.create(
-            table_identifier=table_identifier,
-            client_name=client_name,
-            is_active=True
-        )
-        
         return Response(
             BilliardSessionSerializer(session).data,
             status=status.HTTP_201_CREATED
@@ -481,27 +619,13 @@ class BilliardSessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
         client_name = request.data.get('client_name', 'Anonyme')
         start_time_str = request.data.get('start_time')
         
-        print(f"[DEBUG] start_with_time called: table={table_identifier}, time={start_time_str}")
-        
         if not table_identifier:
             return Response(
                 {'error': 'table_identifier est requis'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if there's already an active session for this table
-        active_session = BilliardSession.objects.filter(
-            table_identifier=table_identifier, is_active=True
-        ).first()
-        
-        if active_session:
-            return Response(
-                {'error': f'La table {table_identifier} a déjà une session active'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
         # Parse start time
-        from django.utils import timezone
         import datetime
         
         if start_time_str:
@@ -514,9 +638,7 @@ class BilliardSessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
                 start_time = timezone.make_aware(
                     datetime.datetime.combine(today, datetime.time(hour, minute, 0))
                 )
-                print(f"[DEBUG] Parsed start_time: {start_time}")
             except (ValueError, AttributeError) as e:
-                print(f"[DEBUG] Error parsing time: {e}")
                 return Response(
                     {'error': f'Format d\'heure invalide. Utilisez HH:MM - {str(e)}'},
                     status=status.HTTP_400_BAD_REQUEST
@@ -525,19 +647,12 @@ class BilliardSessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
             start_time = timezone.now()
         
         # Create new session with specific start time
-        session = BilliardSession.objects.create(
-            table_identifier=table_identifier,
-            client_name=client_name,
-            start_time=start_time,
-            is_active=True
-        )
-        
-        print(f"[DEBUG] Session created: id={session.id}, start_time={session.start_time}")
-        
-        return Response(
-            BilliardSessionSerializer(session).data,
-            status=status.HTTP_201_CREATED
-        )
+        session = BilliardSession.start(table_identifier, client_name, start_time)
+        if session is None:
+            return Response(
+                {'error': f'La table {table_identifier} a déjà une session active'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         return Response(
             BilliardSessionSerializer(session).data,
@@ -558,7 +673,12 @@ class BilliardSessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
         # Update client name if provided
         client_name = request.data.get('client_name', session.client_name)
         session.client_name = client_name
-        session.stop_session()
+        if not session.stop_session():
+            # Stopped by a concurrent request since it was loaded
+            return Response(
+                {'error': 'Cette session est déjà terminée'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         return Response(BilliardSessionSerializer(session).data)
 
@@ -590,32 +710,7 @@ class BilliardSessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
         
         # Calculate duration and price
         duration = (end_dt - start_dt).total_seconds()
-        
-        # Get settings for price calculation
-        settings = AppSettings.get_settings()
-        
-        # Calculate price based on duration
-        duration_minutes = duration / 60
-        
-        # Apply pricing formula
-        threshold = settings.threshold_mins  # 15 minutes
-        rate_base = settings.rate_base  # 150 mil/min
-        rate_reduced = settings.rate_reduced  # 135 mil/min
-        floor_min = settings.floor_min  # 1000 mil
-        floor_mid = settings.floor_mid  # 1500 mil
-        
-        if duration_minutes <= threshold:
-            price = duration_minutes * rate_base
-        else:
-            price = (threshold * rate_base) + ((duration_minutes - threshold) * rate_reduced)
-        
-        # Apply floor conditions
-        if duration_minutes <= 10:
-            price = max(price, floor_min)
-        elif duration_minutes <= 20:
-            price = max(price, floor_mid)
-        
-        price = int(price)
+        price = current_schedule().manual_price(duration)
         
         # Create session
         session = BilliardSession.objects.create(
@@ -634,6 +729,33 @@ class BilliardSessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
 
+    @action(detail=False, methods=['get'])
+    def live(self, request):
+        """Get active sessions with the pricing schedule, for client-side price ticking.
+
+        The response carries an ETag derived from the active sessions and the
+        tariff. Polls sending a matching If-None-Match get an empty 304.
+        """
+        sessions = list(
+            BilliardSession.objects.filter(is_active=True)
+            .order_by('start_time')
+            .values('id', 'table_identifier', 'client_name', 'start_time')
+        )
+        schedule = current_schedule()
+
+        fingerprint = json.dumps([sessions, schedule.as_dict()], default=str, sort_keys=True)
+        etag = f'"{hashlib.md5(fingerprint.encode()).hexdigest()}"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        return Response({
+            'server_time': timezone.now().isoformat(),
+            'schedule': schedule.as_dict(),
+            'sessions': sessions,
+        }, headers=headers)
+
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Get all active sessions."""
@@ -644,6 +766,8 @@ class BilliardSessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def history(self, request):
         """Get session history with filters."""
+        from datetime import datetime, timedelta
+
         queryset = BilliardSession.objects.filter(is_active=False)
         
         # Apply filters
@@ -654,13 +778,26 @@ class BilliardSessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
         
         if table_identifier:
             queryset = queryset.filter(table_identifier=table_identifier)
-        if start_date:
-            queryset = queryset.filter(start_time__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(start_time__date__lte=end_date)
+        try:
+            if start_date:
+                start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+                queryset = queryset.filter(start_time__gte=day_start(start_date))
+            if end_date:
+                end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+                queryset = queryset.filter(start_time__lt=day_start(end_date + timedelta(days=1)))
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date format. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         if is_paid is not None:
             queryset = queryset.filter(is_paid=is_paid.lower() == 'true')
         
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
@@ -669,17 +806,19 @@ class PS4GameViewSet(viewsets.ModelViewSet):
     """ViewSet for PS4 games."""
     serializer_class = PS4GameSerializer
     permission_classes = [permissions.IsAuthenticated]
-    queryset = PS4Game.objects.all()
+    # Nested time options: one query for all games
+    queryset = PS4Game.objects.prefetch_related('time_options')
 
 
 class PS4TimeOptionViewSet(viewsets.ModelViewSet):
     """ViewSet for PS4 time options."""
     serializer_class = PS4TimeOptionSerializer
     permission_classes = [permissions.IsAuthenticated]
-    queryset = PS4TimeOption.objects.all()
+    queryset = PS4TimeOption.objects.select_related('game')
 
     def get_queryset(self):
-        queryset = PS4TimeOption.objects.all()
+        # __str__ reads the game name
+        queryset = PS4TimeOption.objects.select_related('game')
         game_id = self.request.query_params.get('game_id')
         if game_id:
             queryset = queryset.filter(game_id=game_id)
@@ -690,6 +829,7 @@ class PS4SessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
     """ViewSet for PS4 sessions."""
     serializer_class = PS4SessionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TimestampCursorPagination
     queryset = PS4Session.objects.all()
 
     def get_queryset(self):
@@ -709,6 +849,7 @@ class PS4SessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
         game_id = serializer.validated_data['game_id']
         players = serializer.validated_data['players']
         time_option_id = serializer.validated_data['time_option_id']
+        client_name = serializer.validated_data.get('client_name', '')
         
         try:
             game = PS4Game.objects.get(id=game_id)
@@ -724,7 +865,8 @@ class PS4SessionViewSet(TogglePaidMixin, viewsets.ModelViewSet):
             game_name=game.name,
             players=players,
             duration_minutes=time_option.minutes,
-            price=time_option.price
+            price=time_option.price,
+            client=find_client(client_name),
         )
         
         return Response(
@@ -744,6 +886,7 @@ class BarOrderViewSet(TogglePaidMixin, viewsets.ModelViewSet):
     """ViewSet for bar orders."""
     serializer_class = BarOrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = TimestampCursorPagination
     queryset = BarOrder.objects.all()
 
     def get_queryset(self):
@@ -764,88 +907,218 @@ class BarOrderViewSet(TogglePaidMixin, viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         
         client_name = serializer.validated_data.get('client_name', 'Anonyme')
-        items = serializer.validated_data['items']
+        quantities = [
+            (item['item_id'], item['quantity'])
+            for item in serializer.validated_data['items']
+        ]
         
-        order = BarOrder.objects.create(
-            client_name=client_name,
-            items=items
+        # Prices come from the inventory, never from the request
+        inventory = InventoryItem.objects.in_bulk({item_id for item_id, _ in quantities})
+        unavailable = sorted(
+            item_id for item_id, _ in quantities
+            if item_id not in inventory or not inventory[item_id].is_active
         )
-        order.calculate_total()
-        order.save()
+        if unavailable:
+            return Response(
+                {'error': f'Articles introuvables ou inactifs: {unavailable}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        with transaction.atomic(), rollup.batch():
+            order = BarOrder.create_with_lines(client_name, quantities, inventory)
         
         return Response(
             BarOrderSerializer(order).data,
             status=status.HTTP_201_CREATED
         )
 
+    @action(detail=False, methods=['get'])
+    def sales(self, request):
+        """Per-item bar sales: top-N ranking and time buckets.
+
+        Query params:
+            start: First day, format YYYY-MM-DD
+            end: Last day (inclusive), format YYYY-MM-DD
+            bucket: hour, day (default) or week
+            top: Number of ranked items (default 10)
+        """
+        from datetime import datetime
+
+        try:
+            start = datetime.strptime(request.query_params.get('start', ''), '%Y-%m-%d').date()
+            end = datetime.strptime(request.query_params.get('end', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return Response({'error': 'start et end requis au format YYYY-MM-DD'}, status=400)
+
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in bar_sales.BUCKETS:
+            return Response({'error': 'bucket doit être hour, day ou week'}, status=400)
+
+        try:
+            top = int(request.query_params.get('top', bar_sales.TOP_DEFAULT))
+        except ValueError:
+            return Response({'error': 'top doit être un entier'}, status=400)
+        top = max(1, min(top, bar_sales.TOP_MAX))
+
+        if end < start:
+            return Response({'error': 'end doit être postérieur à start'}, status=400)
+        days = (end - start).days + 1
+        if days > MAX_RANGE_DAYS:
+            return Response({'error': f'Période limitée à {MAX_RANGE_DAYS} jours'}, status=400)
+        if bucket == 'hour' and days > bar_sales.MAX_HOURLY_RANGE_DAYS:
+            return Response(
+                {'error': f'Période limitée à {bar_sales.MAX_HOURLY_RANGE_DAYS} jours pour bucket=hour'},
+                status=400
+            )
+
+        items = bar_sales.top_items(start, end, limit=top)
+        return Response({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'bucket': bucket,
+            'top': items,
+            'buckets': bar_sales.item_buckets(start, end, bucket, items),
+        })
+
 
 class StatsViewSet(viewsets.ViewSet):
     """ViewSet for statistics."""
     permission_classes = [permissions.IsAuthenticated]
 
-    def list(self, request):
-        """Get overall statistics."""
-        today = timezone.now().date()
-        
-        # Billiard stats
-        billiard_sessions = BilliardSession.objects.filter(is_active=False)
-        billiard_revenue = billiard_sessions.aggregate(
-            total=Sum('price')
-        )['total'] or 0
-        
-        # PS4 stats
-        ps4_sessions = PS4Session.objects.all()
-        ps4_revenue = ps4_sessions.aggregate(
-            total=Sum('price')
-        )['total'] or 0
-        
-        # Bar stats
-        bar_orders = BarOrder.objects.all()
-        bar_revenue = bar_orders.aggregate(
-            total=Sum('total_price')
-        )['total'] or 0
-        
-        # Today's stats
-        today_billiard = BilliardSession.objects.filter(
-            start_time__date=today, is_active=False
-        )
-        today_ps4 = PS4Session.objects.filter(date=today)
-        today_bar = BarOrder.objects.filter(date=today)
-        
+    @action(detail=False, methods=['get'], url_path='range')
+    def range_totals(self, request):
+        """Count and revenue per source for a date range, bucketed.
+
+        Query params:
+            start: First day, format YYYY-MM-DD
+            end: Last day (inclusive), format YYYY-MM-DD
+            bucket: day (default), week or month
+        """
+        from datetime import datetime
+
+        try:
+            start = datetime.strptime(request.query_params.get('start', ''), '%Y-%m-%d').date()
+            end = datetime.strptime(request.query_params.get('end', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return Response({'error': 'start et end requis au format YYYY-MM-DD'}, status=400)
+
+        bucket = request.query_params.get('bucket', 'day')
+        if bucket not in REVENUE_BUCKETS:
+            return Response({'error': 'bucket doit être day, week ou month'}, status=400)
+        if end < start:
+            return Response({'error': 'end doit être postérieur à start'}, status=400)
+        if (end - start).days + 1 > MAX_RANGE_DAYS:
+            return Response({'error': f'Période limitée à {MAX_RANGE_DAYS} jours'}, status=400)
+
         return Response({
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'bucket': bucket,
+            **revenue_buckets(start, end, bucket),
+        })
+
+    @action(detail=False, methods=['get'])
+    def occupancy(self, request):
+        """Billiard table utilization, idle gaps and peak concurrency.
+
+        Query params:
+            start: First day, format YYYY-MM-DD
+            end: Last day (inclusive), format YYYY-MM-DD
+        """
+        from datetime import datetime
+
+        try:
+            start = datetime.strptime(request.query_params.get('start', ''), '%Y-%m-%d').date()
+            end = datetime.strptime(request.query_params.get('end', ''), '%Y-%m-%d').date()
+        except ValueError:
+            return Response({'error': 'start et end requis au format YYYY-MM-DD'}, status=400)
+
+        if end < start:
+            return Response({'error': 'end doit être postérieur à start'}, status=400)
+        if (end - start).days + 1 > occupancy.MAX_OCCUPANCY_DAYS:
+            return Response(
+                {'error': f'Période limitée à {occupancy.MAX_OCCUPANCY_DAYS} jours'},
+                status=400
+            )
+
+        return Response(occupancy.summarize(start, end))
+
+    def list(self, request):
+        """Get overall statistics.
+
+        All-time, today, paid and unpaid figures come from one
+        conditional-aggregate query over the DailyRevenue rollup; only the
+        active session count touches the raw sessions table. Dashboards
+        poll this endpoint, so the response is cached for
+        STATS_CACHE_TTL seconds under a key that includes the date.
+        """
+        today = timezone.localdate()
+        cache_key = f'counter:stats:{today.isoformat()}'
+        data = cache.get(cache_key)
+        if data is None:
+            data = self._compute_stats(today)
+            cache.set(cache_key, data, STATS_CACHE_TTL)
+        return Response(data)
+
+    def _compute_stats(self, today):
+        empty = {
+            'count': 0, 'revenue': 0, 'paid_revenue': 0, 'unpaid_revenue': 0,
+            'today_count': 0, 'today_revenue': 0,
+        }
+        totals = {source: dict(empty) for source, _ in DailyRevenue.SOURCE_CHOICES}
+
+        count = F('paid_count') + F('unpaid_count')
+        revenue = F('paid_total') + F('unpaid_total')
+        rows = DailyRevenue.objects.values('source').annotate(
+            count=Sum(count),
+            revenue=Sum(revenue),
+            paid_revenue=Sum('paid_total'),
+            unpaid_revenue=Sum('unpaid_total'),
+            today_count=Sum(count, filter=Q(date=today)),
+            today_revenue=Sum(revenue, filter=Q(date=today)),
+        ).order_by()
+        for row in rows:
+            totals[row['source']] = {key: row[key] or 0 for key in empty}
+
+        billiard = totals['billiard']
+        ps4 = totals['ps4']
+        bar = totals['bar']
+        total_revenue = billiard['revenue'] + ps4['revenue'] + bar['revenue']
+
+        return {
             'billiard': {
-                'total_sessions': billiard_sessions.count(),
-                'total_revenue': billiard_revenue,
-                'formatted_revenue': f"{billiard_revenue / 1000:.3f} DT",
+                'total_sessions': billiard['count'],
+                'total_revenue': billiard['revenue'],
+                'paid_revenue': billiard['paid_revenue'],
+                'unpaid_revenue': billiard['unpaid_revenue'],
+                'formatted_revenue': f"{billiard['revenue'] / 1000:.3f} DT",
                 'active_sessions': BilliardSession.objects.filter(is_active=True).count(),
             },
             'ps4': {
-                'total_sessions': ps4_sessions.count(),
-                'total_revenue': ps4_revenue,
-                'formatted_revenue': f"{ps4_revenue / 1000:.3f} DT",
+                'total_sessions': ps4['count'],
+                'total_revenue': ps4['revenue'],
+                'paid_revenue': ps4['paid_revenue'],
+                'unpaid_revenue': ps4['unpaid_revenue'],
+                'formatted_revenue': f"{ps4['revenue'] / 1000:.3f} DT",
             },
             'bar': {
-                'total_orders': bar_orders.count(),
-                'total_revenue': bar_revenue,
-                'formatted_revenue': f"{bar_revenue / 1000:.3f} DT",
+                'total_orders': bar['count'],
+                'total_revenue': bar['revenue'],
+                'paid_revenue': bar['paid_revenue'],
+                'unpaid_revenue': bar['unpaid_revenue'],
+                'formatted_revenue': f"{bar['revenue'] / 1000:.3f} DT",
             },
             'today': {
-                'billiard_sessions': today_billiard.count(),
-                'billiard_revenue': today_billiard.aggregate(
-                    total=Sum('price')
-                )['total'] or 0,
-                'ps4_sessions': today_ps4.count(),
-                'ps4_revenue': today_ps4.aggregate(
-                    total=Sum('price')
-                )['total'] or 0,
-                'bar_orders': today_bar.count(),
-                'bar_revenue': today_bar.aggregate(
-                    total=Sum('total_price')
-                )['total'] or 0,
+                'billiard_sessions': billiard['today_count'],
+                'billiard_revenue': billiard['today_revenue'],
+                'ps4_sessions': ps4['today_count'],
+                'ps4_revenue': ps4['today_revenue'],
+                'bar_orders': bar['today_count'],
+                'bar_revenue': bar['today_revenue'],
             },
-            'total_revenue': billiard_revenue + ps4_revenue + bar_revenue,
-            'formatted_total': f"{(billiard_revenue + ps4_revenue + bar_revenue) / 1000:.3f} DT",
-        })
+            'total_revenue': total_revenue,
+            'formatted_total': f"{total_revenue / 1000:.3f} DT",
+        }
 
 
 # ============================================
@@ -869,7 +1142,7 @@ def daily_revenue(request, date_str):
     try:
         # Billiard sessions for this date
         billiard_sessions = BilliardSession.objects.filter(
-            start_time__date=date,
+            window_q('start_time', *day_window(date)),
             is_active=False
         ).order_by('-start_time')
         
@@ -973,61 +1246,124 @@ def monthly_revenue(request, year, month):
     
     # Get all days in the month
     _, days_in_month = calendar.monthrange(year, month)
-    
-    daily_data = []
-    for day in range(1, days_in_month + 1):
-        date = datetime(year, month, day).date()
-        
-        # Billiard revenue
-        billiard_revenue = BilliardSession.objects.filter(
-            start_time__date=date,
-            is_active=False
-        ).aggregate(total=Sum('price'))['total'] or 0
-        
-        # PS4 revenue
-        ps4_revenue = PS4Session.objects.filter(
-            date=date
-        ).aggregate(total=Sum('price'))['total'] or 0
-        
-        # Bar revenue
-        bar_revenue = BarOrder.objects.filter(
-            date=date
-        ).aggregate(total=Sum('total_price'))['total'] or 0
-        
-        total = billiard_revenue + ps4_revenue + bar_revenue
-        
-        daily_data.append({
-            'date': date.isoformat(),
-            'day': day,
-            'billiard_revenue': billiard_revenue,
-            'ps4_revenue': ps4_revenue,
-            'bar_revenue': bar_revenue,
-            'total_revenue': total,
-            'formatted_total': f"{total / 1000:.3f} DT",
-            'has_data': total > 0,
-        })
-    
-    # Calculate month totals
-    month_billiard = sum(d['billiard_revenue'] for d in daily_data)
-    month_ps4 = sum(d['ps4_revenue'] for d in daily_data)
-    month_bar = sum(d['bar_revenue'] for d in daily_data)
-    month_total = month_billiard + month_ps4 + month_bar
-    
+
+    daily_data = daily_revenue_range(
+        datetime(year, month, 1).date(),
+        datetime(year, month, days_in_month).date(),
+    )
+
     return Response({
         'year': year,
         'month': month,
         'month_name': calendar.month_name[month],
         'days': daily_data,
-        'totals': {
-            'billiard': month_billiard,
-            'ps4': month_ps4,
-            'bar': month_bar,
-            'total': month_total,
-            'formatted_total': f"{month_total / 1000:.3f} DT",
-        }
+        'totals': summarize_days(daily_data),
     })
 
 
+@api_view(['GET'])
+def range_revenue(request):
+    """Get daily revenue for an arbitrary date range (week, quarter, year...).
+
+    Query params:
+        start: First day, format YYYY-MM-DD
+        end: Last day (inclusive), format YYYY-MM-DD
+    """
+    from datetime import datetime
+
+    try:
+        start = datetime.strptime(request.query_params.get('start', ''), '%Y-%m-%d').date()
+        end = datetime.strptime(request.query_params.get('end', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return Response({'error': 'start et end requis au format YYYY-MM-DD'}, status=400)
+
+    if end < start:
+        return Response({'error': 'end doit être postérieur à start'}, status=400)
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        return Response({'error': f'Période limitée à {MAX_RANGE_DAYS} jours'}, status=400)
+
+    daily_data = daily_revenue_range(start, end)
+
+    return Response({
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': daily_data,
+        'totals': summarize_days(daily_data),
+    })
+
+
+# ============================================
+# LIVE EVENTS (SERVER-SENT EVENTS)
+# ============================================
+# Seconds between keep-alive comments, and lifetime of one stream before the
+# browser is asked to reconnect (frees the worker thread periodically)
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_STREAM_SECONDS = 300
+
+
+class EventStreamRenderer(renderers.BaseRenderer):
+    """Lets DRF content negotiation accept `Accept: text/event-stream`."""
+    media_type = 'text/event-stream'
+    format = 'txt'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data
+
+
+class EventTicketAuthentication(BaseAuthentication):
+    """Stream ticket taken from `?ticket=`, since EventSource cannot send headers.
+
+    Tickets come from POST /events/ticket/ (see events.issue_ticket).
+    """
+
+    def authenticate(self, request):
+        ticket = request.query_params.get('ticket')
+        if not ticket:
+            return None
+        user_id = events.redeem_ticket(ticket)
+        user = User.objects.filter(pk=user_id, is_active=True).first() if user_id else None
+        if user is None:
+            raise AuthenticationFailed('Ticket invalide, expiré ou déjà utilisé')
+        return user, None
+
+
+@api_view(['POST'])
+def events_ticket(request):
+    """Issue a single-use ticket for opening the /events/ stream."""
+    return Response({'ticket': events.issue_ticket(request.user), 'expires_in': events.TICKET_SECONDS})
+
+
+@api_view(['GET'])
+@renderer_classes([EventStreamRenderer, renderers.JSONRenderer])
+@authentication_classes([EventTicketAuthentication, JWTAuthentication, SessionAuthentication])
+def events_stream(request):
+    """Stream session, order and payment changes as Server-Sent Events.
+
+    Each event is sent as `event: <type>` with a JSON `data:` line. The
+    stream ends after EVENTS_STREAM_SECONDS; EventSource reconnects on its own.
+    """
+    subscription = events.get_broker().subscribe()
+
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            deadline = time.monotonic() + EVENTS_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                event = subscription.get(timeout=EVENTS_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Disable proxy buffering (nginx) so events are delivered immediately
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 # ============================================
 # CLIENT MODEL VIEWS
 # ============================================
@@ -1050,12 +1386,13 @@ class ClientViewSet(viewsets.ModelViewSet):
 # ============================================
 class UserViewSet(viewsets.ModelViewSet):
     """ViewSet for managing users."""
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('profile')
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        queryset = User.objects.all()
+        # UserSerializer reads the role and permissions from the profile
+        queryset = User.objects.select_related('profile')
         is_active = self.request.query_params.get('is_active', None)
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
@@ -6,6 +6,7 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 from datetime import timedelta
+from corsheaders.defaults import default_headers
 
 load_dotenv()
 
@@ -81,6 +82,12 @@ if DATABASE_URL.startswith('sqlite'):
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # Seconds a writer waits for the database-wide write lock before
+            # failing with "database is locked" (Python's default is 5)
+            'OPTIONS': {'timeout': 20},
+            # The threaded tests open one connection per thread, which an
+            # in-memory test database would not share
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
 else:
@@ -101,6 +108,9 @@ else:
         }
     }
 
+    # Trigram lookups used by the client search (pg_trgm)
+    INSTALLED_APPS += ['django.contrib.postgres']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -145,6 +155,9 @@ CORS_ALLOWED_ORIGINS = [
 # If you need to add more origins, add them to CORS_ALLOWED_ORIGINS
 CORS_ALLOW_ALL_ORIGINS = False
 
+# Retried writes (bulk payment settlement) carry an Idempotency-Key header
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
+
 # REST Framework settings with JWT authentication
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -180,5 +193,9 @@ if not DEBUG:
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
 
+# Live events broker: 'memory' (single process), 'redis' or 'postgres'
+EVENT_BROKER = os.getenv('EVENT_BROKER', 'memory')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
 # Gemini API Key
 GEMINI_API_KEY = os.getenv('API_KEY', '')
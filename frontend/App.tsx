@@ -145,6 +145,8 @@ const Layout: React.FC<{ children: React.ReactNode }> = ({ children }) => {
   const handleLogout = () => {
     setUser(null);
     localStorage.removeItem('billard_auth');
+    localStorage.removeItem('billard_token');
+    localStorage.removeItem('billard_refresh');
   };
 
   if (!user) {
@@ -1,4 +1,5 @@
-import React, { createContext, useContext, useState, useEffect, useCallback } from 'react';
+import React, { createContext, useContext, useState, useEffect, useCallback, useRef } from 'react';
+import { priceForDuration, type PriceSchedule } from '../utils/pricing';
 
 // Dynamic API URL - works for both development and Docker
 const API_URL = import.meta.env.VITE_API_URL || 
@@ -6,6 +7,49 @@ const API_URL = import.meta.env.VITE_API_URL ||
     ? 'http://localhost:8000/api' 
     : '/api');
 
+// Delay before the live events stream is reopened after an error
+const EVENTS_RETRY_MS = 3000;
+
+// Renew the access token with the stored refresh token
+async function refreshAccessToken(): Promise<string | null> {
+  const refresh = localStorage.getItem('billard_refresh');
+  if (!refresh) return null;
+  const res = await fetch(`${API_URL}/auth/token/refresh/`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ refresh }),
+  });
+  if (!res.ok) return null;
+  const data = await res.json();
+  localStorage.setItem('billard_token', data.access);
+  return data.access;
+}
+
+// Single-use ticket opening one live events stream, or null if none could
+// be issued (logged out, server unreachable)
+async function fetchEventsTicket(): Promise<string | null> {
+  const request = (token: string) => fetch(`${API_URL}/events/ticket/`, {
+    method: 'POST',
+    headers: { Authorization: `Bearer ${token}` },
+  });
+  try {
+    let token = localStorage.getItem('billard_token');
+    if (!token) return null;
+    let res = await request(token);
+    if (res.status === 401) {
+      token = await refreshAccessToken();
+      if (!token) return null;
+      res = await request(token);
+    }
+    if (!res.ok) return null;
+    const data = await res.json();
+    return data.ticket;
+  } catch (error) {
+    console.error('Error fetching events ticket:', error);
+    return null;
+  }
+}
+
 // Types
 interface BilliardSession {
   id: number;
@@ -208,6 +252,25 @@ export const AppProvider: React.FC<{ children: React.ReactNode }> = ({ children
     }
   }, []);
 
+  // Recompute current price and duration of active sessions locally
+  const tickPrices = useCallback((schedule: PriceSchedule) => {
+    const now = Date.now();
+    setSessions(prev => prev.map(session => {
+      if (!session.is_active) return session;
+      const elapsed = Math.max(0, Math.floor((now - new Date(session.start_time).getTime()) / 1000));
+      const price = priceForDuration(schedule, elapsed);
+      const h = Math.floor(elapsed / 3600);
+      const m = Math.floor((elapsed % 3600) / 60);
+      const sec = elapsed % 60;
+      return {
+        ...session,
+        current_price: price,
+        formatted_price: `${(price / 1000).toFixed(3)} DT`,
+        formatted_duration: `${h.toString().padStart(2, '0')}:${m.toString().padStart(2, '0')}:${sec.toString().padStart(2, '0')}`,
+      };
+    }));
+  }, []);
+
   const fetchPS4Sessions = useCallback(async () => {
     try {
       const res = await fetch(`${API_URL}/ps4-sessions/`);
@@ -296,17 +359,99 @@ export const AppProvider: React.FC<{ children: React.ReactNode }> = ({ children
     loadData();
   }, [fetchSettings, fetchSessions, fetchPS4Games, fetchPS4Sessions, fetchInventory]);
 
-  // Auto-refresh active sessions every 10 seconds to update price
+  // Poll the lightweight /sessions/live/ endpoint every 10 seconds.
+  // Unchanged polls answer 304 and prices are ticked locally from the
+  // schedule; the full list is only refetched when active sessions change.
+  const liveEtag = useRef<string | null>(null);
+  const liveSchedule = useRef<PriceSchedule | null>(null);
+
   useEffect(() => {
     const hasActiveSessions = sessions.some(s => s.is_active);
     if (!hasActiveSessions) return;
 
-    const interval = setInterval(() => {
-      fetchSessions();
-    }, 10000); // Refresh every 10 seconds
+    const interval = setInterval(async () => {
+      try {
+        const res = await fetch(`${API_URL}/sessions/live/`, {
+          headers: liveEtag.current ? { 'If-None-Match': liveEtag.current } : {},
+        });
+        if (res.status === 200) {
+          const isFirstPoll = liveEtag.current === null;
+          const data = await res.json();
+          liveEtag.current = res.headers.get('ETag');
+          liveSchedule.current = data.schedule;
+          if (!isFirstPoll) {
+            await fetchSessions();
+            return;
+          }
+        } else if (res.status !== 304) {
+          return;
+        }
+        if (liveSchedule.current) {
+          tickPrices(liveSchedule.current);
+        }
+      } catch (error) {
+        console.error('Error polling live sessions:', error);
+      }
+    }, 10000); // Poll every 10 seconds
 
     return () => clearInterval(interval);
-  }, [sessions, fetchSessions]);
+  }, [sessions, fetchSessions, tickPrices]);
+
+  // Live events pushed by the server (SSE): refetch only what changed on
+  // another tablet. EventSource cannot send an Authorization header, so each
+  // stream is opened with a short-lived single-use ticket. A ticket cannot
+  // be replayed, so on any error (stream ended, network, expired access
+  // token) the stream is closed and reopened with a fresh ticket.
+  useEffect(() => {
+    if (typeof EventSource === 'undefined' || !user) return;
+    let source: EventSource | null = null;
+    let retryTimer: ReturnType<typeof setTimeout> | undefined;
+    let stopped = false;
+
+    const reopenLater = () => {
+      if (!stopped) retryTimer = setTimeout(open, EVENTS_RETRY_MS);
+    };
+
+    const open = async () => {
+      const ticket = await fetchEventsTicket();
+      if (stopped) return;
+      if (!ticket) {
+        reopenLater();
+        return;
+      }
+      const stream = new EventSource(`${API_URL}/events/?ticket=${encodeURIComponent(ticket)}`);
+      source = stream;
+
+      const billiardEvents = ['billiard.started', 'billiard.added', 'billiard.stopped', 'billiard.deleted'];
+      const ps4Events = ['ps4.created', 'ps4.deleted'];
+      billiardEvents.forEach(type => stream.addEventListener(type, () => fetchSessions()));
+      ps4Events.forEach(type => stream.addEventListener(type, () => fetchPS4Sessions()));
+      stream.addEventListener('payment.toggled', () => {
+        fetchSessions();
+        fetchPS4Sessions();
+      });
+      stream.addEventListener('payment.bulk', () => fetchSessions());
+      stream.addEventListener('payment.settled', () => {
+        fetchSessions();
+        fetchPS4Sessions();
+      });
+      stream.addEventListener('batch.applied', () => {
+        fetchSessions();
+        fetchPS4Sessions();
+      });
+      stream.onerror = () => {
+        stream.close();
+        reopenLater();
+      };
+    };
+
+    open();
+    return () => {
+      stopped = true;
+      clearTimeout(retryTimer);
+      source?.close();
+    };
+  }, [user, fetchSessions, fetchPS4Sessions]);
 
   // Billiard actions
   const startSession = useCallback(async (tableIdentifier: string, clientName = 'Anonyme'): Promise<BilliardSession> => {
@@ -17,9 +17,8 @@ interface Client {
 
 interface ClientHistory {
   client_name: string;
-  billiard_sessions: any[];
-  bar_orders: any[];
   all_history: any[];
+  next_cursor: string | null;
   stats: {
     total_billiard_sessions: number;
     total_bar_orders: number;
@@ -374,6 +373,25 @@ export const Admin: React.FC = () => {
     }
   };
 
+  // The history is paginated server-side; append the next page
+  const loadMoreClientHistory = async () => {
+    if (!selectedClient?.next_cursor) return;
+    try {
+      const res = await fetch(
+        `${API_URL}/clients/${encodeURIComponent(selectedClient.client_name)}/history/?cursor=${encodeURIComponent(selectedClient.next_cursor)}`
+      );
+      if (res.ok) {
+        const data = await res.json();
+        setSelectedClient(prev => prev && {
+          ...data,
+          all_history: [...prev.all_history, ...data.all_history],
+        });
+      }
+    } catch (error) {
+      console.error('Error fetching client history:', error);
+    }
+  };
+
   const togglePayment = async (itemType: string, itemId: number) => {
     if (!selectedClient) return;
     
@@ -1283,9 +1301,11 @@ export const Admin: React.FC = () => {
                           <span className={`px-3 py-1 rounded-lg text-[10px] font-black uppercase ${
                             item.type === 'billiard' 
                               ? 'bg-blue-500/20 text-blue-400' 
-                              : 'bg-purple-500/20 text-purple-400'
+                              : item.type === 'ps4'
+                                ? 'bg-indigo-500/20 text-indigo-400'
+                                : 'bg-purple-500/20 text-purple-400'
                           }`}>
-                            {item.type === 'billiard' ? 'Billard' : 'Bar'}
+                            {item.type === 'billiard' ? 'Billard' : item.type === 'ps4' ? 'PS4' : 'Bar'}
                           </span>
                         </td>
                         <td className="p-4 text-zinc-400">{item.date}</td>
@@ -1293,7 +1313,9 @@ export const Admin: React.FC = () => {
                         <td className="p-4 text-white">
                           {item.type === 'billiard' 
                             ? `Table ${item.table} - ${item.duration}`
-                            : `${item.items?.length || 0} articles`
+                            : item.type === 'ps4'
+                              ? `${item.game} - ${item.players}j - ${item.duration}`
+                              : `${item.items?.length || 0} articles`
                           }
                         </td>
                         <td className="p-4 font-bold text-white">{item.formatted_price}</td>
@@ -1328,6 +1350,14 @@ export const Admin: React.FC = () => {
                     ))}
                   </tbody>
                 </table>
+                {selectedClient.next_cursor && (
+                  <button
+                    onClick={loadMoreClientHistory}
+                    className="mt-4 w-full py-3 bg-zinc-800 text-zinc-300 rounded-xl text-xs font-black uppercase hover:bg-zinc-700"
+                  >
+                    Charger plus
+                  </button>
+                )}
               </div>
             </section>
           )}
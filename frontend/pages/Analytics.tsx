@@ -1,16 +1,57 @@
-import React, { useState, useMemo } from 'react';
+import React, { useState, useEffect, useMemo } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { AreaChart, Area, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer } from 'recharts';
 import { useAppContext } from '../context/AppContext';
+import { apiGet } from '../utils/api';
+
+interface SourceTotals {
+  count: number;
+  revenue: number;
+}
+
+interface RangeBucket {
+  period: string;
+  billiard: SourceTotals;
+  ps4: SourceTotals;
+  bar: SourceTotals;
+  total_revenue: number;
+}
+
+interface RangeStats {
+  buckets: RangeBucket[];
+  totals: {
+    billiard: SourceTotals;
+    ps4: SourceTotals;
+    bar: SourceTotals;
+    total_revenue: number;
+  };
+}
+
+interface HistorySession {
+  id: number;
+  table_identifier: string;
+  client_name: string;
+  start_time: string;
+  formatted_duration: string;
+  formatted_price: string;
+  is_paid: boolean;
+}
+
+const toDateString = (d: Date) => d.toISOString().split('T')[0];
 
 export const Analytics: React.FC = () => {
-  const { sessions, ps4Sessions, settings, stats } = useAppContext();
+  const { settings, stats } = useAppContext();
   const navigate = useNavigate();
   
   const [dateRange, setDateRange] = useState({
     start: new Date(new Date().getFullYear(), new Date().getMonth(), 1).toISOString().split('T')[0],
     end: new Date().toISOString().split('T')[0],
   });
+  // Totals and the 7-day chart are bucketed server-side (/stats/range/);
+  // the history table only loads the sessions of the selected range.
+  const [rangeStats, setRangeStats] = useState<RangeStats | null>(null);
+  const [weekStats, setWeekStats] = useState<RangeStats | null>(null);
+  const [filteredSessions, setFilteredSessions] = useState<HistorySession[]>([]);
 
   const formatPrice = (mil: number) => {
     if (!mil || mil < 10000) return `${Math.round(mil || 0)} mil`;
@@ -18,42 +59,46 @@ export const Analytics: React.FC = () => {
     return `${dt.toLocaleString('fr-FR', { minimumFractionDigits: 0, maximumFractionDigits: 3 })} DT`;
   };
 
-  const filteredSessions = useMemo(() => {
-    return sessions.filter(s => {
-      const date = s.start_time.split('T')[0];
-      return date >= dateRange.start && date <= dateRange.end && !s.is_active;
-    });
-  }, [sessions, dateRange]);
+  useEffect(() => {
+    if (!dateRange.start || !dateRange.end || dateRange.start > dateRange.end) return;
+    const range = `start=${dateRange.start}&end=${dateRange.end}`;
+    Promise.all([
+      apiGet<RangeStats>(`/stats/range/?${range}&bucket=day`),
+      apiGet<HistorySession[]>(`/sessions/history/?start_date=${dateRange.start}&end_date=${dateRange.end}`),
+    ])
+      .then(([totals, history]) => {
+        setRangeStats(totals);
+        setFilteredSessions(history);
+      })
+      .catch(error => console.error('Error loading analytics:', error));
+  }, [dateRange]);
 
-  const filteredPs4Sessions = useMemo(() => {
-    return ps4Sessions.filter(s => {
-      return s.date >= dateRange.start && s.date <= dateRange.end;
-    });
-  }, [ps4Sessions, dateRange]);
+  useEffect(() => {
+    const end = new Date();
+    const start = new Date();
+    start.setDate(start.getDate() - 6);
+    apiGet<RangeStats>(`/stats/range/?start=${toDateString(start)}&end=${toDateString(end)}&bucket=day`)
+      .then(setWeekStats)
+      .catch(error => console.error('Error loading weekly chart:', error));
+  }, []);
 
-  const totalBillard = filteredSessions.reduce((acc, s) => acc + (s.price || 0), 0);
-  const totalPs4 = filteredPs4Sessions.reduce((acc, s) => acc + (s.price || 0), 0);
-  const totalSessions = filteredSessions.length + filteredPs4Sessions.length;
+  const totalBillard = rangeStats?.totals.billiard.revenue ?? 0;
+  const totalPs4 = rangeStats?.totals.ps4.revenue ?? 0;
+  const totalSessions = (rangeStats?.totals.billiard.count ?? 0) + (rangeStats?.totals.ps4.count ?? 0);
 
   const chartData = useMemo(() => {
-    return Array(7)
-      .fill(0)
-      .map((_, i) => {
-        const d = new Date();
-        d.setDate(d.getDate() - (6 - i));
-        const dayStr = d.toISOString().split('T')[0];
-        const dayName = d.toLocaleDateString('fr-FR', { weekday: 'short' }).toUpperCase();
-        return {
-          name: dayName,
-          billard: filteredSessions
-            .filter(s => s.start_time.split('T')[0] === dayStr)
-            .reduce((acc, s) => acc + (s.price || 0), 0),
-          ps4: filteredPs4Sessions
-            .filter(s => s.date === dayStr)
-            .reduce((acc, s) => acc + (s.price || 0), 0),
-        };
-      });
-  }, [filteredSessions, filteredPs4Sessions]);
+    return (weekStats?.buckets ?? []).map(bucket => {
+      // Only days inside the selected range are plotted, as before
+      const inRange = bucket.period >= dateRange.start && bucket.period <= dateRange.end;
+      return {
+        name: new Date(`${bucket.period}T00:00:00`)
+          .toLocaleDateString('fr-FR', { weekday: 'short' })
+          .toUpperCase(),
+        billard: inRange ? bucket.billiard.revenue : 0,
+        ps4: inRange ? bucket.ps4.revenue : 0,
+      };
+    });
+  }, [weekStats, dateRange]);
 
   return (
     <div className="space-y-8 animate-in fade-in duration-500">
@@ -1,6 +1,7 @@
 import React, { useState, useEffect, useCallback, useMemo } from 'react';
 import { useAppContext } from '../context/AppContext';
 import Swal from 'sweetalert2';
+import { apiGet } from '../utils/api';
 
 // Dynamic API URL - works for both development and Docker
 const API_URL = import.meta.env.VITE_API_URL || 
@@ -253,7 +254,6 @@ interface ClientNameModalProps {
   isOpen: boolean;
   onClose: () => void;
   onConfirm: (name: string) => void;
-  clientNames: string[];
   themeColor: string;
 }
 
@@ -261,7 +261,6 @@ const ClientNameModal: React.FC<ClientNameModalProps> = ({
   isOpen,
   onClose,
   onConfirm,
-  clientNames,
   themeColor,
 }) => {
   const [inputValue, setInputValue] = useState('');
@@ -269,20 +268,35 @@ const ClientNameModal: React.FC<ClientNameModalProps> = ({
   const [filteredNames, setFilteredNames] = useState<string[]>([]);
   const [selectedIndex, setSelectedIndex] = useState(-1);
 
+  // Suggestions depuis l'index de recherche (insensible aux accents et à la casse)
   useEffect(() => {
-    if (inputValue.length > 0) {
-      const filtered = clientNames.filter(name => 
-        name.toLowerCase().includes(inputValue.toLowerCase())
-      );
-      setFilteredNames(filtered);
-      setShowSuggestions(filtered.length > 0);
-      setSelectedIndex(-1);
-    } else {
+    const query = inputValue.trim();
+    if (query.length === 0) {
       setFilteredNames([]);
       setShowSuggestions(false);
       setSelectedIndex(-1);
+      return;
     }
-  }, [inputValue, clientNames]);
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      try {
+        const matches = await apiGet<{ id: number | null; name: string }[]>(
+          `/clients/search/?q=${encodeURIComponent(query)}&limit=8`
+        );
+        if (cancelled) return;
+        const names = matches.map(c => c.name);
+        setFilteredNames(names);
+        setShowSuggestions(names.length > 0);
+        setSelectedIndex(-1);
+      } catch (error) {
+        console.error('Erreur recherche clients:', error);
+      }
+    }, 150);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [inputValue]);
 
   const handleConfirm = () => {
     const name = inputValue.trim() || 'Anonyme';
@@ -370,11 +384,9 @@ const ClientNameModal: React.FC<ClientNameModalProps> = ({
           )}
         </div>
         
-        {clientNames.length > 0 && (
-          <p className="text-zinc-500 text-xs mb-6">
-            💡 Utilisez ↑↓ pour naviguer, Entrée pour valider
-          </p>
-        )}
+        <p className="text-zinc-500 text-xs mb-6">
+          💡 Utilisez ↑↓ pour naviguer, Entrée pour valider
+        </p>
         
         <div className="flex gap-4">
           <button
@@ -539,7 +551,6 @@ export const Dashboard: React.FC = () => {
   const [showClientModal, setShowClientModal] = useState(false);
   const [showAddModal, setShowAddModal] = useState(false);
   const [activeTableId, setActiveTableId] = useState<string | null>(null);
-  const [clientNames, setClientNames] = useState<string[]>([]);
   
   // State pour le workflow d'ajout
   const [pendingSession, setPendingSession] = useState<{
@@ -561,22 +572,6 @@ export const Dashboard: React.FC = () => {
     [sessions]
   );
 
-  // Charger les noms des clients
-  useEffect(() => {
-    const loadClientNames = async () => {
-      try {
-        const response = await fetch(`${API_URL}/clients/`);
-        if (response.ok) {
-          const clients = await response.json();
-          setClientNames(clients.map((c: any) => c.name).filter((name: string) => name && name !== 'Anonyme'));
-        }
-      } catch (error) {
-        console.error('Erreur récupération clients:', error);
-      }
-    };
-    loadClientNames();
-  }, []);
-
   const handleStart = useCallback(async (tableIdentifier: string) => {
     try {
       await startSession(tableIdentifier, 'Anonyme');
@@ -894,7 +889,6 @@ export const Dashboard: React.FC = () => {
         isOpen={showClientModal}
         onClose={handleCloseClientModal}
         onConfirm={handleClientNameConfirm}
-        clientNames={clientNames}
         themeColor={settings.theme_color}
       />
 
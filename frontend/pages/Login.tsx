@@ -47,7 +47,8 @@ export const Login: React.FC = () => {
         };
         setUser(user);
         localStorage.setItem('billard_auth', JSON.stringify(user));
-        localStorage.setItem('billard_token', data.token || '');
+        localStorage.setItem('billard_token', data.access || '');
+        localStorage.setItem('billard_refresh', data.refresh || '');
       } else {
         const errorData = await response.json();
         setError(errorData.error || 'Identifiants incorrects');
@@ -18,6 +18,9 @@ export {
   formatPercentage,
 } from './formatting';
 
+// Pricing utilities
+export { priceForDuration, type PriceSchedule } from './pricing';
+
 // Date/Time utilities (backward compatible)
 export { calculateDuration, formatElapsedTime } from './dateTimeUtils';
 
@@ -0,0 +1,34 @@
+/**
+ * Billiard pricing - mirror of PriceSchedule in backend/apps/counter/pricing.py
+ * Lets the UI tick live prices locally from the /sessions/live/ schedule
+ */
+
+export interface PriceSchedule {
+  rate_base: number;
+  rate_reduced: number;
+  threshold_mins: number;
+  floor_min: number;
+  floor_mid: number;
+}
+
+/**
+ * Price a duration with the same rules as the backend
+ * @param schedule - Tariff returned by /sessions/live/
+ * @param durationSeconds - Elapsed time in seconds
+ * @returns Price in millimes
+ */
+export function priceForDuration(schedule: PriceSchedule, durationSeconds: number): number {
+  const minutes = Math.floor(durationSeconds) / 60;
+  let price: number;
+
+  if (minutes <= schedule.threshold_mins) {
+    price = Math.trunc(minutes * schedule.rate_base);
+  } else {
+    price = Math.trunc(schedule.threshold_mins * schedule.rate_base)
+      + Math.trunc((minutes - schedule.threshold_mins) * schedule.rate_reduced);
+  }
+
+  if (price < schedule.floor_min) return schedule.floor_min;
+  if (price < schedule.floor_mid) return schedule.floor_mid;
+  return price;
+}